@@ -0,0 +1,28 @@
+// Software markers for EEG recordings (POST /api/eeg/markers).
+// The backend stamps each marker with the current sample of the live EEG stream,
+// so paradigms can be aligned without a hardware trigger box.
+// Fire-and-forget: never blocks playback; silently ignored when not recording.
+
+import { getApiBaseUrl } from './baseUrl';
+
+// Marker codes share the event table with hardware triggers, which are one byte (0-255);
+// the backend only accepts marker values above 255.
+export const EEG_MARKERS = {
+  VIDEO_START: { value: 1201, label: 'video_start' },
+  VIDEO_CLOSE: { value: 1202, label: 'video_close' },
+  MUSIC_START: { value: 1211, label: 'music_start' },
+  MUSIC_PAUSE: { value: 1212, label: 'music_pause' },
+};
+
+export function sendEegMarker(marker) {
+  try {
+    fetch(`${getApiBaseUrl()}/api/eeg/markers`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ value: marker.value, label: marker.label }),
+      keepalive: true,
+    }).catch(() => {});
+  } catch (e) {
+    // ignore
+  }
+}
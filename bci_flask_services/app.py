@@ -104,82 +104,12 @@ def _sync_local_files_to_db(inspector):
 
     print("\n📂 本地文件同步：")
 
-    # 同步 EEG 会话
-    _sync_eeg_sessions(inspector)
+    # EEG 会话由后台增量索引器（core/eeg_indexer.py）同步，不在启动时扫描数据目录
 
     # 同步音乐文件
     _sync_music_files(inspector)
 
 
-def _sync_eeg_sessions(inspector):
-    """同步 EEG 会话到数据库"""
-    from bci_flask_services.models import EegSession
-    import json
-
-    if 'eeg_session' not in inspector.get_table_names():
-        return
-
-    eeg_data_dir = getattr(config, "EEG_DATA_DIR", None)
-    if not eeg_data_dir or not Path(eeg_data_dir).exists():
-        return
-
-    synced = 0
-    for session_dir in Path(eeg_data_dir).rglob("session_*"):
-        if not session_dir.is_dir():
-            continue
-
-        session_id = session_dir.name
-        # 检查是否已存在
-        existing = EegSession.query.filter_by(session_id=session_id).first()
-        if existing:
-            continue
-
-        # 读取 metadata.json
-        meta_file = session_dir / "metadata.json"
-        meta = {}
-        if meta_file.exists():
-            try:
-                with open(meta_file, "r") as f:
-                    meta = json.load(f)
-            except Exception:
-                pass
-
-        # 查找文件
-        eeg_file = None
-        trigger_file = None
-        for f in session_dir.glob("*_eeg_*.h5"):
-            eeg_file = str(f)
-            break
-        for f in session_dir.glob("*_trigger_*.h5"):
-            trigger_file = str(f)
-            break
-
-        # 从目录路径推断用户
-        user_account = None
-        parent = session_dir.parent
-        if parent.name != Path(eeg_data_dir).name:
-            user_account = parent.name
-
-        # 创建记录
-        record = EegSession(
-            session_id=session_id,
-            user_account=user_account,
-            session_dir=str(session_dir),
-            eeg_file=eeg_file,
-            trigger_file=trigger_file,
-            duration=meta.get("duration", 0),
-            samples=meta.get("samples", 0)
-        )
-        db.session.add(record)
-        synced += 1
-
-    if synced > 0:
-        db.session.commit()
-        print(f"   ✅ 同步 {synced} 个 EEG 会话")
-    else:
-        print(f"   ✅ EEG 会话已是最新")
-
-
 def _sync_music_files(inspector):
     """同步音乐文件到数据库（解析文件名填充字段）"""
     from datetime import datetime
@@ -276,26 +206,112 @@ def create_app():
     # 预留的微服务接口
     app.register_blueprint(eeg_bp, url_prefix='/api/eeg')
 
+    # EEG 会话目录后台增量索引（数据库初始化完成后启动，启动过程不扫描数据目录）
+    from bci_flask_services.core.eeg_indexer import SessionIndexer
+    eeg_indexer = SessionIndexer(
+        app, getattr(config, "EEG_DATA_DIR", None),
+        interval_seconds=getattr(config, "EEG_INDEX_INTERVAL_SECONDS", 300)
+    )
+
     # 初始化 EEG 服务（后台线程，不阻塞主线程）
     eeg_initialized = False
     try:
-        from bci_flask_services.core.eeg import SessionManager, EEGDeviceServer
+        from bci_flask_services.core.eeg import SessionManager, EEGDeviceServer, EEG_SAMPLE_RATE, parse_device_groups
         from bci_flask_services.blueprints.eeg_service import init_eeg_service
 
         eeg_data_dir = getattr(config, "EEG_DATA_DIR", "./data")
-        eeg_session_manager = SessionManager(save_dir=eeg_data_dir)
-
-        eeg_server = EEGDeviceServer(
-            host_ip=getattr(config, "EEG_HOST_IP", "192.168.1.101"),
-            port=getattr(config, "EEG_SERVER_PORT", 5001),
-            eeg_ip=getattr(config, "EEG_DEVICE_IP", "192.168.1.102"),
-            trigger_ip=getattr(config, "EEG_TRIGGER_IP", "192.168.1.103"),
-            session_manager=eeg_session_manager
-        )
+        erp_window_ms = getattr(config, "EEG_ERP_WINDOW_MS", 800)
+        erp_window = max(1, int(erp_window_ms * EEG_SAMPLE_RATE / 1000))
+        storage_mode = getattr(config, "EEG_STORAGE_MODE", "uv")
+        line_freq = getattr(config, "EEG_LINE_FREQ", 50.0)
+        device_groups = parse_device_groups(getattr(config, "EEG_DEVICE_GROUPS", ""))
+        writer_workers = getattr(config, "EEG_WRITER_WORKERS", 2)
+        # 采集飞行记录器：丢包/滞后尖峰时自动转储最近事件到会话目录
+        flight_options = {
+            "capacity": getattr(config, "EEG_FLIGHT_RECORDER_EVENTS", 65536),
+            "loss_packets": getattr(config, "EEG_FLIGHT_LOSS_PACKETS", 50),
+            "lag_seconds": getattr(config, "EEG_FLIGHT_LAG_SECONDS", 2.0),
+            "cooldown": getattr(config, "EEG_FLIGHT_COOLDOWN_SECONDS", 60.0),
+        }
+
+        if getattr(config, "EEG_INGEST_MODE", "thread") == "process":
+            # 独立采集进程：代理对象提供与线程模式相同的接口
+            from bci_flask_services.core.eeg_process import start_ingest_process
+            eeg_server, eeg_session_manager = start_ingest_process(
+                save_dir=eeg_data_dir, erp_window=erp_window, storage_mode=storage_mode,
+                line_freq=line_freq,
+                host_ip=getattr(config, "EEG_HOST_IP", "192.168.1.101"),
+                port=getattr(config, "EEG_SERVER_PORT", 5001),
+                eeg_ip=getattr(config, "EEG_DEVICE_IP", "192.168.1.102"),
+                trigger_ip=getattr(config, "EEG_TRIGGER_IP", "192.168.1.103"),
+                flight=flight_options,
+                ring_seconds=getattr(config, "EEG_SHM_RING_SECONDS", 30.0),
+                device_groups=device_groups,
+                writer_workers=writer_workers
+            )
+            print("   🧠 EEG 采集运行在独立进程中")
+        else:
+            eeg_session_manager = SessionManager(
+                save_dir=eeg_data_dir,
+                erp_window=erp_window,
+                storage_mode=storage_mode,
+                line_freq=line_freq,
+                device_groups=device_groups,
+                writer_workers=writer_workers
+            )
+
+            eeg_server = EEGDeviceServer(
+                host_ip=getattr(config, "EEG_HOST_IP", "192.168.1.101"),
+                port=getattr(config, "EEG_SERVER_PORT", 5001),
+                eeg_ip=getattr(config, "EEG_DEVICE_IP", "192.168.1.102"),
+                trigger_ip=getattr(config, "EEG_TRIGGER_IP", "192.168.1.103"),
+                session_manager=eeg_session_manager
+            )
+
+            from bci_flask_services.core.eeg_flight import flight_recorder
+            flight_recorder.configure(**flight_options)
+            flight_recorder.install_gc_hook()
+
+        if device_groups:
+            print(f"   🧪 EEG 设备组: default, {', '.join(device_groups)}")
 
-        init_eeg_service(eeg_server, eeg_session_manager)
+        # 可选：实时流转发给其他分析节点
+        eeg_outlet = None
+        outlet_port = getattr(config, "EEG_OUTLET_PORT", 0)
+        if outlet_port:
+            from bci_flask_services.core.eeg_outlet import start_outlet
+            try:
+                eeg_outlet = start_outlet(
+                    eeg_session_manager,
+                    host=getattr(config, "EEG_OUTLET_HOST", "0.0.0.0"),
+                    port=outlet_port,
+                    ring_seconds=getattr(config, "EEG_SHM_RING_SECONDS", 30.0),
+                    block_ms=getattr(config, "EEG_OUTLET_BLOCK_MS", 20.0),
+                    max_pending_bytes=int(getattr(config, "EEG_OUTLET_MAX_PENDING_MB", 4) * 1024 * 1024)
+                )
+                print(f"   📡 EEG 实时流转发: tcp://{eeg_outlet.host}:{outlet_port}")
+            except OSError as e:
+                print(f"   ⚠️  EEG 实时流转发启动失败: {e}")
+
+        # 可选：软件标记 WebSocket 入口
+        marker_ws_port = getattr(config, "EEG_MARKER_WS_PORT", 0)
+        if marker_ws_port:
+            from bci_flask_services.core.eeg_markers import MarkerWebSocketServer
+            try:
+                MarkerWebSocketServer(eeg_session_manager, port=marker_ws_port).start()
+                print(f"   🏷️  EEG 标记 WebSocket: ws://0.0.0.0:{marker_ws_port}/")
+            except OSError as e:
+                print(f"   ⚠️  EEG 标记 WebSocket 启动失败: {e}")
+
+        init_eeg_service(eeg_server, eeg_session_manager, outlet=eeg_outlet, indexer=eeg_indexer)
         eeg_initialized = True
 
+        # 后台维护：旧会话重排布与保留策略
+        maintenance_hours = getattr(config, "EEG_MAINTENANCE_INTERVAL_HOURS", 0)
+        if maintenance_hours > 0:
+            from bci_flask_services.core.eeg_maintenance import start_maintenance_thread
+            start_maintenance_thread(app, eeg_session_manager, interval_hours=maintenance_hours)
+
         # 可选：自动启动 TCP 服务器
         if getattr(config, "EEG_AUTO_START", False):
             eeg_server.start()
@@ -575,9 +591,57 @@ def create_app():
         except Exception as e:
             print(f"   ⚠️  music_data 表字段检查/迁移失败: {str(e)}")
 
+        # 轻量级字段迁移：为 eeg_session 表补齐质量摘要字段
+        try:
+            cols = {c.get('name') for c in inspector.get_columns('eeg_session')}
+            altered = False
+            for col_name, col_type in (
+                ('padded_ratio', 'FLOAT NULL'),
+                ('flat_ratio', 'FLOAT NULL'),
+                ('saturation_ratio', 'FLOAT NULL'),
+                ('channel_stats', 'TEXT NULL'),
+                ('channel_count', 'INT NULL'),
+                ('storage_mode', 'VARCHAR(32) NULL'),
+            ):
+                if col_name not in cols:
+                    print(f"   🔧 为 eeg_session 表新增 {col_name} 字段...")
+                    db.session.execute(text(f"ALTER TABLE eeg_session ADD COLUMN {col_name} {col_type}"))
+                    altered = True
+            if altered:
+                db.session.commit()
+                print("   ✅ eeg_session 质量摘要字段已添加")
+        except Exception as e:
+            print(f"   ⚠️  eeg_session 表字段检查/迁移失败: {str(e)}")
+
+        # 轻量级索引迁移：会话列表的分页/用户过滤索引，并补齐旧记录的 start_time（分页键）
+        try:
+            from bci_flask_services.models import EegSession
+            from bci_flask_services.core.eeg_catalog import parse_session_time
+
+            indexes = {i.get('name') for i in inspector.get_indexes('eeg_session')}
+            for index in EegSession.__table__.indexes:
+                if index.name not in indexes:
+                    print(f"   🔧 为 eeg_session 表新增索引 {index.name}...")
+                    index.create(bind=db.engine)
+
+            backfilled = 0
+            for record in EegSession.query.filter(EegSession.start_time.is_(None)).all():
+                start_time = parse_session_time(record.session_id)
+                if start_time is not None:
+                    record.start_time = start_time
+                    backfilled += 1
+            if backfilled:
+                db.session.commit()
+                print(f"   ✅ 补齐 {backfilled} 条 eeg_session.start_time")
+        except Exception as e:
+            print(f"   ⚠️  eeg_session 索引检查/迁移失败: {str(e)}")
+
         # 本地文件同步到数据库
         _sync_local_files_to_db(inspector)
 
+    eeg_indexer.start(session_manager=eeg_session_manager if eeg_initialized else None)
+    print("   📂 EEG 会话目录由后台增量索引同步")
+
     # 列出核心路由
     print("\n📋 核心 API 端点：")
     core_endpoints = [
@@ -608,8 +672,23 @@ def create_app():
         "POST /api/eeg/server/stop",
         "POST /api/eeg/recording/start",
         "POST /api/eeg/recording/stop",
+        "POST /api/eeg/markers",
         "GET  /api/eeg/sessions",
+        "GET  /api/eeg/sessions/index",
+        "POST /api/eeg/sessions/index",
+        "GET  /api/eeg/sessions/<id>/overview",
+        "GET  /api/eeg/sessions/<id>/data",
+        "GET  /api/eeg/sessions/<id>/events",
+        "GET  /api/eeg/sessions/<id>/epochs",
+        "GET  /api/eeg/sessions/<id>/export",
+        "POST /api/eeg/sessions/<id>/export",
+        "GET  /api/eeg/exports/<job_id>",
         "GET  /api/eeg/realtime",
+        "GET  /api/eeg/metrics",
+        "GET  /api/eeg/outlet",
+        "GET  /api/eeg/flight-recorder",
+        "POST /api/eeg/flight-recorder/dump",
+        "GET  /api/eeg/erp",
         "GET  /api/inference/health",
         "GET  /api/video-rec/health",
     ]
@@ -2,9 +2,11 @@
 脑电读写服务 Blueprint
 提供 EEG 设备连接、录制控制和状态查询的 REST API
 """
-from flask import Blueprint, jsonify, request, current_app
+import io
+import threading
+import time
+from flask import Blueprint, Response, jsonify, request, current_app, send_file
 from pathlib import Path
-from datetime import datetime
 from bci_flask_services.core.auth import get_current_user
 
 eeg_bp = Blueprint('eeg_service', __name__)
@@ -12,21 +14,36 @@ eeg_bp = Blueprint('eeg_service', __name__)
 # 全局引用（在 app.py 中初始化）
 _eeg_server = None
 _session_manager = None
+_outlet = None
+_indexer = None
 
 
-def init_eeg_service(eeg_server, session_manager):
+def init_eeg_service(eeg_server, session_manager, outlet=None, indexer=None):
     """初始化 EEG 服务（由 app.py 调用）"""
-    global _eeg_server, _session_manager
+    global _eeg_server, _session_manager, _outlet, _indexer
     _eeg_server = eeg_server
     _session_manager = session_manager
+    _outlet = outlet
+    _indexer = indexer
+
+
+def _get_realtime_stats(session_id: str = None) -> dict:
+    """
+    实时统计：已初始化时经会话管理器获取（独立采集进程模式下来自子进程）
+
+    指定 session_id 时为该会话所在设备组的统计，会话不在录制时返回 None。
+    """
+    if _session_manager is not None:
+        return _session_manager.get_realtime_stats(session_id)
+    from bci_flask_services.core.eeg import realtime_stats
+    return realtime_stats.get_stats()
 
 
 @eeg_bp.route("/health", methods=["GET"])
 def health():
     """健康检查 - 即使服务未初始化也返回正常"""
     try:
-        from bci_flask_services.core.eeg import realtime_stats
-        stats = realtime_stats.get_stats()
+        stats = _get_realtime_stats()
         return jsonify({
             "status": "ok",
             "service": "eeg_service",
@@ -48,17 +65,36 @@ def health():
 
 @eeg_bp.route("/status", methods=["GET"])
 def get_status():
-    """获取详细状态 - 服务未初始化时返回默认状态"""
+    """
+    获取详细状态 - 服务未初始化时返回默认状态
+
+    ?session_id=... 时只返回该进行中会话的状态与其设备组的实时统计。
+    """
+    session_id = request.args.get("session_id")
+    if session_id and _session_manager is not None:
+        session_status = _session_manager.get_status(session_id)
+        if session_status is None:
+            return jsonify({"code": 0, "msg": f"Session not recording: {session_id}"}), 404
+        return jsonify({
+            "code": 1,
+            "data": {
+                "session": session_status,
+                "realtime": _get_realtime_stats(session_id),
+                "server_running": _eeg_server.running if _eeg_server else False,
+                "initialized": True
+            }
+        })
+
     try:
-        from bci_flask_services.core.eeg import realtime_stats
-        realtime = realtime_stats.get_stats()
+        realtime = _get_realtime_stats()
     except Exception:
         realtime = {
             "eeg": {"connected": False, "received": 0, "loss_rate": 0, "dropped": 0, "padded": 0},
             "trigger": {"connected": False, "received": 0, "loss_rate": 0, "dropped": 0, "padded": 0, "last_value": 0},
             "recording": False,
             "session_id": "",
-            "duration": 0
+            "duration": 0,
+            "quality": None
         }
 
     if _session_manager is None:
@@ -123,7 +159,14 @@ def send_start_cmd():
 
 @eeg_bp.route("/recording/start", methods=["POST"])
 def start_recording():
-    """开始录制（支持用户关联）"""
+    """
+    开始录制（支持用户关联）
+
+    请求体（可选）:
+        group: 设备组名（多实验台部署时指定，默认 default）
+        channels: 设备通道下标列表（0 起），只录制这些通道
+        montage: 与 channels 对应的标签列表，或 {"通道下标": "标签"}
+    """
     if _session_manager is None:
         return jsonify({"code": 0, "msg": "EEG service not initialized"}), 503
 
@@ -135,10 +178,15 @@ def start_recording():
     if user_id is None and user_account is None:
         return jsonify({"code": 0, "msg": "unauthorized: missing user identity"}), 401
 
+    data = request.get_json(silent=True) or {}
+
     # 调用带用户信息的录制
     success, result = _session_manager.start_new_session(
         user_id=user_id,
-        user_account=user_account
+        user_account=user_account,
+        channels=data.get("channels"),
+        montage=data.get("montage"),
+        group=data.get("group")
     )
     if success:
         return jsonify({
@@ -150,13 +198,42 @@ def start_recording():
         return jsonify({"code": 0, "msg": result})
 
 
+@eeg_bp.route("/markers", methods=["POST"])
+def add_marker():
+    """
+    软件标记：在实时 EEG 流的当前样本处打标记，写入会话事件表
+
+    请求体: {"value": 标记值（> 255，0–255 为硬件触发值）, "label": 可选（≤64 字节）, "duration": 可选（样本数，默认 0）,
+            "session_id": 可选（多个会话同时录制时必填）}
+    """
+    # 打点时刻以进入视图为准，不计入 JSON 解析等开销
+    at = time.perf_counter()
+    if _session_manager is None:
+        return jsonify({"code": 0, "msg": "EEG service not initialized"}), 503
+
+    from bci_flask_services.core.eeg_markers import parse_marker
+    payload = request.get_json(silent=True)
+    try:
+        value, label, duration = parse_marker(payload)
+    except ValueError as e:
+        return jsonify({"code": 0, "msg": str(e)}), 400
+
+    success, result = _session_manager.add_marker(
+        value, label=label, duration=duration, at=at, session_id=payload.get("session_id")
+    )
+    if not success:
+        return jsonify({"code": 0, "msg": result}), 409
+    return jsonify({"code": 1, "data": result})
+
+
 @eeg_bp.route("/recording/stop", methods=["POST"])
 def stop_recording():
-    """停止录制并保存到数据库"""
+    """停止录制并保存到数据库（请求体 {"session_id": ...}，只有一个会话在录制时可省略）"""
     if _session_manager is None:
         return jsonify({"code": 0, "msg": "EEG service not initialized"}), 503
 
-    success, result = _session_manager.stop_session()
+    data = request.get_json(silent=True) or {}
+    success, result = _session_manager.stop_session(data.get("session_id"))
     if success:
         # 保存到数据库
         try:
@@ -164,6 +241,9 @@ def stop_recording():
         except Exception as e:
             print(f"⚠️ 保存 EEG 会话到数据库失败: {e}")
 
+        # 后台增量写入特征库（不阻塞请求）
+        _schedule_feature_store_update(result)
+
         return jsonify({
             "code": 1,
             "msg": "Recording stopped",
@@ -175,87 +255,621 @@ def stop_recording():
 
 @eeg_bp.route("/sessions", methods=["GET"])
 def get_sessions():
-    """获取所有录制会话列表"""
+    """
+    查询录制会话列表（数据库目录，keyset 分页，不访问文件系统）
+
+    默认只返回当前用户的会话；管理员可用 user_id / user_account 指定用户，不指定则返回全部。
+    查询参数（均可选）:
+        start, end: 开始时间范围 [start, end)，ISO 日期或日期时间（end 只给日期时包含当天）
+        min_duration, max_duration: 时长范围（秒）
+        max_padded_ratio, max_flat_ratio, max_saturation_ratio: 质量比例上限
+        cursor: 上一页返回的 next_cursor
+        limit: 每页条数（默认 50，最大 500）
+    """
+    from bci_flask_services.core import eeg_catalog
+    from bci_flask_services.core.auth import is_admin
+
+    current = get_current_user()
+    if not current:
+        return jsonify({"code": 0, "msg": "unauthorized"}), 401
+
+    args = request.args
+    try:
+        if is_admin(current):
+            user_id = args.get("user_id", type=int)
+            user_account = args.get("user_account") or None
+        else:
+            user_id = current.id
+            user_account = getattr(current, "account", None) or getattr(current, "username", None)
+
+        def _float(name):
+            value = args.get(name)
+            return float(value) if value not in (None, "") else None
+
+        items, next_cursor = eeg_catalog.query_sessions(
+            user_id=user_id,
+            user_account=user_account,
+            start=eeg_catalog.parse_time_bound(args.get("start")),
+            end=eeg_catalog.parse_time_bound(args.get("end"), end=True),
+            min_duration=_float("min_duration"),
+            max_duration=_float("max_duration"),
+            max_padded_ratio=_float("max_padded_ratio"),
+            max_flat_ratio=_float("max_flat_ratio"),
+            max_saturation_ratio=_float("max_saturation_ratio"),
+            cursor=args.get("cursor") or None,
+            limit=args.get("limit", eeg_catalog.DEFAULT_PAGE_SIZE, type=int),
+        )
+    except ValueError as e:
+        return jsonify({"code": 0, "msg": f"Invalid parameter: {e}"}), 400
+
+    return jsonify({"code": 1, "data": items, "next_cursor": next_cursor})
+
+
+@eeg_bp.route("/sessions/index", methods=["GET"])
+def get_session_index():
+    """会话目录后台索引状态（最近一轮扫描的耗时、新增/更新数、待完成会话数）"""
+    if _indexer is None:
+        return jsonify({"code": 0, "msg": "EEG session indexer not initialized"}), 503
+    return jsonify({"code": 1, "data": _indexer.get_status()})
+
+
+@eeg_bp.route("/sessions/index", methods=["POST"])
+def rescan_session_index():
+    """按需触发一轮会话目录扫描（仅管理员，异步执行，结果见 GET /sessions/index）"""
+    from bci_flask_services.core.auth import is_admin
+
+    if _indexer is None:
+        return jsonify({"code": 0, "msg": "EEG session indexer not initialized"}), 503
+    current = get_current_user()
+    if not current:
+        return jsonify({"code": 0, "msg": "unauthorized"}), 401
+    if not is_admin(current):
+        return jsonify({"code": 0, "msg": "forbidden"}), 403
+    _indexer.request_scan()
+    return jsonify({"code": 1, "msg": "scan requested", "data": _indexer.get_status()}), 202
+
+
+@eeg_bp.route("/sessions/<session_id>/overview", methods=["GET"])
+def get_session_overview(session_id: str):
+    """
+    按时间跨度与像素宽度读取会话 min/max 概览（自动选择金字塔级别）
+
+    只读：缺少金字塔的旧会话从原始数据现算，由后台维护补建金字塔。
+    """
+    from bci_flask_services.core.eeg_reader import read_overview
+
+    eeg_file = _resolve_session_file(session_id, "eeg_file")
+    if eeg_file is None:
+        return jsonify({"code": 0, "msg": "session not found"}), 404
+
+    try:
+        start = int(request.args.get("start", 0))
+        end = request.args.get("end")
+        end = int(end) if end not in (None, "") else None
+        width = int(request.args.get("width", 1000))
+    except ValueError:
+        return jsonify({"code": 0, "msg": "invalid start/end/width"}), 400
+
+    overview = read_overview(eeg_file, start=start, end=end, pixel_width=width)
+    return jsonify({
+        "code": 1,
+        "data": {
+            "factor": overview["factor"],
+            "start": overview["start"],
+            "sample_rate": overview["sample_rate"],
+            "min": overview["min"].tolist(),
+            "max": overview["max"].tolist(),
+        }
+    })
+
+
+@eeg_bp.route("/sessions/<session_id>/data", methods=["GET"])
+def get_session_data(session_id: str):
+    """
+    按样本/时间范围读取会话数据（二进制流式返回，不走 JSON）
+
+    查询参数:
+        start/end: 区间（默认整段），unit=samples|s
+        channels: 逗号分隔的通道下标（默认全部）
+        decimate: 抽取倍数（每 N 个样本取 1 个）
+        stream: eeg|trigger
+        format: npy（默认）| raw（小端、样本优先交错的裸字节）
+        units: uv（默认）| counts（原始计数存储的会话可直接取无损 int32 计数）
+    """
+    import numpy as np
+    from bci_flask_services.core.eeg_reader import (
+        EEG_DATASET, TRIGGER_DATASET, describe_range, iter_range_blocks
+    )
+
+    stream = (request.args.get("stream") or "eeg").strip().lower()
+    if stream not in ("eeg", "trigger"):
+        return jsonify({"code": 0, "msg": "stream must be eeg or trigger"}), 400
+    fmt = (request.args.get("format") or "npy").strip().lower()
+    if fmt not in ("npy", "raw"):
+        return jsonify({"code": 0, "msg": "format must be npy or raw"}), 400
+    units = (request.args.get("units") or "uv").strip().lower()
+    if units not in ("uv", "counts"):
+        return jsonify({"code": 0, "msg": "units must be uv or counts"}), 400
+    scaled = units == "uv"
+
+    h5_file = _resolve_session_file(session_id, "eeg_file" if stream == "eeg" else "trigger_file")
+    if h5_file is None:
+        return jsonify({"code": 0, "msg": "session not found"}), 404
+    dataset_name = EEG_DATASET if stream == "eeg" else TRIGGER_DATASET
+
+    try:
+        raw_channels = (request.args.get("channels") or "").strip()
+        channels = [int(c) for c in raw_channels.split(",") if c.strip()] if raw_channels else None
+        info = describe_range(
+            h5_file,
+            dataset_name,
+            start=request.args.get("start") or None,
+            end=request.args.get("end") or None,
+            unit=(request.args.get("unit") or "samples").strip().lower(),
+            channels=channels,
+            decimate=int(request.args.get("decimate", 1)),
+            scaled=scaled,
+        )
+    except ValueError:
+        return jsonify({"code": 0, "msg": "invalid start/end/channels/decimate"}), 400
+
+    dtype = np.dtype(info["dtype"]).newbyteorder("<")
+    shape = info["shape"]
+    selected = info["channels"] if (channels is not None and stream == "eeg") else None
+
+    def _generate():
+        if fmt == "npy":
+            header = io.BytesIO()
+            np.lib.format.write_array_header_1_0(header, {
+                "descr": np.lib.format.dtype_to_descr(dtype),
+                # (channels, samples) 以列优先存放，等价于按样本交错，可逐块写出
+                "fortran_order": len(shape) == 2,
+                "shape": shape,
+            })
+            yield header.getvalue()
+        for block in iter_range_blocks(h5_file, dataset_name, info["start"], info["end"],
+                                       selected, info["decimate"], scaled=scaled):
+            yield np.ascontiguousarray(block.T, dtype=dtype).tobytes()
+
+    if len(shape) == 2:
+        raw_shape = f"{shape[1]},{shape[0]}"
+    else:
+        raw_shape = str(shape[0])
+    headers = {
+        "X-EEG-Start": str(info["start"]),
+        "X-EEG-End": str(info["end"]),
+        "X-EEG-Decimate": str(info["decimate"]),
+        "X-EEG-Sample-Rate": str(info["sample_rate"]),
+        "X-EEG-Channels": ",".join(str(c) for c in info["channels"]),
+        "X-EEG-Dtype": dtype.str,
+        "X-EEG-Shape": raw_shape if fmt == "raw" else ",".join(str(n) for n in shape),
+    }
+    if not scaled and info["uv_per_count"] is not None:
+        headers["X-EEG-UV-Per-Count"] = repr(info["uv_per_count"])
+    if fmt == "npy":
+        headers["Content-Disposition"] = f'attachment; filename="{session_id}_{stream}.npy"'
+    return Response(_generate(), mimetype="application/octet-stream", headers=headers)
+
+
+@eeg_bp.route("/sessions/<session_id>/events", methods=["GET"])
+def get_session_events(session_id: str):
+    """
+    查询会话触发事件（value=逗号分隔的触发值，start/end 区间，unit=samples|s）
+
+    在线检测的伪迹段以保留负值出现：-1 眨眼、-2 肌电、-3 电极跳变（duration 为段长）。
+    """
+    from bci_flask_services.core.eeg_reader import find_events
+
+    trigger_file = _resolve_session_file(session_id, "trigger_file")
+    if trigger_file is None:
+        return jsonify({"code": 0, "msg": "session not found"}), 404
+
+    try:
+        raw_values = (request.args.get("value") or "").strip()
+        values = [int(v) for v in raw_values.split(",") if v.strip()] if raw_values else None
+        events = find_events(
+            trigger_file,
+            values=values,
+            start=request.args.get("start") or None,
+            end=request.args.get("end") or None,
+            unit=(request.args.get("unit") or "samples").strip().lower(),
+        )
+    except ValueError:
+        return jsonify({"code": 0, "msg": "invalid value/start/end"}), 400
+
+    return jsonify({
+        "code": 1,
+        "data": [
+            {"sample": int(e["sample"]), "value": int(e["value"]), "duration": int(e["duration"])}
+            for e in events
+        ]
+    })
+
+
+@eeg_bp.route("/sessions/<session_id>/epochs", methods=["GET"])
+def get_session_epochs(session_id: str):
+    """
+    按触发码切分 epoch，返回 npz（epochs/events/times/channels/sample_rate）
+
+    查询参数:
+        codes: 逗号分隔的触发值（必填）
+        tmin/tmax: 相对触发的时间窗（秒），默认 -0.2 / 0.8
+        baseline: "bmin,bmax"（秒），留空表示不做基线校正
+        channels: 逗号分隔的通道下标
+        reject_artifacts: 剔除与伪迹段重叠的 epoch，"1"/"true" 为全部类型，
+            或逗号分隔的类型（blink,emg,pop）
+    """
+    from bci_flask_services.core.eeg_epochs import extract_epochs
+
+    eeg_file = _resolve_session_file(session_id, "eeg_file")
+    trigger_file = _resolve_session_file(session_id, "trigger_file")
+    if eeg_file is None or trigger_file is None:
+        return jsonify({"code": 0, "msg": "session not found"}), 404
+
+    def _int_list(name):
+        raw = (request.args.get(name) or "").strip()
+        return [int(v) for v in raw.split(",") if v.strip()] if raw else None
+
+    try:
+        codes = _int_list("codes")
+        if not codes:
+            return jsonify({"code": 0, "msg": "missing codes"}), 400
+        tmin = float(request.args.get("tmin", -0.2))
+        tmax = float(request.args.get("tmax", 0.8))
+        raw_baseline = (request.args.get("baseline") or "").strip()
+        baseline = None
+        if raw_baseline:
+            parts = [p.strip() for p in raw_baseline.split(",")]
+            if len(parts) != 2:
+                raise ValueError("baseline")
+            baseline = tuple(float(p) if p else None for p in parts)
+        raw_reject = (request.args.get("reject_artifacts") or "").strip().lower()
+        if raw_reject in ("", "0", "false"):
+            reject_artifacts = None
+        elif raw_reject in ("1", "true"):
+            reject_artifacts = True
+        else:
+            reject_artifacts = [k.strip() for k in raw_reject.split(",") if k.strip()]
+        result = extract_epochs(eeg_file, trigger_file, codes, tmin, tmax,
+                                baseline=baseline, channels=_int_list("channels"),
+                                reject_artifacts=reject_artifacts)
+    except ValueError:
+        return jsonify({"code": 0, "msg": "invalid codes/tmin/tmax/baseline/channels/reject_artifacts"}), 400
+
+    resp = send_file(result["cache_file"], mimetype="application/octet-stream",
+                     as_attachment=True, download_name=f"{session_id}_epochs.npz")
+    resp.headers["X-EEG-Epochs"] = str(len(result["epochs"]))
+    resp.headers["X-EEG-Rejected"] = str(result["rejected"])
+    resp.headers["X-EEG-Cache"] = "hit" if result["cached"] else "miss"
+    return resp
+
+
+EXPORT_MIMETYPES = {
+    "bdf": "application/octet-stream",
+    "edf": "application/octet-stream",
+    "npz": "application/octet-stream",
+}
+
+
+@eeg_bp.route("/sessions/<session_id>/export", methods=["GET"])
+def export_session(session_id: str):
+    """
+    流式导出会话（分块传输，不生成临时文件）
+
+    查询参数:
+        format: bdf（默认，24 位无损）/ edf（16 位）/ npz
+    """
+    from bci_flask_services.core.eeg_export import EXPORT_FORMATS, iter_export
+
+    fmt = (request.args.get("format") or "bdf").lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"code": 0, "msg": f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+
+    eeg_file = _resolve_session_file(session_id, "eeg_file")
+    if eeg_file is None:
+        return jsonify({"code": 0, "msg": "session not found"}), 404
+    trigger_file = _resolve_session_file(session_id, "trigger_file")
+
+    # 先取第一块（头部）再返回，使文件/参数错误能以 JSON 报出
+    stream = iter_export(eeg_file, trigger_file, fmt=fmt, patient=_session_account(session_id))
+    try:
+        first = next(stream)
+    except Exception as e:
+        return jsonify({"code": 0, "msg": f"export failed: {e}"}), 500
+
+    def _generate():
+        yield first
+        yield from stream
+
+    resp = Response(_generate(), mimetype=EXPORT_MIMETYPES[fmt])
+    resp.headers["Content-Disposition"] = f"attachment; filename={session_id}.{fmt}"
+    return resp
+
+
+@eeg_bp.route("/sessions/<session_id>/export", methods=["POST"])
+def start_export_job(session_id: str):
+    """
+    启动后台导出任务，输出写入会话目录下的 exports/；请求体 {"format": "bdf"}
+
+    同一会话同一格式已有导出在进行时返回 409 与该任务。
+    """
+    from bci_flask_services.core.eeg_export import EXPORT_FORMATS, export_jobs
+
+    data = request.get_json(silent=True) or {}
+    fmt = str(data.get("format") or "bdf").lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"code": 0, "msg": f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+
+    eeg_file = _resolve_session_file(session_id, "eeg_file")
+    if eeg_file is None:
+        return jsonify({"code": 0, "msg": "session not found"}), 404
+    trigger_file = _resolve_session_file(session_id, "trigger_file")
+
+    out_path = Path(eeg_file).parent / "exports" / f"{session_id}.{fmt}"
+    job_id, created = export_jobs.start(session_id, eeg_file, trigger_file, fmt, out_path,
+                                        patient=_session_account(session_id))
+    if not created:
+        return jsonify({"code": 0, "msg": "export already running", "data": export_jobs.get(job_id)}), 409
+    return jsonify({"code": 1, "msg": "export started", "data": export_jobs.get(job_id)}), 202
+
+
+@eeg_bp.route("/exports/<job_id>", methods=["GET"])
+def get_export_job(job_id: str):
+    """查询导出任务进度"""
+    from bci_flask_services.core.eeg_export import export_jobs
+
+    job = export_jobs.get(job_id)
+    if job is None or _resolve_session_file(job["session_id"], "eeg_file") is None:
+        return jsonify({"code": 0, "msg": "job not found"}), 404
+    return jsonify({"code": 1, "data": job})
+
+
+@eeg_bp.route("/exports/<job_id>/download", methods=["GET"])
+def download_export(job_id: str):
+    """下载已完成的导出文件"""
+    from bci_flask_services.core.eeg_export import export_jobs
+
+    job = export_jobs.get(job_id)
+    if job is None or _resolve_session_file(job["session_id"], "eeg_file") is None:
+        return jsonify({"code": 0, "msg": "job not found"}), 404
+    if job["status"] != "done":
+        return jsonify({"code": 0, "msg": f"job is {job['status']}", "data": job}), 409
+    return send_file(job["path"], mimetype=EXPORT_MIMETYPES[job["format"]],
+                     as_attachment=True, download_name=Path(job["path"]).name)
+
+
+@eeg_bp.route("/realtime", methods=["GET"])
+def get_realtime_stats():
+    """获取实时统计数据（?session_id=... 时为该会话所在设备组）"""
+    session_id = request.args.get("session_id")
+    stats = _get_realtime_stats(session_id)
+    if stats is None:
+        return jsonify({"code": 0, "msg": f"Session not recording: {session_id}"}), 404
+    return jsonify({"code": 1, "data": stats})
+
+
+@eeg_bp.route("/metrics", methods=["GET"])
+def get_pipeline_metrics():
+    """采集管线指标（Prometheus 文本格式）"""
+    if _session_manager is not None:
+        text = _session_manager.render_metrics()
+    else:
+        from bci_flask_services.core.eeg_metrics import pipeline_metrics
+        text = pipeline_metrics.render()
+    return Response(text, mimetype="text/plain; version=0.0.4")
+
+
+@eeg_bp.route("/outlet", methods=["GET"])
+def get_outlet_status():
+    """实时流转发状态（订阅者、待发送字节、丢弃样本数）"""
+    if _outlet is None:
+        return jsonify({"code": 0, "msg": "outlet not enabled (EEG_OUTLET_PORT)"}), 404
+    return jsonify({"code": 1, "data": _outlet.get_status()})
+
+
+@eeg_bp.route("/flight-recorder", methods=["GET"])
+def get_flight_recorder():
+    """飞行记录器状态与最近的转储文件"""
+    if _session_manager is not None:
+        return jsonify({"code": 1, "data": _session_manager.get_flight_status()})
+    from bci_flask_services.core.eeg_flight import flight_recorder
+    return jsonify({"code": 1, "data": flight_recorder.get_status()})
+
+
+@eeg_bp.route("/flight-recorder/dump", methods=["POST"])
+def dump_flight_recorder():
+    """
+    按需转储飞行记录器（录制中写入会话目录，否则写入数据目录下的 flight_recorder/）
+
+    多个设备组同时录制时可用 ?session_id= 指定写入哪个会话的目录。
+    """
     if _session_manager is None:
         return jsonify({"code": 0, "msg": "EEG service not initialized"}), 503
 
-    sessions = _session_manager.get_sessions()
-    sessions_data = []
-    for s in sessions:
-        sessions_data.append({
-            "id": s.get("id"),
-            "dir": str(s.get("dir", "")),
-            "start_time": s.get("start_time"),
-            "end_time": s.get("end_time"),
-            "samples": s.get("samples", 0),
-            "duration": s.get("duration", 0)
+    try:
+        path = _session_manager.dump_flight(session_id=request.args.get("session_id") or None)
+    except (OSError, RuntimeError) as e:
+        return jsonify({"code": 0, "msg": f"dump failed: {e}"}), 500
+    return jsonify({"code": 1, "data": {"path": str(path)}})
+
+
+@eeg_bp.route("/erp", methods=["GET"])
+def get_erp():
+    """
+    获取在线 ERP 平均结果
+
+    不带 code 时返回各触发码已累积的 epoch 数；
+    带 code 时返回该码的均值/标准差（channels 可选，逗号分隔）。
+    ?session_id=... 时为该进行中会话所在设备组，否则为默认设备组。
+    """
+    if _session_manager is None:
+        return jsonify({"code": 0, "msg": "EEG service not initialized"}), 503
+
+    session_id = request.args.get("session_id")
+    averager = _session_manager.get_erp_averager(session_id)
+    if averager is None:
+        return jsonify({"code": 0, "msg": f"Session not recording: {session_id}"}), 404
+    raw_code = (request.args.get("code") or "").strip()
+    if not raw_code:
+        return jsonify({
+            "code": 1,
+            "data": {
+                "window": averager.window,
+                "codes": {str(k): v for k, v in sorted(averager.get_codes().items())},
+                "missed": averager.missed,
+            }
         })
 
-    return jsonify({"code": 1, "data": sessions_data})
+    try:
+        trigger_code = int(raw_code)
+        raw_channels = (request.args.get("channels") or "").strip()
+        channels = [int(c) for c in raw_channels.split(",") if c.strip()] if raw_channels else None
+    except ValueError:
+        return jsonify({"code": 0, "msg": "invalid code/channels"}), 400
+
+    result = averager.get_average(trigger_code)
+    if result is None:
+        return jsonify({"code": 0, "msg": "no epochs for this code yet"}), 404
+    n, mean, std = result
+    if channels is not None:
+        channels = [c for c in channels if 0 <= c < mean.shape[0]]
+        mean = mean[channels]
+        std = std[channels]
 
+    return jsonify({
+        "code": 1,
+        "data": {
+            "trigger_code": trigger_code,
+            "count": n,
+            "window": averager.window,
+            "channels": channels if channels is not None else list(range(mean.shape[0])),
+            "mean": mean.round(4).tolist(),
+            "std": std.round(4).tolist(),
+        }
+    })
 
-@eeg_bp.route("/realtime", methods=["GET"])
-def get_realtime_stats():
-    """获取实时统计数据"""
-    from bci_flask_services.core.eeg import realtime_stats
-    return jsonify({"code": 1, "data": realtime_stats.get_stats()})
 
+def _can_access_session(user_id, user_account) -> bool:
+    """当前用户能否读取该会话：管理员可读全部，其他用户只能读自己的（规则同 GET /sessions）"""
+    from bci_flask_services.core.auth import is_admin
 
-def _save_session_to_db(session_id: str):
-    """保存会话记录到数据库"""
-    from bci_flask_services.db import db
-    from bci_flask_services.models import EegSession
+    current = get_current_user()
+    if not current:
+        return False
+    if is_admin(current):
+        return True
+    account = getattr(current, "account", None) or getattr(current, "username", None)
+    return (user_id is not None and user_id == current.id) or (bool(account) and user_account == account)
+
+
+def _resolve_session_file(session_id: str, kind: str = "eeg_file"):
+    """
+    查找会话的 HDF5 文件路径：优先数据库记录，其次本次运行内的会话目录
 
+    会话不存在或不属于当前用户时都返回 None（接口统一返回 404，不暴露会话是否存在）。
+    """
+    pattern = "*_eeg_*.h5" if kind == "eeg_file" else "*_trigger_*.h5"
+
+    session_dir = None
+    try:
+        from bci_flask_services.models import EegSession
+        record = EegSession.query.filter_by(session_id=session_id).first()
+        if record is not None:
+            if not _can_access_session(record.user_id, record.user_account):
+                return None
+            path = getattr(record, kind, None)
+            if path and Path(path).exists():
+                return path
+            session_dir = record.session_dir
+    except Exception:
+        pass
+
+    if session_dir is None and _session_manager is not None:
+        for s in _session_manager.sessions:
+            if s.get("id") == session_id:
+                if not _can_access_session(s.get("user_id"), s.get("user_account")):
+                    return None
+                session_dir = s.get("dir")
+                break
+
+    if session_dir and Path(session_dir).exists():
+        for f in Path(session_dir).glob(pattern):
+            return str(f)
+    return None
+
+
+def _session_account(session_id: str) -> str:
+    """会话所属账号（用于导出文件头的受试者字段），未知时返回 X"""
+    try:
+        from bci_flask_services.models import EegSession
+        record = EegSession.query.filter_by(session_id=session_id).first()
+        if record is not None and record.user_account:
+            return record.user_account
+    except Exception:
+        pass
+    return "X"
+
+
+def _schedule_feature_store_update(session_id: str):
+    """录制结束后在后台线程把会话特征写入列式特征库"""
+    from bci_flask_services import config
+    from bci_flask_services.core import eeg_features
+
+    if not getattr(config, "EEG_FEATURE_STORE_AUTO", True) or not eeg_features.is_available():
+        return
     if _session_manager is None:
         return
 
-    # 从 sessions 列表中找到对应会话
     session_data = None
     for s in _session_manager.sessions:
         if s.get("id") == session_id:
             session_data = s
             break
-
     if session_data is None:
         return
 
-    # 查找 EEG 和 Trigger 文件
     session_dir = Path(session_data.get("dir", ""))
-    eeg_file = None
-    trigger_file = None
+    eeg_file = next(iter(session_dir.glob("*_eeg_*.h5")), None) if session_dir.exists() else None
+    if eeg_file is None:
+        return
+    session = {
+        "session_id": session_id,
+        "session_dir": str(session_dir),
+        "eeg_file": str(eeg_file),
+        "user_id": session_data.get("user_id"),
+        "user_account": session_data.get("user_account"),
+        "start_time": session_data.get("start_time"),
+        "duration": session_data.get("duration"),
+        "samples": session_data.get("samples"),
+        "stats": session_data.get("stats"),
+    }
+
+    def _run():
+        try:
+            eeg_features.update_session_features(session)
+        except Exception as e:
+            print(f"⚠️ 写入 EEG 特征库失败: {e}")
 
-    if session_dir.exists():
-        for f in session_dir.glob("*_eeg_*.h5"):
-            eeg_file = str(f)
-            break
-        for f in session_dir.glob("*_trigger_*.h5"):
-            trigger_file = str(f)
-            break
+    threading.Thread(target=_run, daemon=True).start()
 
-    # 解析时间
-    start_time = None
-    end_time = None
-    try:
-        if session_data.get("start_time"):
-            start_time = datetime.fromisoformat(session_data["start_time"])
-        if session_data.get("end_time"):
-            end_time = datetime.fromisoformat(session_data["end_time"])
-    except Exception:
-        pass
 
-    # 创建数据库记录
-    record = EegSession(
-        session_id=session_id,
-        user_id=session_data.get("user_id"),
-        user_account=session_data.get("user_account"),
-        session_dir=str(session_dir),
-        eeg_file=eeg_file,
-        trigger_file=trigger_file,
-        duration=session_data.get("duration", 0),
-        samples=session_data.get("samples", 0),
-        start_time=start_time,
-        end_time=end_time
-    )
+def _save_session_to_db(session_id: str):
+    """保存会话记录到数据库（已由启动同步写入时更新为录制结束时的完整信息）"""
+    from bci_flask_services.db import db
+    from bci_flask_services.core.eeg_catalog import session_fields, upsert_session
+
+    if _session_manager is None:
+        return
+
+    # 从 sessions 列表中找到对应会话
+    session_data = None
+    for s in _session_manager.sessions:
+        if s.get("id") == session_id:
+            session_data = s
+            break
+
+    if session_data is None:
+        return
 
-    db.session.add(record)
+    upsert_session(session_fields(session_data, Path(session_data.get("dir", ""))))
     db.session.commit()
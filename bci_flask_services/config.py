@@ -105,6 +105,62 @@ EEG_DATA_DIR = Path(os.getenv(
     "EEG_DATA_DIR",
     str(RUNTIME_BASE_DIR / "data") if getattr(sys, "frozen", False) else str(Path(__file__).parent.parent / "data")
 ))
+# 其他实验台的设备组（同一 TCP 服务器按设备 IP 区分，每组可同时录制一个会话）：
+# "bay2=192.168.1.112,192.168.1.113;bay3=192.168.1.122,192.168.1.123"（组名=EEG IP,Trigger IP）
+EEG_DEVICE_GROUPS = os.getenv("EEG_DEVICE_GROUPS", "").strip()
+# 所有会话共享的 HDF5 写入线程数
+EEG_WRITER_WORKERS = int(os.getenv("EEG_WRITER_WORKERS", "2"))
 # 是否自动启动 EEG 服务器（默认关闭，需要手动启动）
 EEG_AUTO_START = os.getenv("EEG_AUTO_START", "0").strip().lower() in {"1", "true", "yes", "on"}
 
+# EEG 采集运行方式：thread（在 Flask 进程内的线程中，默认）/ process（独立子进程，样本经共享内存环发布，
+# 避免与请求处理、音乐生成争用 GIL）
+EEG_INGEST_MODE = os.getenv("EEG_INGEST_MODE", "thread").strip().lower()
+# 共享内存样本环的容量（秒）
+EEG_SHM_RING_SECONDS = float(os.getenv("EEG_SHM_RING_SECONDS", "30"))
+
+# 实时流转发端口（0 表示不启用），其他分析节点经 TCP 订阅录制中的样本；
+# 每个数据块的时长（毫秒）与每个订阅者的待发送上限（MB，超出时丢弃最旧的数据块）
+EEG_OUTLET_HOST = os.getenv("EEG_OUTLET_HOST", "0.0.0.0")
+EEG_OUTLET_PORT = int(os.getenv("EEG_OUTLET_PORT", "0"))
+EEG_OUTLET_BLOCK_MS = float(os.getenv("EEG_OUTLET_BLOCK_MS", "20"))
+EEG_OUTLET_MAX_PENDING_MB = float(os.getenv("EEG_OUTLET_MAX_PENDING_MB", "4"))
+
+# 软件标记 WebSocket 端口（0 表示不启用；HTTP 入口 POST /api/eeg/markers 始终可用）
+EEG_MARKER_WS_PORT = int(os.getenv("EEG_MARKER_WS_PORT", "0"))
+
+# EEG 存储模式：uv（float32 µV，默认）/ counts（int32 原始 ADC 计数，无损且压缩率更高）
+EEG_STORAGE_MODE = os.getenv("EEG_STORAGE_MODE", "uv").strip().lower()
+
+# 工频（Hz），实时信号质量监测据此计算工频干扰占比
+EEG_LINE_FREQ = float(os.getenv("EEG_LINE_FREQ", "50"))
+
+# 在线 ERP 平均的刺激后窗口（毫秒，设备采样率 1000Hz 时等于样本数）
+EEG_ERP_WINDOW_MS = int(os.getenv("EEG_ERP_WINDOW_MS", "800"))
+
+# 列式特征库目录（Parquet，需要 pyarrow）；录制结束后是否自动写入
+EEG_FEATURE_STORE_DIR = Path(os.getenv("EEG_FEATURE_STORE_DIR", str(EEG_DATA_DIR / "feature_store")))
+EEG_FEATURE_STORE_AUTO = os.getenv("EEG_FEATURE_STORE_AUTO", "1").strip().lower() in {"1", "true", "yes", "on"}
+
+# 会话回读缓存：最多保持打开的 HDF5 文件数与解压块缓存总内存上限（MB）
+EEG_READ_CACHE_FILES = int(os.getenv("EEG_READ_CACHE_FILES", "16"))
+EEG_READ_CACHE_MB = int(os.getenv("EEG_READ_CACHE_MB", "256"))
+
+# 后台维护：早于 N 天的会话改写为归档排布（0 表示不改写）
+EEG_RELAYOUT_AFTER_DAYS = float(os.getenv("EEG_RELAYOUT_AFTER_DAYS", "7"))
+# 保留策略：超过天数或总配额（GB）的会话移动到归档目录，未配置归档目录则删除（0 表示不限制）
+EEG_RETENTION_DAYS = float(os.getenv("EEG_RETENTION_DAYS", "0"))
+EEG_RETENTION_QUOTA_GB = float(os.getenv("EEG_RETENTION_QUOTA_GB", "0"))
+EEG_ARCHIVE_DIR = os.getenv("EEG_ARCHIVE_DIR", "").strip() or None
+# 维护周期（小时，0 表示不启动后台维护线程）
+EEG_MAINTENANCE_INTERVAL_HOURS = float(os.getenv("EEG_MAINTENANCE_INTERVAL_HOURS", "24"))
+
+# 会话目录后台增量索引的扫描周期（秒）；0 表示只在启动后与按需触发（POST /api/eeg/sessions/index）时扫描
+EEG_INDEX_INTERVAL_SECONDS = float(os.getenv("EEG_INDEX_INTERVAL_SECONDS", "300"))
+
+# 采集飞行记录器：环形缓冲容量（事件数）
+EEG_FLIGHT_RECORDER_EVENTS = int(os.getenv("EEG_FLIGHT_RECORDER_EVENTS", "65536"))
+# 自动转储阈值：1 秒内累计丢包数 / 写入滞后（秒），0 表示不按该项转储；两次自动转储的最小间隔（秒）
+EEG_FLIGHT_LOSS_PACKETS = int(os.getenv("EEG_FLIGHT_LOSS_PACKETS", "50"))
+EEG_FLIGHT_LAG_SECONDS = float(os.getenv("EEG_FLIGHT_LAG_SECONDS", "2.0"))
+EEG_FLIGHT_COOLDOWN_SECONDS = float(os.getenv("EEG_FLIGHT_COOLDOWN_SECONDS", "60"))
@@ -6,8 +6,11 @@ EEG 设备连接核心模块
 - 使用独立线程处理设备连接和数据接收，不阻塞 Flask 主线程
 - 双缓冲机制：实时数据写入内存缓冲，异步写入磁盘
 - 丢包补偿：检测序列号跳跃，用前一帧数据填充丢失帧
+- 多实验台：设备按 IP 归属设备组，每个设备组可同时录制一个会话，
+  各会话的磁盘写入由固定大小的共享线程池（WriterPool）完成
 """
 
+import io
 import time
 import h5py
 import socket
@@ -19,6 +22,18 @@ from datetime import datetime
 from typing import Optional, Union
 import numpy as np
 
+from bci_flask_services.core.eeg_flight import (
+    EVENT_ARRIVAL,
+    EVENT_DISCARD,
+    EVENT_QUEUE,
+    STREAM_CODES,
+    STREAM_EEG,
+    STREAM_TRIGGER,
+    flight_recorder,
+)
+from bci_flask_services.core.eeg_metrics import RateMeter, pipeline_metrics
+from bci_flask_services.core.eeg_online import ArtifactDetector, OnlineERPAverager, SignalQualityMonitor
+
 StrPath = Union[str, Path]
 
 # ============================================
@@ -29,12 +44,119 @@ EEG_DEVICE_BYTES_PER_CHANNEL = 3
 EEG_BOX_START_BYTES = b"\xA1\x05"
 TRIGGER_BOX_START_BYTES = b"\xAA\x56"
 EEG_DEVICE_START_INSTRUCTION = b"\xBB\x66\x01"
-
-# 全局连接状态
+# 设备采样率（Hz），写入 HDF5 属性供读取端做时间/样本换算
+EEG_SAMPLE_RATE = 1000
+
+# 24 位 ADC 计数到 µV 的换算系数与满量程（用于饱和检测）
+EEG_UV_PER_COUNT = 0.02483
+EEG_FULL_SCALE_UV = 8388608 * EEG_UV_PER_COUNT
+EEG_SATURATION_RATIO = 0.999
+
+# 存储模式：uv 为 float32 µV；counts 为 int32 原始 ADC 计数（无损，
+# 换算系数写入数据集属性 uv_per_count，由读取端按需换算）
+EEG_STORAGE_MODES = ("uv", "counts")
+
+# 在线 ERP 平均的刺激后窗口长度（样本数）
+ERP_WINDOW_SAMPLES = 800
+
+# 概览金字塔（min/max 降采样）各级倍数，后一级必须是前一级的整数倍
+OVERVIEW_FACTORS = (10, 100, 1000)
+OVERVIEW_GROUP = "overview"
+
+# 触发事件表（稀疏索引）：每个非零触发值的连续段记为一个事件
+EVENTS_DATASET = "events"
+EVENT_DTYPE = np.dtype([("sample", "<i8"), ("value", "<i4"), ("duration", "<i8")])
+
+# 软件标记（前端/范式程序经 API 打的标记）：原始记录保存在 trigger 文件的 markers 数据集，
+# 并按 sample 顺序合并进事件表；received 为服务端收到请求的 Unix 时间
+MARKERS_DATASET = "markers"
+MARKER_DTYPE = np.dtype([("sample", "<i8"), ("value", "<i4"), ("duration", "<i8"),
+                         ("label", "S64"), ("received", "<f8")])
+# 标记打点时相对最近一个 EEG 样本的最大外推时长（秒）
+MARKER_MAX_EXTRAPOLATION = 1.0
+# 硬件触发值为帧中 RESERVED 字节（0–255），软件标记值必须大于该范围，事件表中才能区分
+TRIGGER_MAX_VALUE = 255
+
+# 在线检测的伪迹段：以保留的负事件码写入事件表（软件标记不得使用），
+# 原始记录另存于 trigger 文件的 artifacts 数据集，重建事件索引时重新并入
+ARTIFACTS_DATASET = "artifacts"
+ARTIFACT_CODES = {
+    "blink": ArtifactDetector.BLINK_CODE,
+    "emg": ArtifactDetector.EMG_CODE,
+    "pop": ArtifactDetector.POP_CODE,
+}
+# 导出 EDF+/BDF+ 注释时的名称（BAD_ 前缀可被 MNE 等工具识别为坏段）
+ARTIFACT_LABELS = {
+    ArtifactDetector.BLINK_CODE: "BAD_blink",
+    ArtifactDetector.EMG_CODE: "BAD_muscle",
+    ArtifactDetector.POP_CODE: "BAD_pop",
+}
+
+# 设备组：一套 EEG 放大器 + Trigger 盒（一个实验台），采集连接按设备 IP 归属到设备组；
+# 默认组的 IP 来自 EEGDeviceServer 构造参数，其余组由 EEG_DEVICE_GROUPS 配置
+DEFAULT_DEVICE_GROUP = "default"
+
+# 全局连接状态（默认设备组）
 EEG_CONNECTED = False
 TRIGGER_CONNECTED = False
 
 
+def get_uv_scale(eeg_dataset) -> Optional[float]:
+    """原始计数存储的 µV 换算系数；数据集本身已是 µV 时返回 None"""
+    value = eeg_dataset.attrs.get("uv_per_count")
+    return float(value) if value is not None else None
+
+
+def resolve_channel_selection(channels=None, montage=None):
+    """
+    解析会话的通道选择与导联标签
+
+    参数:
+        channels: 设备通道下标列表（0 起），None 表示全部 32 通道
+        montage: 标签列表（与 channels 一一对应）或 {设备通道下标: 标签}；
+                 只给 dict 时以其键作为通道选择
+    返回:
+        (channel_index, labels)：channel_index 为 int64 数组，选择全部通道时为 None；
+        labels 为与输出通道一一对应的标签列表
+    """
+    if isinstance(montage, dict):
+        mapping = {int(k): str(v) for k, v in montage.items()}
+        if channels is None:
+            channels = sorted(mapping)
+        labels = [mapping.get(int(c), f"Ch{int(c) + 1:02d}") for c in channels]
+    else:
+        labels = None
+
+    if channels is None:
+        index = None
+        selected = list(range(EEG_DEVICE_CHANNELS))
+    else:
+        selected = [int(c) for c in channels]
+        if not selected:
+            raise ValueError("channel selection is empty")
+        if len(set(selected)) != len(selected):
+            raise ValueError("duplicate channels in selection")
+        if any(c < 0 or c >= EEG_DEVICE_CHANNELS for c in selected):
+            raise ValueError(f"channels must be within 0..{EEG_DEVICE_CHANNELS - 1}")
+        index = None if selected == list(range(EEG_DEVICE_CHANNELS)) else np.asarray(selected, dtype=np.int64)
+
+    if labels is None:
+        if montage is not None:
+            labels = [str(v) for v in montage]
+            if len(labels) != len(selected):
+                raise ValueError("montage labels must match the selected channels")
+        else:
+            labels = [f"Ch{c + 1:02d}" for c in selected]
+    return index, labels
+
+
+def apply_uv_scale(block: np.ndarray, scale: Optional[float]) -> np.ndarray:
+    """按换算系数把原始计数转为 float32 µV（scale 为 None 时原样返回）"""
+    if scale is None:
+        return block
+    return block.astype(np.float32) * np.float32(scale)
+
+
 class RealtimeStats:
     """
     线程安全的实时统计容器
@@ -65,6 +187,13 @@ class RealtimeStats:
         self.recording = False
         self.session_id = ""
         self.start_time = None
+        # 逐通道信号质量（SignalQualityMonitor.get_quality() 的快照）
+        self.quality = None
+
+    def update_quality(self, quality: Optional[dict]):
+        """更新信号质量快照"""
+        with self.lock:
+            self.quality = quality
 
     def update_eeg(self, seq: int, received: int, dropped: int = 0, padded: int = 0):
         """更新 EEG 统计信息"""
@@ -123,6 +252,7 @@ class RealtimeStats:
                 "recording": self.recording,
                 "session_id": self.session_id,
                 "duration": round(duration, 2),
+                "quality": self.quality,
             }
 
     def reset(self):
@@ -146,6 +276,7 @@ class RealtimeStats:
             self.recording = False
             self.session_id = ""
             self.start_time = None
+            self.quality = None
 
 
 # 全局统计实例
@@ -213,7 +344,7 @@ class FrameParser:
         - DATA: EEG 96字节 (32通道×3字节), Trigger 3字节
     """
 
-    def __init__(self, start_bytes: bytes):
+    def __init__(self, start_bytes: bytes, raw_counts: bool = False):
         self.state = "WAITING_FOR_HEADER"
         self.start_bytes = start_bytes
         self.len_start_bytes = len(start_bytes)
@@ -233,7 +364,9 @@ class FrameParser:
         self.recv_buffer = bytearray()
         self.sequence = []
         self.num_channels = EEG_DEVICE_CHANNELS
-        self.data = np.zeros(shape=self.num_channels, dtype=np.int32)
+        # raw_counts 时输出有符号 24 位计数（int32，无损），否则输出 float32 µV
+        self.raw_counts = raw_counts
+        self.data = np.zeros(shape=self.num_channels, dtype=np.int32 if raw_counts else np.float32)
         self.packet_count = 0
 
     def process_byte(self, byte: int):
@@ -275,7 +408,8 @@ class FrameParser:
                         encoded_data = self.recv_buffer[ch * 3: (ch + 1) * 3]
                         encoded_data[0] ^= 0x80
                         decoded_data = int.from_bytes(encoded_data, byteorder='big', signed=False) - 8388608
-                        decoded_data = decoded_data * 0.02483  # uV
+                        if not self.raw_counts:
+                            decoded_data = decoded_data * EEG_UV_PER_COUNT  # uV
                         self.data[ch] = decoded_data
                     result = (self.mode, self.sequence[-1], self.data.copy())
                 elif self.mode == "TRIGGER":
@@ -306,10 +440,17 @@ class StreamBuffer:
         - 固定大小块：数据按 buffer_size 打包，优化磁盘 I/O
     """
 
-    def __init__(self, num_channels: int = EEG_DEVICE_CHANNELS, buffer_size: int = 1000):
+    def __init__(self, num_channels: int = EEG_DEVICE_CHANNELS, buffer_size: int = 1000, dtype=np.float32,
+                 name: str = "eeg", on_chunk=None, device_group: str = DEFAULT_DEVICE_GROUP):
+        self.name = name
+        # 所属设备组（指标与飞行记录器按组区分）
+        self.device_group = device_group
+        # 数据块入队后的回调（通知写入池），在采集线程中调用，必须立即返回
+        self.on_chunk = on_chunk
+        self.stream_code = STREAM_CODES.get(name, 0)
         self.num_channels = num_channels
         self.buffer_size = buffer_size
-        self.write_buffer = np.empty((self.num_channels, self.buffer_size), dtype=np.float32)
+        self.write_buffer = np.empty((self.num_channels, self.buffer_size), dtype=dtype)
         self.write_idx = 0
         self.data_queue = queue.Queue(maxsize=100)
         self.total_samples = 0
@@ -332,13 +473,24 @@ class StreamBuffer:
             if self.write_idx >= self.buffer_size:
                 data_chunk = self.write_buffer.copy()
                 try:
-                    self.data_queue.put((data_chunk, self.total_samples), block=False)
+                    # 附带入队时刻，写入线程据此计算写入滞后
+                    self.data_queue.put((data_chunk, self.total_samples, time.perf_counter()), block=False)
+                    depth = self.data_queue.qsize()
+                    pipeline_metrics.queue_depth.set(depth, group=self.device_group, stream=self.name)
+                    pipeline_metrics.queue_high_water.set_max(depth, group=self.device_group, stream=self.name)
+                    flight_recorder.record(EVENT_QUEUE, self.stream_code, depth, group=self.device_group)
+                    if self.on_chunk is not None:
+                        self.on_chunk()
                 except queue.Full:
-                    pass  # 丢弃数据，避免阻塞实时线程
+                    # 丢弃数据，避免阻塞实时线程
+                    pipeline_metrics.chunks_discarded.inc(group=self.device_group, stream=self.name)
+                    flight_recorder.record(EVENT_DISCARD, self.stream_code, self.data_queue.maxsize,
+                                           group=self.device_group)
+                    flight_recorder.trigger(f"discard_{self.name}", self.device_group)
                 self.write_idx = 0
 
     def read_chunk(self, timeout: float = 1.0):
-        """读取完整数据块（消费者端）"""
+        """读取完整数据块（消费者端），返回 (data, total_samples, enqueued_at) 或 None"""
         try:
             return self.data_queue.get(timeout=timeout)
         except queue.Empty:
@@ -354,6 +506,352 @@ class StreamBuffer:
                 return self.write_buffer[:, start_idx:self.write_idx].copy()
 
 
+class MinMaxPyramid:
+    """
+    多分辨率 min/max 概览金字塔（增量构建）
+
+    每一级按倍数 factor 把原始样本分箱，保存每箱的最小/最大值：
+        overview/x{factor}: shape (2, channels, n_bins)，[0] 为 min，[1] 为 max
+
+    数据按块追加，下一级由上一级的箱再次归并得到，不需要回读原始数据；
+    不足一箱的尾部样本暂存在内存，finalize() 时输出为最后一个不完整箱。
+    """
+
+    def __init__(self, h5_file: h5py.File, num_channels: int, factors=OVERVIEW_FACTORS):
+        factors = tuple(int(f) for f in factors)
+        steps = []
+        prev = 1
+        for f in factors:
+            if f <= prev or f % prev != 0:
+                raise ValueError(f"Invalid overview factors: {factors}")
+            steps.append(f // prev)
+            prev = f
+
+        self.num_channels = num_channels
+        self.factors = factors
+        self.steps = steps
+        self.group = h5_file.require_group(OVERVIEW_GROUP)
+        self.group.attrs["factors"] = np.asarray(factors, dtype=np.int64)
+        self.datasets = []
+        for f in factors:
+            name = f"x{f}"
+            if name in self.group:
+                del self.group[name]
+            ds = self.group.create_dataset(
+                name,
+                shape=(2, num_channels, 0),
+                maxshape=(2, num_channels, None),
+                dtype=np.float32,
+                chunks=(2, num_channels, 1000),
+                compression="gzip"
+            )
+            ds.attrs["factor"] = f
+            self.datasets.append(ds)
+        self.group.attrs["complete"] = False
+        # 每一级尚未凑满一箱的 (min, max)
+        self._pending = [
+            (np.empty((num_channels, 0), dtype=np.float32), np.empty((num_channels, 0), dtype=np.float32))
+            for _ in factors
+        ]
+
+    def _append_bins(self, level: int, lo: np.ndarray, hi: np.ndarray):
+        ds = self.datasets[level]
+        current = ds.shape[2]
+        ds.resize((2, self.num_channels, current + lo.shape[1]))
+        ds[0, :, current:] = lo
+        ds[1, :, current:] = hi
+
+    def append(self, data_chunk: np.ndarray):
+        """追加一个 (channels, n) 的原始数据块"""
+        lo = hi = np.asarray(data_chunk, dtype=np.float32)
+        for level, step in enumerate(self.steps):
+            p_lo, p_hi = self._pending[level]
+            if p_lo.shape[1]:
+                lo = np.concatenate([p_lo, lo], axis=1)
+                hi = np.concatenate([p_hi, hi], axis=1)
+            n_bins = lo.shape[1] // step
+            used = n_bins * step
+            self._pending[level] = (lo[:, used:].copy(), hi[:, used:].copy())
+            if n_bins == 0:
+                return
+            lo = lo[:, :used].reshape(self.num_channels, n_bins, step).min(axis=2)
+            hi = hi[:, :used].reshape(self.num_channels, n_bins, step).max(axis=2)
+            self._append_bins(level, lo, hi)
+
+    def finalize(self):
+        """把各级尾部不完整的箱写出（录制结束时调用一次）"""
+        carry = None
+        for level in range(len(self.steps)):
+            p_lo, p_hi = self._pending[level]
+            if carry is not None:
+                p_lo = np.concatenate([p_lo, carry[0]], axis=1)
+                p_hi = np.concatenate([p_hi, carry[1]], axis=1)
+            if p_lo.shape[1] == 0:
+                carry = None
+                continue
+            lo = p_lo.min(axis=1, keepdims=True)
+            hi = p_hi.max(axis=1, keepdims=True)
+            self._append_bins(level, lo, hi)
+            carry = (lo, hi)
+            self._pending[level] = (p_lo[:, :0], p_hi[:, :0])
+        self.group.attrs["complete"] = True
+
+
+class ChannelStatsAccumulator:
+    """
+    单遍在线的逐通道统计（写入时按块累积，录制结束即得结果）
+
+    - 均值/方差：Welford 并行合并（Chan et al.），每块向量化计算后并入总量
+    - RMS、最小/最大值
+    - 平直样本数：与前一采样点完全相等的样本（跨块连续计算）
+    - 饱和样本数：|x| 接近 ADC 满量程的样本
+    """
+
+    def __init__(self, num_channels: int, saturation_uv: float = EEG_FULL_SCALE_UV * EEG_SATURATION_RATIO):
+        self.num_channels = num_channels
+        self.saturation_uv = saturation_uv
+        self.count = 0
+        self.mean = np.zeros(num_channels, dtype=np.float64)
+        self.m2 = np.zeros(num_channels, dtype=np.float64)
+        self.sum_sq = np.zeros(num_channels, dtype=np.float64)
+        self.min = np.full(num_channels, np.inf, dtype=np.float64)
+        self.max = np.full(num_channels, -np.inf, dtype=np.float64)
+        self.flat = np.zeros(num_channels, dtype=np.int64)
+        self.saturated = np.zeros(num_channels, dtype=np.int64)
+        self._last = None
+
+    def update(self, data_chunk: np.ndarray):
+        """并入一个 (channels, n) 数据块"""
+        x = np.asarray(data_chunk, dtype=np.float64)
+        n = x.shape[1]
+        if n == 0:
+            return
+
+        chunk_mean = x.mean(axis=1)
+        chunk_m2 = ((x - chunk_mean[:, None]) ** 2).sum(axis=1)
+        total = self.count + n
+        delta = chunk_mean - self.mean
+        self.mean += delta * (n / total)
+        self.m2 += chunk_m2 + delta ** 2 * (self.count * n / total)
+        self.count = total
+
+        self.sum_sq += (x ** 2).sum(axis=1)
+        np.minimum(self.min, x.min(axis=1), out=self.min)
+        np.maximum(self.max, x.max(axis=1), out=self.max)
+
+        if self._last is not None:
+            diffs = np.diff(x, axis=1, prepend=self._last[:, None])
+        else:
+            diffs = np.diff(x, axis=1)
+        self.flat += (diffs == 0).sum(axis=1)
+        self.saturated += (np.abs(x) >= self.saturation_uv).sum(axis=1)
+        self._last = x[:, -1].copy()
+
+    def summary(self, padded_samples: int = 0) -> dict:
+        """导出可 JSON 序列化的统计摘要"""
+        n = self.count
+
+        def _list(values):
+            return [round(float(v), 4) for v in values]
+
+        if n == 0:
+            empty = [0.0] * self.num_channels
+            channels = {"mean": empty, "std": empty, "rms": empty, "min": empty, "max": empty,
+                        "flat": [0] * self.num_channels, "saturated": [0] * self.num_channels}
+        else:
+            channels = {
+                "mean": _list(self.mean),
+                "std": _list(np.sqrt(self.m2 / n)),
+                "rms": _list(np.sqrt(self.sum_sq / n)),
+                "min": _list(self.min),
+                "max": _list(self.max),
+                "flat": [int(v) for v in self.flat],
+                "saturated": [int(v) for v in self.saturated],
+            }
+        return {
+            "samples": int(n),
+            "channels": channels,
+            "padded_samples": int(padded_samples),
+            "padded_ratio": round(padded_samples / n, 6) if n else 0.0,
+            "flat_ratio": round(float(self.flat.max()) / n, 6) if n else 0.0,
+            "saturation_ratio": round(float(self.saturated.max()) / n, 6) if n else 0.0,
+        }
+
+
+def build_overview_pyramid(eeg_file: StrPath, factors=OVERVIEW_FACTORS, block_samples: int = 100_000):
+    """
+    为已有的 EEG 会话文件（补）建概览金字塔
+
+    按块顺序读取 eeg_data，内存占用与会话长度无关。
+    """
+    block_samples = max(factors[-1], block_samples - block_samples % factors[-1])
+    with h5py.File(eeg_file, "a") as h5:
+        dataset = h5["eeg_data"]
+        num_channels, total = dataset.shape
+        scale = get_uv_scale(dataset)
+        pyramid = MinMaxPyramid(h5, num_channels, factors=factors)
+        for start in range(0, total, block_samples):
+            pyramid.append(apply_uv_scale(dataset[:, start:start + block_samples], scale))
+        pyramid.finalize()
+
+
+class TriggerEventIndex:
+    """
+    触发事件稀疏索引（增量构建）
+
+    在写入 trigger 数据时检测取值跳变，把每段连续的非零触发值记为
+    (sample, value, duration) 写入 events 数据集，按 sample 升序排列；
+    跨块未结束的事件暂存，finalize() 时以会话末尾作为结束。
+
+    软件标记与伪迹段经 add_marker() 加入，等 trigger 数据越过其 sample 后与触发事件
+    按序合并写入；起点早于已写出事件的迟到条目（伪迹段在结束时才确定）与表尾合并重写，
+    保持事件表有序。
+    """
+
+    def __init__(self, h5_file: h5py.File):
+        if EVENTS_DATASET in h5_file:
+            del h5_file[EVENTS_DATASET]
+        self.dataset = h5_file.create_dataset(
+            EVENTS_DATASET,
+            shape=(0,),
+            maxshape=(None,),
+            dtype=EVENT_DTYPE,
+            chunks=(1024,),
+            compression="gzip"
+        )
+        self.dataset.attrs["complete"] = False
+        self.offset = 0
+        self.open_value = 0
+        self.open_start = 0
+        self.pending_markers = []
+        self.last_sample = -1
+
+    def add_marker(self, sample: int, value: int, duration: int = 0):
+        """加入一个软件标记（可早于对应的 trigger 数据到达）"""
+        self.pending_markers.append((int(sample), int(value), int(duration)))
+
+    def _take_markers(self, horizon: Optional[int]):
+        """取出 sample <= horizon 的待写标记（horizon 为 None 时全部取出）"""
+        if not self.pending_markers:
+            return []
+        if horizon is None:
+            ready, self.pending_markers = self.pending_markers, []
+        else:
+            ready = [m for m in self.pending_markers if m[0] <= horizon]
+            self.pending_markers = [m for m in self.pending_markers if m[0] > horizon]
+        return ready
+
+    def _append_events(self, samples, values, durations, markers=()):
+        keep = values != 0
+        if not keep.any() and not markers:
+            return
+        events = np.empty(int(keep.sum()) + len(markers), dtype=EVENT_DTYPE)
+        n = int(keep.sum())
+        events["sample"][:n] = samples[keep]
+        events["value"][:n] = values[keep]
+        events["duration"][:n] = durations[keep]
+        if markers:
+            events[n:] = np.array(markers, dtype=EVENT_DTYPE)
+            events = events[np.argsort(events["sample"], kind="stable")]
+        current = self.dataset.shape[0]
+        pos = current
+        if events["sample"][0] < self.last_sample:
+            pos = self._merge_position(int(events["sample"][0]))
+            events = np.concatenate([self.dataset[pos:current], events])
+            events = events[np.argsort(events["sample"], kind="stable")]
+        self.dataset.resize((pos + len(events),))
+        self.dataset[pos:] = events
+        self.last_sample = max(self.last_sample, int(events["sample"][-1]))
+
+    def _merge_position(self, sample: int, block: int = 1024) -> int:
+        """从表尾向前按块查找第一个 sample 大于给定值的事件位置"""
+        hi = self.dataset.shape[0]
+        while hi > 0:
+            lo = max(0, hi - block)
+            samples = self.dataset[lo:hi]["sample"]
+            pos = int(np.searchsorted(samples, sample, side="right"))
+            if pos > 0 or lo == 0:
+                return lo + pos
+            hi = lo
+        return 0
+
+    def append(self, data_chunk: np.ndarray):
+        """追加一个一维 trigger 数据块"""
+        chunk = np.asarray(data_chunk, dtype=np.int64).ravel()
+        n = chunk.shape[0]
+        if n == 0:
+            return
+
+        change_idx = np.flatnonzero(np.diff(chunk, prepend=self.open_value))
+        closed = (np.empty(0, dtype=np.int64),) * 3
+        if change_idx.size:
+            run_starts = np.concatenate([[self.open_start], self.offset + change_idx])
+            run_values = np.concatenate([[self.open_value], chunk[change_idx]])
+            # 最后一段尚未结束，留到下一块或 finalize
+            closed_starts = run_starts[:-1]
+            closed_values = run_values[:-1]
+            closed = (closed_starts, closed_values, run_starts[1:] - closed_starts)
+            self.open_start = int(run_starts[-1])
+            self.open_value = int(run_values[-1])
+        self.offset += n
+        # 之后写出的触发事件都不早于 horizon，此前的标记可以按序写出
+        horizon = self.open_start if self.open_value != 0 else self.offset
+        self._append_events(*closed, markers=self._take_markers(horizon))
+
+    def finalize(self):
+        """写出最后一个未结束的事件（录制结束时调用一次）"""
+        self._append_events(
+            np.array([self.open_start]),
+            np.array([self.open_value]),
+            np.array([self.offset - self.open_start]),
+            markers=self._take_markers(None),
+        )
+        self.open_value = 0
+        self.open_start = self.offset
+        self.dataset.attrs["complete"] = True
+
+
+def stored_markers(h5_file: h5py.File) -> np.ndarray:
+    """读出 trigger 文件中的软件标记与伪迹段（EVENT_DTYPE，未排序）"""
+    parts = []
+    for name in (MARKERS_DATASET, ARTIFACTS_DATASET):
+        if name in h5_file:
+            stored = h5_file[name][:]
+            part = np.empty(len(stored), dtype=EVENT_DTYPE)
+            for field in EVENT_DTYPE.names:
+                part[field] = stored[field]
+            parts.append(part)
+    return np.concatenate(parts) if parts else np.empty(0, dtype=EVENT_DTYPE)
+
+
+def _index_trigger_blocks(index: TriggerEventIndex, blocks, markers):
+    for marker in markers:
+        index.add_marker(marker["sample"], marker["value"], marker["duration"])
+    for block in blocks:
+        index.append(block)
+    index.finalize()
+
+
+def build_trigger_event_index(trigger_file: StrPath, block_samples: int = 1_000_000):
+    """为已有的 trigger 文件（补）建事件索引，按块顺序扫描"""
+    with h5py.File(trigger_file, "a") as h5:
+        dataset = h5["trigger_data"]
+        blocks = (dataset[start:start + block_samples] for start in range(0, dataset.shape[0], block_samples))
+        _index_trigger_blocks(TriggerEventIndex(h5), blocks, stored_markers(h5))
+
+
+def compute_trigger_events(blocks, markers=()) -> np.ndarray:
+    """
+    不写文件地计算事件表：在内存 HDF5 中运行 TriggerEventIndex
+
+    blocks 为按顺序的 trigger 数据块，markers 为软件标记/伪迹段（EVENT_DTYPE）；
+    结果与 build_trigger_event_index 写入的 events 数据集一致。
+    """
+    with h5py.File(io.BytesIO(), "w") as mem:
+        _index_trigger_blocks(TriggerEventIndex(mem), blocks, markers)
+        return mem[EVENTS_DATASET][:]
+
+
 class StreamWriter:
     """
     HDF5 文件流式写入器
@@ -364,8 +862,16 @@ class StreamWriter:
         - 线程安全：使用锁保护写入操作
     """
 
-    def __init__(self, save_dir: StrPath, file_prefix: str = "eeg_data"):
+    def __init__(self, save_dir: StrPath, file_prefix: str = "eeg_data", storage_mode: str = "uv",
+                 device_channels=None, channel_labels=None, device_group: str = DEFAULT_DEVICE_GROUP):
+        if storage_mode not in EEG_STORAGE_MODES:
+            raise ValueError(f"Invalid storage mode: {storage_mode}")
         self.save_dir = Path(save_dir)
+        # 所属设备组（写入耗时指标按组区分）
+        self.device_group = device_group
+        # 本会话保存的设备通道（默认全部），数据集/块形状/统计均按所选通道数
+        self.device_channels = list(range(EEG_DEVICE_CHANNELS)) if device_channels is None else list(device_channels)
+        self.num_channels = len(self.device_channels)
         if not self.save_dir.exists():
             self.save_dir.mkdir(parents=True, exist_ok=True)
         self.file_prefix = file_prefix
@@ -377,14 +883,28 @@ class StreamWriter:
         self.eeg_h5 = h5py.File(self.eeg_file, "w")
         self.trigger_h5 = h5py.File(self.trigger_file, "w")
 
+        # counts 模式存整数计数：shuffle 过滤器把各字节平面分开，整数的高位字节高度重复，压缩率明显提高
+        self.storage_mode = storage_mode
+        raw_counts = storage_mode == "counts"
         self.eeg_dataset = self.eeg_h5.create_dataset(
             "eeg_data",
-            shape=(EEG_DEVICE_CHANNELS, 0),
-            maxshape=(EEG_DEVICE_CHANNELS, None),
-            dtype=np.float32,
-            chunks=(EEG_DEVICE_CHANNELS, 1000),
-            compression="gzip"
+            shape=(self.num_channels, 0),
+            maxshape=(self.num_channels, None),
+            dtype=np.int32 if raw_counts else np.float32,
+            chunks=(self.num_channels, 1000),
+            compression="gzip",
+            shuffle=raw_counts
         )
+        self.eeg_dataset.attrs["sample_rate"] = EEG_SAMPLE_RATE
+        self.eeg_dataset.attrs["units"] = "counts" if raw_counts else "uV"
+        if raw_counts:
+            self.eeg_dataset.attrs["uv_per_count"] = EEG_UV_PER_COUNT
+        self.uv_scale = EEG_UV_PER_COUNT if raw_counts else None
+        self.eeg_dataset.attrs["device_channels"] = np.asarray(self.device_channels, dtype=np.int64)
+        if channel_labels is not None:
+            self.eeg_dataset.attrs["channel_labels"] = [str(label) for label in channel_labels]
+        self.overview = MinMaxPyramid(self.eeg_h5, self.num_channels)
+        self.channel_stats = ChannelStatsAccumulator(self.num_channels)
 
         self.trigger_dataset = self.trigger_h5.create_dataset(
             "trigger_data",
@@ -394,31 +914,106 @@ class StreamWriter:
             chunks=(1000,),
             compression="gzip"
         )
+        self.trigger_dataset.attrs["sample_rate"] = EEG_SAMPLE_RATE
+        self.event_index = TriggerEventIndex(self.trigger_h5)
+        self.markers_dataset = self.trigger_h5.create_dataset(
+            MARKERS_DATASET,
+            shape=(0,),
+            maxshape=(None,),
+            dtype=MARKER_DTYPE,
+            chunks=(256,)
+        )
+        self.artifacts_dataset = self.trigger_h5.create_dataset(
+            ARTIFACTS_DATASET,
+            shape=(0,),
+            maxshape=(None,),
+            dtype=EVENT_DTYPE,
+            chunks=(256,)
+        )
+        # 请求线程只追加到该列表（不等待 HDF5），由写入线程落盘
+        self.pending_markers = []
+        self.marker_lock = threading.Lock()
 
         self.running = False
         self.lock = threading.Lock()
 
-    def write_eeg_chunk(self, data_chunk: np.ndarray):
-        """写入 EEG 数据块"""
+    def write_eeg_chunk(self, data_chunk: np.ndarray) -> np.ndarray:
+        """写入 EEG 数据块，返回其 µV 形式（供在线分析复用）"""
         with self.lock:
+            started = time.perf_counter()
             current_size = self.eeg_dataset.shape[1]
             new_size = current_size + data_chunk.shape[1]
-            self.eeg_dataset.resize((EEG_DEVICE_CHANNELS, new_size))
+            self.eeg_dataset.resize((self.num_channels, new_size))
             self.eeg_dataset[:, current_size:new_size] = data_chunk
+            pipeline_metrics.write_seconds.observe(time.perf_counter() - started, group=self.device_group,
+                                                   stream="eeg")
+            # 概览与统计始终以 µV 计
+            uv_chunk = apply_uv_scale(data_chunk, self.uv_scale)
+            self.overview.append(uv_chunk)
+            self.channel_stats.update(uv_chunk)
+            started = time.perf_counter()
             self.eeg_h5.flush()
+            pipeline_metrics.flush_seconds.observe(time.perf_counter() - started, group=self.device_group,
+                                                   stream="eeg")
+        return uv_chunk
 
     def write_trigger_chunk(self, data_chunk: np.ndarray):
         """写入 Trigger 数据块"""
         with self.lock:
+            started = time.perf_counter()
             current_size = self.trigger_dataset.shape[0]
             new_size = current_size + data_chunk.shape[0]
             self.trigger_dataset.resize((new_size,))
             self.trigger_dataset[current_size:new_size] = data_chunk
+            pipeline_metrics.write_seconds.observe(time.perf_counter() - started, group=self.device_group,
+                                                   stream="trigger")
+            self.event_index.append(data_chunk)
+            started = time.perf_counter()
+            self.trigger_h5.flush()
+            pipeline_metrics.flush_seconds.observe(time.perf_counter() - started, group=self.device_group,
+                                                   stream="trigger")
+
+    def add_marker(self, sample: int, value: int, duration: int = 0, label: str = "", received: float = 0.0):
+        """登记一个软件标记（不阻塞，write_markers() 时写入）"""
+        with self.marker_lock:
+            self.pending_markers.append((sample, value, duration, label.encode("utf-8")[:64], received))
+
+    def write_markers(self):
+        """把登记的标记写入 markers 数据集并交给事件索引（写入线程调用）"""
+        if not self.pending_markers:
+            return
+        with self.marker_lock:
+            markers, self.pending_markers = self.pending_markers, []
+        with self.lock:
+            records = np.array(markers, dtype=MARKER_DTYPE)
+            current = self.markers_dataset.shape[0]
+            self.markers_dataset.resize((current + len(records),))
+            self.markers_dataset[current:] = records
+            for sample, value, duration, _, _ in markers:
+                self.event_index.add_marker(sample, value, duration)
             self.trigger_h5.flush()
 
+    def add_artifacts(self, spans):
+        """写入在线检测的伪迹段 [(sample, code, duration), ...]（写入线程调用）"""
+        if not spans:
+            return
+        with self.lock:
+            records = np.array(spans, dtype=EVENT_DTYPE)
+            current = self.artifacts_dataset.shape[0]
+            self.artifacts_dataset.resize((current + len(records),))
+            self.artifacts_dataset[current:] = records
+            for sample, code, duration in spans:
+                self.event_index.add_marker(sample, code, duration)
+
     def close(self):
         """关闭 HDF5 文件"""
+        self.write_markers()
         with self.lock:
+            for index in (self.overview, self.event_index):
+                try:
+                    index.finalize()
+                except Exception:
+                    pass
             try:
                 self.eeg_h5.close()
                 self.trigger_h5.close()
@@ -426,207 +1021,635 @@ class StreamWriter:
                 pass
 
 
+def parse_device_groups(spec: Optional[str]) -> dict:
+    """
+    解析设备组配置，返回 {组名: (eeg_ip, trigger_ip)}
+
+    格式：bay2=192.168.1.112,192.168.1.113;bay3=192.168.1.122,192.168.1.123
+    """
+    groups = {}
+    for item in (spec or "").split(";"):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, ips = item.partition("=")
+        eeg_ip, _, trigger_ip = ips.partition(",")
+        name, eeg_ip, trigger_ip = name.strip(), eeg_ip.strip(), trigger_ip.strip()
+        if not name or not eeg_ip or not trigger_ip:
+            raise ValueError(f"Invalid device group {item!r}, expected name=eeg_ip,trigger_ip")
+        groups[name] = (eeg_ip, trigger_ip)
+    return groups
+
+
+class DeviceGroup:
+    """
+    设备组（一个实验台）的实时状态
+
+    连接标志、实时统计与在线分析属于设备组（跟随设备连接），
+    录制时 session 指向绑定的 RecordingSession，采集线程把样本写入其缓冲。
+    """
+
+    def __init__(self, name: str, eeg_ip: Optional[str] = None, trigger_ip: Optional[str] = None,
+                 erp_window: int = ERP_WINDOW_SAMPLES, storage_mode: str = "uv", line_freq: float = 50.0,
+                 stats: Optional[RealtimeStats] = None):
+        self.name = name
+        self.eeg_ip = eeg_ip
+        self.trigger_ip = trigger_ip
+        self.realtime_stats = stats if stats is not None else RealtimeStats()
+        # 在线 ERP 平均（每次开始录制时清零，停止后保留最近一次结果）
+        self.erp_averager = OnlineERPAverager(
+            EEG_DEVICE_CHANNELS, erp_window,
+            scale=EEG_UV_PER_COUNT if storage_mode == "counts" else 1.0
+        )
+        # 实时信号质量监测（写入池中逐块更新）
+        self.quality_monitor = SignalQualityMonitor(
+            EEG_DEVICE_CHANNELS, EEG_SAMPLE_RATE,
+            saturation_uv=EEG_FULL_SCALE_UV * EEG_SATURATION_RATIO, line_freq=line_freq
+        )
+        # 流式伪迹检测（写入池中逐块运行，伪迹段写入会话事件表）
+        self.artifact_detector = ArtifactDetector(EEG_DEVICE_CHANNELS, EEG_SAMPLE_RATE, line_freq=line_freq)
+        # 可选的共享内存样本环（只发布默认设备组），采集线程逐样本发布
+        self.sample_ring = None
+        self.session = None
+        self.eeg_connected = False
+        self.trigger_connected = False
+
+    def get_status(self) -> dict:
+        session = self.session
+        return {
+            "name": self.name,
+            "eeg_ip": self.eeg_ip,
+            "trigger_ip": self.trigger_ip,
+            "eeg_connected": self.eeg_connected,
+            "trigger_connected": self.trigger_connected,
+            "session_id": session.id if session is not None else None,
+        }
+
+
+class RecordingSession:
+    """
+    一个进行中的录制会话：缓冲、写入器与统计，绑定到一个设备组
+
+    采集线程只写缓冲；数据块入队或登记标记时通知写入池，由池中线程调用 drain() 落盘。
+    同一会话同一时刻只有一个线程在 drain（scheduled 标记 + drain_lock），数据块按顺序写入。
+    """
+
+    def __init__(self, info: dict, group: DeviceGroup, writer: StreamWriter,
+                 eeg_buffer: StreamBuffer, trigger_buffer: StreamBuffer, channel_index, pool):
+        self.info = info
+        self.id = info["id"]
+        self.group = group
+        self.writer = writer
+        self.eeg_buffer = eeg_buffer
+        self.trigger_buffer = trigger_buffer
+        # 通道选择（设备通道下标数组，None 表示全部），在解码后立即应用
+        self.channel_index = channel_index
+        self.pool = pool
+        eeg_buffer.on_chunk = self.notify
+        trigger_buffer.on_chunk = self.notify
+
+        # 最近一个 EEG 包的到达时刻（perf_counter），软件标记据此外推当前样本序号
+        self.last_sample_time = None
+        self.last_padded = 0
+        self.stats = {
+            "total_samples": 0,
+            "start_time": time.time(),
+            "packets_received": 0,
+            "packets_dropped": 0,
+            "samples_padded": 0,
+        }
+        self.lock = threading.Lock()
+        self.schedule_lock = threading.Lock()
+        self.scheduled = False
+        self.drain_lock = threading.Lock()
+        self.closed = False
+
+    def notify(self):
+        """有待写数据（数据块或标记），交给写入池"""
+        self.pool.schedule(self)
+
+    def has_pending(self) -> bool:
+        return bool(
+            self.writer.pending_markers
+            or not self.eeg_buffer.data_queue.empty()
+            or not self.trigger_buffer.data_queue.empty()
+        )
+
+    def drain(self):
+        """写入已入队的全部数据块与标记（写入池线程调用）"""
+        with self.drain_lock:
+            if not self.closed:
+                self._drain_locked()
+
+    def _drain_locked(self):
+        self.writer.write_markers()
+        while True:
+            eeg_chunk = self.eeg_buffer.read_chunk(timeout=0)
+            if eeg_chunk is not None:
+                self._write_eeg(eeg_chunk)
+            trigger_chunk = self.trigger_buffer.read_chunk(timeout=0)
+            if trigger_chunk is not None:
+                self._write_trigger(trigger_chunk)
+            if eeg_chunk is None and trigger_chunk is None:
+                break
+
+    def _write_eeg(self, eeg_chunk):
+        data, total_samples, enqueued_at = eeg_chunk
+        started = time.perf_counter()
+        uv_chunk = self.writer.write_eeg_chunk(data)
+        now = time.perf_counter()
+        group = self.group.name
+        pipeline_metrics.writer_lag.set(round(now - enqueued_at, 4), group=group, stream="eeg")
+        flight_recorder.record_write(STREAM_EEG, now - started, now - enqueued_at, group)
+        pipeline_metrics.queue_depth.set(self.eeg_buffer.data_queue.qsize(), group=group, stream="eeg")
+        with self.lock:
+            self.stats["total_samples"] = total_samples
+            padded = self.stats["samples_padded"]
+
+        # 信号质量：每块固定开销的向量化计算，在写入池中进行不影响采集
+        quality_monitor = self.group.quality_monitor
+        quality_monitor.update(uv_chunk, padded_samples=padded - self.last_padded)
+        self.last_padded = padded
+        self.group.realtime_stats.update_quality(quality_monitor.get_quality())
+        self.writer.add_artifacts(self.group.artifact_detector.update(uv_chunk, total_samples - data.shape[1]))
+
+    def _write_trigger(self, trigger_chunk):
+        data, _, enqueued_at = trigger_chunk
+        started = time.perf_counter()
+        self.writer.write_trigger_chunk(data.flatten().astype(np.int32))
+        now = time.perf_counter()
+        group = self.group.name
+        pipeline_metrics.writer_lag.set(round(now - enqueued_at, 4), group=group, stream="trigger")
+        flight_recorder.record_write(STREAM_TRIGGER, now - started, now - enqueued_at, group)
+        pipeline_metrics.queue_depth.set(self.trigger_buffer.data_queue.qsize(), group=group, stream="trigger")
+
+    def finish(self) -> Optional[dict]:
+        """写完队列与缓冲中剩余的数据并关闭文件，返回通道统计摘要"""
+        with self.drain_lock:
+            self._drain_locked()
+            if self.eeg_buffer.write_idx > 0:
+                n = self.eeg_buffer.write_idx
+                uv_chunk = self.writer.write_eeg_chunk(self.eeg_buffer.write_buffer[:, :n].copy())
+                detector = self.group.artifact_detector
+                self.writer.add_artifacts(detector.update(uv_chunk, self.eeg_buffer.total_samples - n))
+            self.writer.add_artifacts(self.group.artifact_detector.flush())
+            if self.trigger_buffer.write_idx > 0:
+                remaining = self.trigger_buffer.write_buffer[:, :self.trigger_buffer.write_idx]
+                self.writer.write_trigger_chunk(remaining.flatten().astype(np.int32))
+            with self.lock:
+                self.stats["total_samples"] = self.eeg_buffer.total_samples
+                padded = self.stats["samples_padded"]
+            summary = self.writer.channel_stats.summary(padded_samples=padded)
+            self.writer.close()
+            self.closed = True
+        return summary
+
+    def get_status(self) -> dict:
+        with self.lock:
+            stats = dict(self.stats)
+        return {
+            "session_id": self.id,
+            "device_group": self.group.name,
+            "session_dir": str(self.info["dir"]),
+            "channels": self.info["channels"],
+            "user_id": self.info["user_id"],
+            "user_account": self.info["user_account"],
+            "eeg_connected": self.group.eeg_connected,
+            "trigger_connected": self.group.trigger_connected,
+            "total_samples": stats["total_samples"],
+            "recording_duration": round(time.time() - stats["start_time"], 2),
+            "packets_received": stats["packets_received"],
+            "packets_dropped": stats["packets_dropped"],
+            "samples_padded": stats["samples_padded"],
+            "artifacts": self.group.artifact_detector.get_counts(),
+            "queue_size": self.eeg_buffer.data_queue.qsize(),
+        }
+
+
+class WriterPool:
+    """
+    所有会话共享的 HDF5 写入线程池（线程数固定，与会话数无关）
+
+    会话有待写数据时进入就绪队列（每个会话至多排队一次），空闲线程取出后写完它已入队的全部数据；
+    线程阻塞在就绪队列上，空闲时不轮询。
+    """
+
+    def __init__(self, workers: int = 2):
+        self.workers = max(1, int(workers))
+        self.ready = queue.Queue()
+        self.threads = []
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"eeg-writer-{i}", daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def schedule(self, session: RecordingSession):
+        with session.schedule_lock:
+            if session.scheduled:
+                return
+            session.scheduled = True
+        self.ready.put(session)
+
+    def _run(self):
+        while True:
+            session = self.ready.get()
+            try:
+                session.drain()
+            except Exception as e:
+                print(f"⚠️  EEG 会话 {session.id} 写入失败: {e}")
+            finally:
+                # 先清标记再检查：drain 期间入队的数据要么已被写完，要么在这里重新排队
+                with session.schedule_lock:
+                    session.scheduled = False
+                    again = not session.closed and session.has_pending()
+                if again:
+                    self.schedule(session)
+
+    def get_status(self) -> dict:
+        return {"workers": self.workers, "ready": self.ready.qsize()}
+
+
 class SessionManager:
     """
     EEG 录制会话管理器
 
     职责：
-        - 会话生命周期管理（开始/停止录制）
-        - 缓冲区和写入器协调
+        - 会话生命周期管理（开始/停止录制），每个设备组可同时录制一个会话
+        - 缓冲区和写入器协调（写入由共享的 WriterPool 完成）
         - 元数据跟踪和统计
+
+    单设备组部署时接口与单会话版本一致：未指定 session_id 时操作唯一的进行中会话。
     """
 
-    def __init__(self, save_dir: StrPath):
+    def __init__(self, save_dir: StrPath, erp_window: int = ERP_WINDOW_SAMPLES, storage_mode: str = "uv",
+                 line_freq: float = 50.0, device_groups: Optional[dict] = None, writer_workers: int = 2):
+        if storage_mode not in EEG_STORAGE_MODES:
+            raise ValueError(f"Invalid storage mode: {storage_mode}")
         self.save_dir = Path(save_dir)
+        self.storage_mode = storage_mode
         if not self.save_dir.exists():
             self.save_dir.mkdir(parents=True, exist_ok=True)
 
-        self.current_session = None
-        self.is_recording = False
-        self.sessions = []
-
-        self.eeg_buffer = None
-        self.trigger_buffer = None
-        self.writer = None
-        self.writer_thread = None
+        # 默认设备组沿用全局 realtime_stats，单实验台部署的统计接口不变
+        self.groups = {
+            DEFAULT_DEVICE_GROUP: DeviceGroup(DEFAULT_DEVICE_GROUP, erp_window=erp_window, storage_mode=storage_mode,
+                                              line_freq=line_freq, stats=realtime_stats)
+        }
+        for name, (eeg_ip, trigger_ip) in (device_groups or {}).items():
+            if name in self.groups:
+                self.groups[name].eeg_ip, self.groups[name].trigger_ip = eeg_ip, trigger_ip
+            else:
+                self.groups[name] = DeviceGroup(name, eeg_ip, trigger_ip, erp_window=erp_window,
+                                                storage_mode=storage_mode, line_freq=line_freq)
 
-        self.stats = {
+        # 进行中的会话（按开始顺序），与已结束会话列表
+        self.active = {}
+        self.sessions = []
+        self.writer_pool = WriterPool(writer_workers)
+        self._last_stats = {
             "total_samples": 0,
-            "recording_duration": 0.0,
             "start_time": None,
             "packets_received": 0,
             "packets_dropped": 0,
+            "samples_padded": 0,
         }
         self.lock = threading.Lock()
 
-    def start_new_session(self, user_id=None, user_account=None):
-        """开始新的录制会话（支持用户关联）"""
+    # 以下属性保持单会话接口：指向最近开始的会话与默认设备组
+
+    def _current(self) -> Optional[RecordingSession]:
+        return next(reversed(self.active.values()), None)
+
+    @property
+    def current_session(self) -> Optional[dict]:
+        current = self._current()
+        return current.info if current is not None else None
+
+    @property
+    def is_recording(self) -> bool:
+        return bool(self.active)
+
+    @property
+    def stats(self) -> dict:
+        current = self._current()
+        return current.stats if current is not None else self._last_stats
+
+    @property
+    def last_sample_time(self) -> Optional[float]:
+        current = self._current()
+        return current.last_sample_time if current is not None else None
+
+    @property
+    def default_group(self) -> DeviceGroup:
+        return self.groups[DEFAULT_DEVICE_GROUP]
+
+    @property
+    def erp_averager(self) -> OnlineERPAverager:
+        return self.default_group.erp_averager
+
+    @property
+    def quality_monitor(self) -> SignalQualityMonitor:
+        return self.default_group.quality_monitor
+
+    @property
+    def sample_ring(self):
+        return self.default_group.sample_ring
+
+    @sample_ring.setter
+    def sample_ring(self, ring):
+        self.default_group.sample_ring = ring
+
+    def route(self, client_ip: str) -> tuple:
+        """按设备 IP 找到 (设备组, "eeg"|"trigger")，未知 IP 返回 (None, None)"""
+        for group in self.groups.values():
+            if client_ip == group.eeg_ip:
+                return group, "eeg"
+            if client_ip == group.trigger_ip:
+                return group, "trigger"
+        return None, None
+
+    def _resolve(self, session_id: Optional[str]) -> tuple:
+        """返回 (会话, 错误说明)；未指定 session_id 时只有一个进行中会话才能确定"""
+        if session_id:
+            session = self.active.get(session_id)
+            return (session, None) if session is not None else (None, f"Session not recording: {session_id}")
+        if not self.active:
+            return None, "Not recording"
+        if len(self.active) > 1:
+            return None, "Multiple sessions recording, session_id required"
+        return self._current(), None
+
+    def _new_session_id(self, group_name: str, user_dir: Path) -> str:
+        """会话 ID（同一秒内多个设备组开始录制时加组名区分）"""
+        base = f"session_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        taken = set(self.active) | {s["id"] for s in self.sessions[-50:]}
+        session_id = base
+        if session_id in taken or (user_dir / session_id).exists():
+            session_id = f"{base}_{group_name}"
+        n = 2
+        while session_id in taken or (user_dir / session_id).exists():
+            session_id = f"{base}_{group_name}_{n}"
+            n += 1
+        return session_id
+
+    def start_new_session(self, user_id=None, user_account=None, channels=None, montage=None, group=None):
+        """
+        在设备组上开始新的录制会话（支持用户关联）
+
+        group 为设备组名（默认 default）；channels / montage 见 resolve_channel_selection，
+        未选中的通道不进入缓冲与文件。
+        """
+        group_name = group or DEFAULT_DEVICE_GROUP
         with self.lock:
-            if self.is_recording:
+            device_group = self.groups.get(group_name)
+            if device_group is None:
+                return False, f"Unknown device group: {group_name}"
+            if device_group.session is not None:
                 return False, "Already recording"
 
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            session_id = f"session_{timestamp}"
+            try:
+                channel_index, channel_labels = resolve_channel_selection(channels, montage)
+            except (TypeError, ValueError) as e:
+                return False, f"Invalid channel selection: {e}"
+            device_channels = list(range(EEG_DEVICE_CHANNELS)) if channel_index is None else channel_index.tolist()
 
             # 按用户目录保存
-            if user_account:
-                session_dir = self.save_dir / user_account / session_id
-            else:
-                session_dir = self.save_dir / session_id
+            user_dir = self.save_dir / user_account if user_account else self.save_dir
+            session_id = self._new_session_id(group_name, user_dir)
+            session_dir = user_dir / session_id
             session_dir.mkdir(parents=True, exist_ok=True)
 
-            self.current_session = {
+            info = {
                 "id": session_id,
                 "dir": session_dir,
+                "device_group": group_name,
                 "start_time": datetime.now().isoformat(),
                 "end_time": None,
                 "samples": 0,
                 "user_id": user_id,
                 "user_account": user_account,
+                "storage_mode": self.storage_mode,
+                "channels": device_channels,
+                "channel_labels": channel_labels,
             }
 
-            self.eeg_buffer = StreamBuffer(num_channels=EEG_DEVICE_CHANNELS, buffer_size=1000)
-            self.trigger_buffer = StreamBuffer(num_channels=1, buffer_size=1000)
-            self.writer = StreamWriter(save_dir=session_dir, file_prefix="eeg_data")
-            self.writer.running = True
-
-            self.writer_thread = threading.Thread(
-                target=_stream_writer_thread,
-                args=(self.eeg_buffer, self.trigger_buffer, self.writer, self)
+            device_group.erp_averager.reset(num_channels=len(device_channels))
+            device_group.quality_monitor.reset(num_channels=len(device_channels), labels=channel_labels)
+            device_group.artifact_detector.reset(num_channels=len(device_channels), labels=channel_labels)
+            device_group.realtime_stats.update_quality(None)
+            if device_group.sample_ring is not None:
+                device_group.sample_ring.reset(
+                    num_channels=len(device_channels),
+                    uv_scale=EEG_UV_PER_COUNT if self.storage_mode == "counts" else 1.0
+                )
+            writer = StreamWriter(
+                save_dir=session_dir, file_prefix="eeg_data", storage_mode=self.storage_mode,
+                device_channels=device_channels, channel_labels=channel_labels, device_group=group_name
+            )
+            writer.running = True
+            trigger_buffer = StreamBuffer(num_channels=1, buffer_size=1000, name="trigger", device_group=group_name)
+            eeg_buffer = StreamBuffer(
+                num_channels=len(device_channels), buffer_size=1000,
+                dtype=np.int32 if self.storage_mode == "counts" else np.float32, name="eeg",
+                device_group=group_name
             )
-            self.writer_thread.daemon = True
-            self.writer_thread.start()
+            session = RecordingSession(
+                info, device_group, writer, eeg_buffer, trigger_buffer, channel_index, self.writer_pool
+            )
+            self.writer_pool.start()
+            pipeline_metrics.reset_session(group_name)
+            flight_recorder.set_dump_dir(session_dir, group=group_name)
 
-            self.is_recording = True
-            self.stats["start_time"] = time.time()
-            self.stats["total_samples"] = 0
-            self.stats["packets_received"] = 0
-            self.stats["packets_dropped"] = 0
+            # 先准备好会话再绑定：采集线程取到 group.session 时缓冲与通道选择已就绪
+            self.active[session_id] = session
+            device_group.session = session
 
-            realtime_stats.recording = True
-            realtime_stats.session_id = session_id
-            realtime_stats.start_time = time.time()
+            stats = device_group.realtime_stats
+            stats.recording = True
+            stats.session_id = session_id
+            stats.start_time = time.time()
+            pipeline_metrics.recording.set(len(self.active))
 
             return True, session_id
 
-    def stop_session(self):
-        """停止当前录制会话"""
+    def stop_session(self, session_id: Optional[str] = None):
+        """停止录制会话（未指定 session_id 时停止唯一的进行中会话）"""
         with self.lock:
-            if not self.is_recording:
-                return False, "Not recording"
-
-            session_id = self.current_session["id"] if self.current_session else None
-            if self.writer:
-                self.writer.running = False
-            self.is_recording = False
+            session, error = self._resolve(session_id)
+            if session is None:
+                return False, error
+            # 先解绑：采集线程之后的样本不再进入该会话
+            session.group.session = None
+            del self.active[session.id]
+            session.writer.running = False
 
-        # 在锁外等待写入线程结束，避免死锁
-        if self.writer_thread:
-            self.writer_thread.join(timeout=5.0)
+        # 在锁外写完剩余数据，不阻塞其他会话的开始/停止
+        summary = session.finish()
 
         with self.lock:
-            self._flush_remaining_data()
-
-            if self.writer:
-                self.writer.close()
-
-            if self.current_session:
-                self.current_session["end_time"] = datetime.now().isoformat()
-                self.current_session["samples"] = self.stats["total_samples"]
-                duration = time.time() - self.stats["start_time"] if self.stats["start_time"] else 0.0
-                self.current_session["duration"] = duration
-                self.sessions.append(self.current_session)
-
-                # 保存元数据
-                meta_file = self.current_session["dir"] / "metadata.json"
-                session_data = {
-                    "id": self.current_session["id"],
-                    "dir": str(self.current_session["dir"]),
-                    "start_time": self.current_session["start_time"],
-                    "end_time": self.current_session["end_time"],
-                    "samples": self.current_session["samples"],
-                    "duration": self.current_session["duration"]
-                }
-                with open(meta_file, "w") as f:
-                    json.dump(session_data, f, indent=2, ensure_ascii=False)
-
-            self.stats["recording_duration"] = time.time() - self.stats["start_time"] if self.stats["start_time"] else 0.0
-            self.current_session = None
-            self.eeg_buffer = None
-            self.trigger_buffer = None
-            self.writer = None
-
-            realtime_stats.recording = False
+            info = session.info
+            info["end_time"] = datetime.now().isoformat()
+            info["samples"] = session.stats["total_samples"]
+            info["duration"] = time.time() - session.stats["start_time"]
+            info["stats"] = summary
+            self.sessions.append(info)
+            self._last_stats = dict(session.stats, recording_duration=info["duration"])
+
+            # 保存元数据
+            meta_file = info["dir"] / "metadata.json"
+            session_data = {
+                "id": info["id"],
+                "dir": str(info["dir"]),
+                "device_group": info["device_group"],
+                "start_time": info["start_time"],
+                "end_time": info["end_time"],
+                "samples": info["samples"],
+                "duration": info["duration"],
+                "user_id": info["user_id"],
+                "user_account": info["user_account"],
+                "storage_mode": info["storage_mode"],
+                "channels": info["channels"],
+                "channel_labels": info["channel_labels"],
+                "stats": summary,
+            }
+            with open(meta_file, "w") as f:
+                json.dump(session_data, f, indent=2, ensure_ascii=False)
 
-            return True, session_id
+            session.group.realtime_stats.recording = False
+            pipeline_metrics.recording.set(len(self.active))
+            flight_recorder.set_dump_dir(None, group=session.group.name)
 
-    def _flush_remaining_data(self):
-        """刷新剩余缓冲数据"""
-        if self.eeg_buffer and self.eeg_buffer.write_idx > 0 and self.writer:
-            remaining = self.eeg_buffer.write_buffer[:, :self.eeg_buffer.write_idx].copy()
-            if remaining.shape[1] > 0:
-                self.writer.write_eeg_chunk(remaining)
+            return True, session.id
 
-        if self.trigger_buffer and self.trigger_buffer.write_idx > 0 and self.writer:
-            remaining = self.trigger_buffer.write_buffer[:, :self.trigger_buffer.write_idx].copy()
-            if remaining.shape[1] > 0:
-                self.writer.write_trigger_chunk(remaining.flatten().astype(np.int32))
+    def get_status(self, session_id: Optional[str] = None) -> Optional[dict]:
+        """
+        获取状态
 
-    def get_status(self) -> dict:
-        """获取当前状态"""
+        指定 session_id 时返回该会话的状态（不在录制返回 None）；否则返回总览：
+        顶层字段为最近开始的会话（兼容单会话），sessions 为全部进行中会话，device_groups 为各设备组。
+        """
         with self.lock:
-            duration = 0.0
-            if self.is_recording and self.stats["start_time"]:
-                duration = time.time() - self.stats["start_time"]
+            if session_id:
+                session = self.active.get(session_id)
+                return session.get_status() if session is not None else None
 
+            current = self._current()
+            status = current.get_status() if current is not None else {}
             return {
-                "is_recording": self.is_recording,
-                "current_session": self.current_session["id"] if self.current_session else None,
-                "session_dir": str(self.current_session["dir"]) if self.current_session else None,
+                "is_recording": bool(self.active),
+                "current_session": current.id if current is not None else None,
+                "session_dir": status.get("session_dir"),
+                "channels": status.get("channels"),
                 "eeg_connected": EEG_CONNECTED,
                 "trigger_connected": TRIGGER_CONNECTED,
-                "total_samples": self.stats["total_samples"],
-                "recording_duration": round(duration, 2),
-                "packets_received": self.stats["packets_received"],
-                "packets_dropped": self.stats["packets_dropped"],
-                "queue_size": self.eeg_buffer.data_queue.qsize() if self.eeg_buffer else 0
+                "total_samples": status.get("total_samples", 0),
+                "recording_duration": status.get("recording_duration", 0.0),
+                "packets_received": status.get("packets_received", 0),
+                "packets_dropped": status.get("packets_dropped", 0),
+                "queue_size": status.get("queue_size", 0),
+                "sessions": [s.get_status() for s in self.active.values()],
+                "device_groups": [g.get_status() for g in self.groups.values()],
+                "writer_pool": self.writer_pool.get_status(),
             }
 
     def get_sessions(self) -> list:
         """获取所有会话列表"""
         return self.sessions
 
+    def add_marker(self, value: int, label: str = "", duration: int = 0, at: Optional[float] = None,
+                   session_id: Optional[str] = None):
+        """
+        在实时 EEG 流的当前样本处打一个软件标记，写入会话事件表
+
+        at 为收到请求的 perf_counter 时刻（默认现在）；样本序号 = 最近到达的样本
+        + 自其到达以来经过的时间 × 采样率（最多外推 MARKER_MAX_EXTRAPOLATION 秒）。
+        返回 (success, result)，result 为标记信息或错误说明。
+        """
+        at = time.perf_counter() if at is None else at
+        received = time.time()
+        with self.lock:
+            session, error = self._resolve(session_id)
+            if session is None:
+                return False, error
+        last_time = session.last_sample_time
+        latest = session.eeg_buffer.total_samples - 1
+        if last_time is None or latest < 0:
+            return False, "No live EEG samples yet"
+
+        elapsed = min(max(0.0, at - last_time), MARKER_MAX_EXTRAPOLATION)
+        sample = latest + int(round(elapsed * EEG_SAMPLE_RATE))
+        session.writer.add_marker(sample, int(value), int(duration), label or "", received)
+        session.notify()
+        return True, {
+            "session_id": session.id,
+            "sample": sample,
+            "time": round(sample / EEG_SAMPLE_RATE, 3),
+            "value": int(value),
+            "label": label or "",
+            "extrapolated_ms": round(elapsed * 1000, 3),
+        }
+
+    # 以下访问器让 API 层不直接依赖本进程的全局状态（独立采集进程模式下由代理转发）
+
+    def get_realtime_stats(self, session_id: Optional[str] = None) -> Optional[dict]:
+        """实时统计（默认设备组；指定 session_id 时为其设备组，不在录制返回 None）"""
+        if not session_id:
+            return realtime_stats.get_stats()
+        session = self.active.get(session_id)
+        return session.group.realtime_stats.get_stats() if session is not None else None
+
+    def get_erp_averager(self, session_id: Optional[str] = None) -> Optional[OnlineERPAverager]:
+        """在线 ERP 平均器（默认设备组；指定 session_id 时为其设备组，不在录制返回 None）"""
+        if not session_id:
+            return self.erp_averager
+        session = self.active.get(session_id)
+        return session.group.erp_averager if session is not None else None
+
+    def render_metrics(self) -> str:
+        return pipeline_metrics.render()
 
-def _stream_writer_thread(eeg_buffer: StreamBuffer, trigger_buffer: StreamBuffer,
-                          writer: StreamWriter, session_manager: SessionManager):
-    """后台写入线程：从缓冲区读取数据并写入磁盘"""
-    while writer.running:
-        # 轮询 EEG 缓冲区
-        eeg_chunk = eeg_buffer.read_chunk(timeout=0.5)
-        if eeg_chunk is not None:
-            data, total_samples = eeg_chunk
-            writer.write_eeg_chunk(data)
-            with session_manager.lock:
-                session_manager.stats["total_samples"] = total_samples
+    def get_flight_status(self) -> dict:
+        return flight_recorder.get_status()
 
-        # 轮询 Trigger 缓冲区
-        trigger_chunk = trigger_buffer.read_chunk(timeout=0.1)
-        if trigger_chunk is not None:
-            data, _ = trigger_chunk
-            writer.write_trigger_chunk(data.flatten().astype(np.int32))
+    def dump_flight(self, directory=None, session_id: Optional[str] = None) -> str:
+        """
+        按需转储飞行记录器
+
+        默认写入 session_id 指定（未指定时为最近开始）的会话目录，未录制时写入数据目录下的 flight_recorder/。
+        """
+        with self.lock:
+            session = self.active.get(session_id) if session_id else self._current()
+            if session_id and session is None:
+                raise RuntimeError(f"Session not recording: {session_id}")
+        if directory is None:
+            directory = session.info["dir"] if session is not None else self.save_dir / "flight_recorder"
+        group = session.group.name if session is not None else None
+        return str(flight_recorder.dump(directory, reason="manual", group=group))
 
 
-def _handle_eeg_client(client_socket: socket.socket, session_manager: SessionManager):
-    """处理 EEG 设备连接"""
+def _handle_eeg_client(client_socket: socket.socket, session_manager: SessionManager, group: DeviceGroup):
+    """处理 EEG 设备连接（样本写入设备组当前绑定的会话）"""
     global EEG_CONNECTED
-    EEG_CONNECTED = True
-    realtime_stats.eeg_connected = True
+    is_default = group.name == DEFAULT_DEVICE_GROUP
+    group.eeg_connected = True
+    group.realtime_stats.eeg_connected = True
+    if is_default:
+        EEG_CONNECTED = True
 
-    eeg_parser = FrameParser(start_bytes=EEG_BOX_START_BYTES)
+    eeg_parser = FrameParser(start_bytes=EEG_BOX_START_BYTES, raw_counts=session_manager.storage_mode == "counts")
     loss_tracker = PacketLossTracker()
     padded_count = 0
     last_data = None
     update_interval = 2000
+    rate_meter = RateMeter(pipeline_metrics.parse_rate, group=group.name, stream="eeg")
+    last_arrival = None
+    stats = group.realtime_stats
 
     try:
         while True:
@@ -635,42 +1658,79 @@ def _handle_eeg_client(client_socket: socket.socket, session_manager: SessionMan
             current_data = result[2]
             missing = loss_tracker.observe(current_index)
 
-            if session_manager.is_recording and session_manager.eeg_buffer:
+            now = time.perf_counter()
+            if last_arrival is not None:
+                pipeline_metrics.interarrival.observe(now - last_arrival, group=group.name, stream="eeg")
+                flight_recorder.record(EVENT_ARRIVAL, STREAM_EEG, current_index, now - last_arrival, group.name)
+            last_arrival = now
+            pipeline_metrics.frames_parsed.inc(group=group.name, stream="eeg")
+            rate_meter.tick()
+            if missing > 0:
+                pipeline_metrics.packets_dropped.inc(missing, group=group.name, stream="eeg")
+                flight_recorder.record_gap(STREAM_EEG, missing, current_index, group.name)
+
+            session = group.session
+            if session is not None:
+                eeg_buffer = session.eeg_buffer
+                # 通道选择在解码后立即应用（向量化下标），未选中的通道不进入缓冲
+                channel_index = session.channel_index
+                sample_ring = group.sample_ring
+                sample = current_data if channel_index is None else current_data[channel_index]
                 # 丢包补偿：用前一帧数据填充
                 if missing > 0 and last_data is not None:
+                    pad_sample = last_data if channel_index is None else last_data[channel_index]
                     pad_packets = min(missing, 10_000)
                     for _ in range(pad_packets):
-                        session_manager.eeg_buffer.write(last_data)
+                        eeg_buffer.write(pad_sample)
+                        group.erp_averager.push_eeg(pad_sample)
+                        if sample_ring is not None:
+                            sample_ring.write_eeg(pad_sample)
                     padded_count += pad_packets
-
-                session_manager.eeg_buffer.write(current_data)
-            last_data = current_data.copy()
-
-            with session_manager.lock:
-                session_manager.stats["packets_received"] = loss_tracker.received
-                session_manager.stats["packets_dropped"] = loss_tracker.dropped
+                    pipeline_metrics.samples_padded.inc(pad_packets, group=group.name, stream="eeg")
+                    with session.lock:
+                        session.stats["samples_padded"] += pad_packets
+
+                eeg_buffer.write(sample)
+                group.erp_averager.push_eeg(sample)
+                if sample_ring is not None:
+                    sample_ring.write_eeg(sample)
+                # 先计数后记时刻：标记打点读到新时刻时一定也读到新计数
+                session.last_sample_time = now
+
+                with session.lock:
+                    session.stats["packets_received"] = loss_tracker.received
+                    session.stats["packets_dropped"] = loss_tracker.dropped
+            last_data = current_data
 
             if loss_tracker.received % update_interval == 0:
-                realtime_stats.update_eeg(current_index, loss_tracker.received, loss_tracker.dropped, padded_count)
+                stats.update_eeg(current_index, loss_tracker.received, loss_tracker.dropped, padded_count)
 
     except Exception:
         pass
     finally:
-        EEG_CONNECTED = False
-        realtime_stats.eeg_connected = False
+        group.eeg_connected = False
+        stats.eeg_connected = False
+        if is_default:
+            EEG_CONNECTED = False
         client_socket.close()
 
 
-def _handle_trigger_client(client_socket: socket.socket, session_manager: SessionManager):
-    """处理 Trigger 设备连接"""
+def _handle_trigger_client(client_socket: socket.socket, session_manager: SessionManager, group: DeviceGroup):
+    """处理 Trigger 设备连接（触发值写入设备组当前绑定的会话）"""
     global TRIGGER_CONNECTED
-    TRIGGER_CONNECTED = True
-    realtime_stats.trigger_connected = True
+    is_default = group.name == DEFAULT_DEVICE_GROUP
+    group.trigger_connected = True
+    group.realtime_stats.trigger_connected = True
+    if is_default:
+        TRIGGER_CONNECTED = True
 
     trigger_parser = FrameParser(start_bytes=TRIGGER_BOX_START_BYTES)
     loss_tracker = PacketLossTracker()
     padded_count = 0
     update_interval = 2000
+    rate_meter = RateMeter(pipeline_metrics.parse_rate, group=group.name, stream="trigger")
+    last_arrival = None
+    stats = group.realtime_stats
 
     try:
         while True:
@@ -679,31 +1739,50 @@ def _handle_trigger_client(client_socket: socket.socket, session_manager: Sessio
             current_trigger = result[2]
             missing = loss_tracker.observe(current_index)
 
-            if session_manager.is_recording and session_manager.trigger_buffer:
+            now = time.perf_counter()
+            if last_arrival is not None:
+                pipeline_metrics.interarrival.observe(now - last_arrival, group=group.name, stream="trigger")
+                flight_recorder.record(EVENT_ARRIVAL, STREAM_TRIGGER, current_index, now - last_arrival, group.name)
+            last_arrival = now
+            pipeline_metrics.frames_parsed.inc(group=group.name, stream="trigger")
+            rate_meter.tick()
+            if missing > 0:
+                pipeline_metrics.packets_dropped.inc(missing, group=group.name, stream="trigger")
+                flight_recorder.record_gap(STREAM_TRIGGER, missing, current_index, group.name)
+
+            session = group.session
+            if session is not None:
+                trigger_buffer = session.trigger_buffer
+                sample_ring = group.sample_ring
                 # 丢包补偿：用 0 填充
                 if missing > 0:
                     pad_packets = min(missing, 10_000)
                     for _ in range(pad_packets):
-                        session_manager.trigger_buffer.write(np.array([0], dtype=np.float32))
+                        trigger_buffer.write(np.array([0], dtype=np.float32))
+                        group.erp_averager.push_trigger(0)
+                        if sample_ring is not None:
+                            sample_ring.write_trigger(0)
                     padded_count += pad_packets
+                    pipeline_metrics.samples_padded.inc(pad_packets, group=group.name, stream="trigger")
 
-                session_manager.trigger_buffer.write(np.array([current_trigger], dtype=np.float32))
-
-            with session_manager.lock:
-                session_manager.stats["packets_received"] = loss_tracker.received
-                session_manager.stats["packets_dropped"] = loss_tracker.dropped
+                trigger_buffer.write(np.array([current_trigger], dtype=np.float32))
+                group.erp_averager.push_trigger(current_trigger)
+                if sample_ring is not None:
+                    sample_ring.write_trigger(current_trigger)
 
             if current_trigger != 0:
-                realtime_stats.last_trigger_value = current_trigger
+                stats.last_trigger_value = current_trigger
 
             if loss_tracker.received % update_interval == 0:
-                realtime_stats.update_trigger(current_index, loss_tracker.received, loss_tracker.dropped, padded_count, trigger_value=None)
+                stats.update_trigger(current_index, loss_tracker.received, loss_tracker.dropped, padded_count, trigger_value=None)
 
     except Exception:
         pass
     finally:
-        TRIGGER_CONNECTED = False
-        realtime_stats.trigger_connected = False
+        group.trigger_connected = False
+        stats.trigger_connected = False
+        if is_default:
+            TRIGGER_CONNECTED = False
         client_socket.close()
 
 
@@ -745,6 +1824,10 @@ class EEGDeviceServer:
         self.server_socket = None
         self.running = False
         self.server_thread = None
+        # 默认设备组的 IP 来自构造参数（其余设备组在 SessionManager 中配置）
+        default_group = session_manager.groups[DEFAULT_DEVICE_GROUP]
+        default_group.eeg_ip = default_group.eeg_ip or eeg_ip
+        default_group.trigger_ip = default_group.trigger_ip or trigger_ip
 
     def start(self):
         """启动 TCP 服务器（后台线程）"""
@@ -772,7 +1855,9 @@ class EEGDeviceServer:
     def send_start_cmd(self):
         """发送启动指令到设备"""
         for _ in range(1):
-            send_start_instruction(self.host_ip, self.eeg_ip, self.trigger_ip)
+            for group in self.session_manager.groups.values():
+                if group.eeg_ip or group.trigger_ip:
+                    send_start_instruction(self.host_ip, group.eeg_ip, group.trigger_ip)
             time.sleep(0.1)
 
     def _run_server(self):
@@ -784,7 +1869,7 @@ class EEGDeviceServer:
 
         try:
             self.server_socket.bind((self.host_ip, self.port))
-            self.server_socket.listen(2)
+            self.server_socket.listen(2 * len(self.session_manager.groups))
         except Exception as e:
             self.running = False
             return
@@ -797,18 +1882,19 @@ class EEGDeviceServer:
                 # 发送启动指令
                 self.send_start_cmd()
 
-                # 根据 IP 分发到对应处理器
-                if client_ip == self.eeg_ip:
+                # 根据 IP 找到设备组，分发到对应处理器
+                group, stream = self.session_manager.route(client_ip)
+                if stream == "eeg":
                     t = threading.Thread(
                         target=_handle_eeg_client,
-                        args=(client_socket, self.session_manager),
+                        args=(client_socket, self.session_manager, group),
                         daemon=True
                     )
                     t.start()
-                elif client_ip == self.trigger_ip:
+                elif stream == "trigger":
                     t = threading.Thread(
                         target=_handle_trigger_client,
-                        args=(client_socket, self.session_manager),
+                        args=(client_socket, self.session_manager, group),
                         daemon=True
                     )
                     t.start()
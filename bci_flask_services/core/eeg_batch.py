@@ -0,0 +1,289 @@
+"""
+EEG 跨会话批量分析模块
+
+- 会话发现：扫描 EEG_DATA_DIR 目录树，或读取 eeg_session 表
+- 并行执行：ProcessPoolExecutor 按会话分发，每个 worker 独立打开自己的 HDF5 文件
+- 断点续跑：结果逐条追加到 JSONL 清单，重启后跳过已成功的会话
+- 分析函数可插拔：签名为 func(session: dict) -> dict（结果需可 JSON 序列化）
+"""
+
+import importlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable, Optional, Union
+
+import h5py
+import numpy as np
+
+from bci_flask_services.core.eeg import (
+    EEG_SAMPLE_RATE,
+    ChannelStatsAccumulator,
+    StrPath,
+    apply_uv_scale,
+    get_uv_scale,
+)
+
+AnalysisFunc = Union[str, Callable[[dict], dict]]
+
+# 标准频段（Hz）
+EEG_BANDS = {
+    "delta": (1.0, 4.0),
+    "theta": (4.0, 8.0),
+    "alpha": (8.0, 13.0),
+    "beta": (13.0, 30.0),
+    "gamma": (30.0, 45.0),
+}
+
+
+def _session_from_dir(session_dir: Path, data_root: Path) -> dict:
+    eeg_file = next(iter(session_dir.glob("*_eeg_*.h5")), None)
+    trigger_file = next(iter(session_dir.glob("*_trigger_*.h5")), None)
+    user_account = session_dir.parent.name if session_dir.parent != data_root else None
+    return {
+        "session_id": session_dir.name,
+        "session_dir": str(session_dir),
+        "eeg_file": str(eeg_file) if eeg_file else None,
+        "trigger_file": str(trigger_file) if trigger_file else None,
+        "user_account": user_account,
+    }
+
+
+def discover_sessions_from_dir(data_dir: StrPath) -> list:
+    """扫描目录树发现会话（结构与 SessionManager 一致：[user_account/]session_*）"""
+    root = Path(data_dir)
+    if not root.exists():
+        return []
+    sessions = []
+    for session_dir in sorted(root.rglob("session_*")):
+        if session_dir.is_dir():
+            sessions.append(_session_from_dir(session_dir, root))
+    return sessions
+
+
+def discover_sessions_from_db() -> list:
+    """从 eeg_session 表发现会话（需在 Flask app_context 内调用）"""
+    from bci_flask_services.models import EegSession
+
+    sessions = []
+    for record in EegSession.query.order_by(EegSession.id.asc()).all():
+        sessions.append({
+            "session_id": record.session_id,
+            "session_dir": record.session_dir,
+            "eeg_file": record.eeg_file,
+            "trigger_file": record.trigger_file,
+            "user_account": record.user_account,
+            "user_id": record.user_id,
+            "start_time": record.start_time.isoformat() if record.start_time else None,
+        })
+    return sessions
+
+
+def resolve_analysis(func: AnalysisFunc) -> Callable[[dict], dict]:
+    """解析分析函数：可直接传入可调用对象，或 "package.module:function" 字符串"""
+    if callable(func):
+        return func
+    module_path, _, attr = str(func).partition(":")
+    if not attr:
+        module_path, _, attr = str(func).rpartition(".")
+    return getattr(importlib.import_module(module_path), attr)
+
+
+def load_manifest(manifest_path: StrPath) -> dict:
+    """读取结果清单，返回 session_id -> 最后一条记录"""
+    done = {}
+    path = Path(manifest_path)
+    if not path.exists():
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # 进程崩溃可能留下半行，忽略即可
+                continue
+            done[entry.get("session_id")] = entry
+    return done
+
+
+def _run_one(func: AnalysisFunc, session: dict) -> dict:
+    """worker 进程入口"""
+    started = time.time()
+    entry = {"session_id": session.get("session_id"), "worker": os.getpid()}
+    try:
+        entry["result"] = resolve_analysis(func)(session)
+        entry["status"] = "ok"
+    except Exception as e:
+        entry["status"] = "error"
+        entry["error"] = f"{type(e).__name__}: {e}"
+    entry["elapsed"] = round(time.time() - started, 3)
+    return entry
+
+
+def run_batch(sessions: list, func: AnalysisFunc, manifest_path: StrPath,
+              max_workers: Optional[int] = None, retry_failed: bool = False,
+              progress: Optional[Callable[[dict, dict], None]] = None) -> dict:
+    """
+    并行执行批量分析
+
+    参数:
+        sessions: discover_* 返回的会话列表
+        func: 分析函数（顶层函数或 "module:function"，需能被子进程导入）
+        manifest_path: JSONL 结果清单；已成功的会话会被跳过
+        max_workers: 并发上限，默认 CPU 核数
+        retry_failed: 是否重跑清单中失败的会话
+        progress: 回调 progress(entry, summary)，每完成一个会话调用一次
+    返回:
+        {"total", "skipped", "ok", "error", "per_worker": {pid: 完成数}, "elapsed"}
+    """
+    manifest_path = Path(manifest_path)
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    previous = load_manifest(manifest_path)
+
+    pending = []
+    skipped = 0
+    for s in sessions:
+        prev = previous.get(s.get("session_id"))
+        if prev and (prev.get("status") == "ok" or not retry_failed):
+            skipped += 1
+            continue
+        pending.append(s)
+
+    summary = {
+        "total": len(sessions),
+        "skipped": skipped,
+        "ok": 0,
+        "error": 0,
+        "per_worker": {},
+        "elapsed": 0.0,
+    }
+    started = time.time()
+    if not pending:
+        return summary
+
+    workers = max(1, min(max_workers or os.cpu_count() or 1, len(pending)))
+    with open(manifest_path, "a", encoding="utf-8") as manifest, \
+            ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_run_one, func, s) for s in pending]
+        for future in as_completed(futures):
+            entry = future.result()
+            manifest.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+            manifest.flush()
+            os.fsync(manifest.fileno())
+
+            summary[entry["status"]] += 1
+            worker = str(entry["worker"])
+            summary["per_worker"][worker] = summary["per_worker"].get(worker, 0) + 1
+            summary["elapsed"] = round(time.time() - started, 3)
+            if progress is not None:
+                progress(entry, summary)
+
+    return summary
+
+
+# ============================================
+# 内置分析函数
+# ============================================
+
+def qa_summary(session: dict, block_samples: int = 100_000) -> dict:
+    """
+    会话质量摘要
+
+    优先使用录制时写入 metadata.json 的统计，缺失时按块扫描 HDF5 计算。
+    """
+    meta_file = Path(session.get("session_dir") or "") / "metadata.json"
+    if meta_file.exists():
+        with open(meta_file, "r", encoding="utf-8") as f:
+            stats = (json.load(f) or {}).get("stats")
+        if stats:
+            return stats
+
+    eeg_file = session.get("eeg_file")
+    if not eeg_file:
+        raise FileNotFoundError("eeg file not found")
+    with h5py.File(eeg_file, "r") as h5:
+        dataset = h5["eeg_data"]
+        scale = get_uv_scale(dataset)
+        acc = ChannelStatsAccumulator(dataset.shape[0])
+        for start in range(0, dataset.shape[1], block_samples):
+            acc.update(apply_uv_scale(dataset[:, start:start + block_samples], scale))
+    return acc.summary()
+
+
+def iter_window_psd(eeg_file: StrPath, window_seconds: float = 2.0, block_windows: int = 30):
+    """
+    按块迭代非重叠汉宁窗的单边功率谱密度
+
+    首次产出 (freqs, sample_rate)，之后每块产出 (window_starts, psd)，
+    psd 形状为 (channels, k, n_freqs)。内存占用与会话长度无关。
+    """
+    with h5py.File(eeg_file, "r") as h5:
+        dataset = h5["eeg_data"]
+        sample_rate = int(dataset.attrs.get("sample_rate", EEG_SAMPLE_RATE))
+        uv_scale = get_uv_scale(dataset)
+        num_channels, total = dataset.shape
+        win = int(window_seconds * sample_rate)
+        taper = np.hanning(win).astype(np.float64)
+        # PSD 归一化系数（与 µV 换算系数 uv_scale 区分）
+        scale = 1.0 / (sample_rate * (taper ** 2).sum())
+        freqs = np.fft.rfftfreq(win, d=1.0 / sample_rate)
+        yield freqs, sample_rate
+
+        step = win * block_windows
+        for start in range(0, total - win + 1, step):
+            block = dataset[:, start:min(total, start + step)]
+            k = block.shape[1] // win
+            if k == 0:
+                continue
+            segs = apply_uv_scale(block[:, :k * win], uv_scale).reshape(num_channels, k, win).astype(np.float64)
+            segs -= segs.mean(axis=2, keepdims=True)
+            psd = np.abs(np.fft.rfft(segs * taper, axis=2)) ** 2 * scale
+            psd[:, :, 1:-1] *= 2  # 单边谱
+            yield start + np.arange(k) * win, psd
+
+
+def band_powers(psd: np.ndarray, freqs: np.ndarray) -> dict:
+    """由 PSD（最后一维为频率）积分各频段绝对功率与相对功率"""
+    df = freqs[1] - freqs[0]
+    total_mask = (freqs >= EEG_BANDS["delta"][0]) & (freqs < EEG_BANDS["gamma"][1])
+    total_power = psd[..., total_mask].sum(axis=-1) * df
+    result = {}
+    for band, (lo, hi) in EEG_BANDS.items():
+        mask = (freqs >= lo) & (freqs < hi)
+        power = psd[..., mask].sum(axis=-1) * df
+        result[f"{band}_power"] = power
+        result[f"{band}_rel"] = np.divide(power, total_power, out=np.zeros_like(power), where=total_power > 0)
+    return result
+
+
+def band_power_features(session: dict, window_seconds: float = 2.0, block_windows: int = 30) -> dict:
+    """
+    逐通道频段功率（Welch 平均周期图，非重叠汉宁窗）
+
+    返回各频段的逐通道绝对功率（µV²）与相对功率。
+    """
+    eeg_file = session.get("eeg_file")
+    if not eeg_file:
+        raise FileNotFoundError("eeg file not found")
+
+    blocks = iter_window_psd(eeg_file, window_seconds, block_windows)
+    freqs, sample_rate = next(blocks)
+    psd_sum = None
+    n_windows = 0
+    for _, psd in blocks:
+        block_sum = psd.sum(axis=1)
+        psd_sum = block_sum if psd_sum is None else psd_sum + block_sum
+        n_windows += psd.shape[1]
+
+    if n_windows == 0:
+        raise ValueError("session shorter than one analysis window")
+
+    features = {"windows": n_windows, "sample_rate": sample_rate, "channels": psd_sum.shape[0]}
+    for name, values in band_powers(psd_sum / n_windows, freqs).items():
+        features[name] = [round(float(v), 6) for v in values]
+    return features
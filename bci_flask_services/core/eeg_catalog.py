@@ -0,0 +1,198 @@
+"""
+EEG 会话目录（数据库）
+
+GET /api/eeg/sessions 的查询实现：只读 eeg_session 表，列表不访问文件系统。
+    - keyset 分页：按 (start_time, id) 倒序，游标记录上一页最后一条的 (start_time, id)，
+      翻页代价与页码无关（不使用 OFFSET）
+    - 过滤：用户、开始时间范围、时长、质量（补零/平坦/饱和比例上限）
+    - 摘要字段（时长、样本数、通道数、质量比例）在录制结束/后台索引入库时写入
+
+录制结束（_save_session_to_db）与后台会话索引（core/eeg_indexer.SessionIndexer.scan）
+都用 session_fields() 从会话元数据生成记录字段，保证两条路径写入的内容一致。
+"""
+
+import base64
+import json
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+from bci_flask_services.models import EegSession
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+SESSION_ID_FORMAT = "session_%Y%m%d_%H%M%S"
+
+
+def parse_session_time(session_id: str) -> Optional[datetime]:
+    """从会话目录名（session_YYYYmmdd_HHMMSS）解析开始时间"""
+    try:
+        return datetime.strptime(session_id, SESSION_ID_FORMAT)
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_iso(value) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+def session_fields(meta: dict, session_dir: Path, user_account: Optional[str] = None) -> dict:
+    """
+    由会话元数据（metadata.json 内容或 SessionManager.sessions 中的条目）生成 EegSession 字段
+
+    只在写入时访问会话目录（查找 HDF5 文件名），查询时不再需要。
+    """
+    session_dir = Path(session_dir)
+    session_id = meta.get("id") or session_dir.name
+    eeg_file = next(iter(session_dir.glob("*_eeg_*.h5")), None) if session_dir.exists() else None
+    trigger_file = next(iter(session_dir.glob("*_trigger_*.h5")), None) if session_dir.exists() else None
+    stats = meta.get("stats") or {}
+    channels = meta.get("channels")
+
+    return {
+        "session_id": session_id,
+        "user_id": meta.get("user_id"),
+        "user_account": meta.get("user_account") or user_account,
+        "session_dir": str(session_dir),
+        "eeg_file": str(eeg_file) if eeg_file else None,
+        "trigger_file": str(trigger_file) if trigger_file else None,
+        "duration": meta.get("duration") or 0.0,
+        "samples": meta.get("samples") or 0,
+        # 旧版元数据没有 start_time 时用目录名推断，保证分页键非空
+        "start_time": _parse_iso(meta.get("start_time")) or parse_session_time(session_id),
+        "end_time": _parse_iso(meta.get("end_time")),
+        "padded_ratio": stats.get("padded_ratio"),
+        "flat_ratio": stats.get("flat_ratio"),
+        "saturation_ratio": stats.get("saturation_ratio"),
+        "channel_stats": json.dumps(stats.get("channels"), ensure_ascii=False) if stats else None,
+        "channel_count": len(channels) if channels else None,
+        "storage_mode": meta.get("storage_mode"),
+    }
+
+
+def upsert_session(fields: dict) -> EegSession:
+    """按 session_id 新增或更新记录（由调用方提交事务）"""
+    from bci_flask_services.db import db
+
+    record = EegSession.query.filter_by(session_id=fields["session_id"]).first()
+    if record is None:
+        record = EegSession(**fields)
+        db.session.add(record)
+    else:
+        for name, value in fields.items():
+            if value is not None:
+                setattr(record, name, value)
+    return record
+
+
+def session_summary(record: EegSession) -> dict:
+    """列表摘要（不含逐通道统计）"""
+    return {
+        "id": record.session_id,
+        "dir": record.session_dir or "",
+        "user_id": record.user_id,
+        "user_account": record.user_account,
+        "start_time": record.start_time.isoformat() if record.start_time else None,
+        "end_time": record.end_time.isoformat() if record.end_time else None,
+        "samples": record.samples or 0,
+        "duration": record.duration or 0.0,
+        "channel_count": record.channel_count,
+        "storage_mode": record.storage_mode,
+        "padded_ratio": record.padded_ratio,
+        "flat_ratio": record.flat_ratio,
+        "saturation_ratio": record.saturation_ratio,
+    }
+
+
+def encode_cursor(record: EegSession) -> str:
+    start = record.start_time.isoformat() if record.start_time else ""
+    return base64.urlsafe_b64encode(f"{start}|{record.id}".encode("ascii")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str) -> tuple:
+    """返回 (start_time 或 None, id)；格式错误时抛出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode("ascii")
+        start, record_id = raw.rsplit("|", 1)
+        return (datetime.fromisoformat(start) if start else None), int(record_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"invalid cursor: {e}")
+
+
+def parse_time_bound(value: Optional[str], end: bool = False) -> Optional[datetime]:
+    """
+    解析时间范围参数（ISO 日期或日期时间）；非法时抛出 ValueError
+
+    只给日期的结束边界按当天结束处理：end=2024-05-01 包含 5 月 1 日全天。
+    """
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if end and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed
+
+
+def query_sessions(user_id: Optional[int] = None, user_account: Optional[str] = None,
+                   start: Optional[datetime] = None, end: Optional[datetime] = None,
+                   min_duration: Optional[float] = None, max_duration: Optional[float] = None,
+                   max_padded_ratio: Optional[float] = None, max_flat_ratio: Optional[float] = None,
+                   max_saturation_ratio: Optional[float] = None,
+                   cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE) -> tuple:
+    """
+    查询会话列表，返回 (摘要列表, next_cursor)；没有更多数据时 next_cursor 为 None
+
+    user_id 与 user_account 同时给出时按“任一匹配”过滤（兼容只有 user_account 的旧记录）；
+    时间范围为 [start, end)；质量过滤会排除没有质量摘要的记录。
+    """
+    from sqlalchemy import and_, or_
+
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    query = EegSession.query
+
+    if user_id is not None and user_account:
+        query = query.filter(or_(EegSession.user_id == user_id, EegSession.user_account == user_account))
+    elif user_id is not None:
+        query = query.filter(EegSession.user_id == user_id)
+    elif user_account:
+        query = query.filter(EegSession.user_account == user_account)
+
+    if start is not None:
+        query = query.filter(EegSession.start_time >= start)
+    if end is not None:
+        query = query.filter(EegSession.start_time < end)
+    if min_duration is not None:
+        query = query.filter(EegSession.duration >= min_duration)
+    if max_duration is not None:
+        query = query.filter(EegSession.duration <= max_duration)
+    if max_padded_ratio is not None:
+        query = query.filter(EegSession.padded_ratio <= max_padded_ratio)
+    if max_flat_ratio is not None:
+        query = query.filter(EegSession.flat_ratio <= max_flat_ratio)
+    if max_saturation_ratio is not None:
+        query = query.filter(EegSession.saturation_ratio <= max_saturation_ratio)
+
+    if cursor:
+        after_time, after_id = decode_cursor(cursor)
+        # 倒序下 NULL 的 start_time 排在最后（MySQL 与 SQLite 一致）
+        if after_time is None:
+            query = query.filter(EegSession.start_time.is_(None), EegSession.id < after_id)
+        else:
+            query = query.filter(or_(
+                EegSession.start_time < after_time,
+                and_(EegSession.start_time == after_time, EegSession.id < after_id),
+                EegSession.start_time.is_(None),
+            ))
+
+    records = (
+        query.order_by(EegSession.start_time.desc(), EegSession.id.desc())
+        .limit(limit + 1)
+        .all()
+    )
+    next_cursor = encode_cursor(records[limit - 1]) if len(records) > limit else None
+    return [session_summary(r) for r in records[:limit]], next_cursor
@@ -0,0 +1,212 @@
+"""
+EEG 触发锁定分段（epoching）模块
+
+- 基于稀疏事件索引定位触发，不扫描原始 trigger 数据
+- 批量读取：相邻 epoch 合并为连续区间一次读出，再用 numpy 花式索引切分，
+  每个 HDF5 块最多解压一次，而不是每个事件一次读取
+- 磁盘缓存：结果按 (会话文件, 参数) 哈希保存为 npz，参数不变时直接命中
+- 坏段剔除：可选跳过与在线检测伪迹段重叠的 epoch（查事件索引，不读原始数据）
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from bci_flask_services.core.eeg import ARTIFACT_CODES, StrPath, apply_uv_scale, get_uv_scale
+from bci_flask_services.core.eeg_reader import (
+    EEG_DATASET,
+    artifact_overlaps,
+    find_events,
+    get_sample_rate,
+    session_file_cache,
+)
+
+EPOCH_CACHE_DIRNAME = "cache"
+# 缓存格式版本：修改分段算法时递增，使旧缓存自动失效
+EPOCH_CACHE_VERSION = 2
+# 合并读取时单个连续区间的样本上限（控制峰值内存）
+MAX_SPAN_SAMPLES = 200_000
+
+
+def _file_signature(path: StrPath) -> dict:
+    st = os.stat(path)
+    return {"path": str(Path(path).resolve()), "size": st.st_size, "mtime": st.st_mtime_ns}
+
+
+def epoch_cache_key(eeg_file: StrPath, trigger_file: StrPath, params: dict) -> str:
+    """由会话文件签名与分段参数计算缓存键"""
+    payload = {
+        "version": EPOCH_CACHE_VERSION,
+        "eeg": _file_signature(eeg_file),
+        "trigger": _file_signature(trigger_file),
+        "params": params,
+    }
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha1(raw).hexdigest()
+
+
+def _merge_spans(starts: np.ndarray, length: int, max_gap: int, max_span: int) -> list:
+    """
+    把按起点排序的等长窗口合并为连续读取区间
+
+    返回 [(span_start, span_end, first_epoch, last_epoch_exclusive), ...]
+    """
+    spans = []
+    if len(starts) == 0:
+        return spans
+    span_start = int(starts[0])
+    span_end = span_start + length
+    first = 0
+    for i in range(1, len(starts)):
+        s = int(starts[i])
+        e = s + length
+        if s - span_end <= max_gap and e - span_start <= max_span:
+            span_end = max(span_end, e)
+            continue
+        spans.append((span_start, span_end, first, i))
+        span_start, span_end, first = s, e, i
+    spans.append((span_start, span_end, first, len(starts)))
+    return spans
+
+
+def _read_epochs(eeg_file: StrPath, starts: np.ndarray, n_samples: int, channels=None) -> np.ndarray:
+    """批量读取 (n_epochs, channels, n_samples)，starts 必须升序"""
+    with session_file_cache.open(eeg_file) as h5:
+        dataset = h5[EEG_DATASET]
+        num_channels = dataset.shape[0]
+        chunk_len = dataset.chunks[1] if dataset.chunks else 1000
+        uv_scale = get_uv_scale(dataset)
+        dtype = np.float32 if uv_scale is not None else dataset.dtype
+    channel_idx = np.arange(num_channels) if channels is None else np.asarray(channels, dtype=np.int64)
+    out = np.empty((len(starts), len(channel_idx), n_samples), dtype=dtype)
+
+    offsets = np.arange(n_samples)
+    for span_start, span_end, first, last in _merge_spans(starts, n_samples, chunk_len, MAX_SPAN_SAMPLES):
+        with session_file_cache.open(eeg_file) as h5:
+            block = h5[EEG_DATASET][:, span_start:span_end]
+        if channels is not None:
+            block = block[channel_idx]
+        block = apply_uv_scale(block, uv_scale)
+        idx = (starts[first:last] - span_start)[:, None] + offsets[None, :]
+        # block[:, idx] -> (channels, epochs, samples)
+        out[first:last] = np.moveaxis(block[:, idx], 1, 0)
+    return out
+
+
+def extract_epochs(eeg_file: StrPath, trigger_file: StrPath, codes, tmin: float, tmax: float,
+                   baseline: Optional[tuple] = None, channels=None, reject_artifacts=None,
+                   use_cache: bool = True, cache_dir: Optional[StrPath] = None) -> dict:
+    """
+    按触发码切分 epoch
+
+    参数:
+        codes: 触发值列表
+        tmin/tmax: 相对触发起点的时间窗（秒），区间 [tmin, tmax)
+        baseline: (bmin, bmax) 秒，None 表示不做基线校正；端点为 None 时取窗口边界
+        channels: 通道下标列表（文件内位置），None 表示全部；越界时抛出 ValueError
+        reject_artifacts: 剔除与伪迹段重叠的 epoch；True 表示全部类型，
+            也可给出类型列表（blink/emg/pop），None/False 表示不剔除
+    返回:
+        {"epochs": (n_epochs, channels, samples) float32, "events": 事件结构化数组,
+         "times": 相对时间轴（秒）, "channels": 通道下标, "sample_rate": 采样率,
+         "rejected": 因伪迹剔除的 epoch 数, "cached": 是否命中缓存}
+    """
+    codes = sorted(set(int(c) for c in codes))
+    channels = None if channels is None else sorted(set(int(c) for c in channels))
+    if tmax <= tmin:
+        raise ValueError("tmax must be greater than tmin")
+    if reject_artifacts is True:
+        reject_artifacts = sorted(ARTIFACT_CODES)
+    elif reject_artifacts:
+        reject_artifacts = sorted(set(reject_artifacts))
+        unknown = set(reject_artifacts) - set(ARTIFACT_CODES)
+        if unknown:
+            raise ValueError(f"unknown artifact kinds: {sorted(unknown)}")
+    else:
+        reject_artifacts = None
+    params = {
+        "codes": codes,
+        "tmin": float(tmin),
+        "tmax": float(tmax),
+        "baseline": None if baseline is None else [None if b is None else float(b) for b in baseline],
+        "channels": channels,
+        "reject_artifacts": reject_artifacts,
+    }
+
+    # 缓存键已包含两个会话文件的签名：命中时不再查事件（缺索引的旧文件查事件需扫描 trigger 数据）
+    cache_file = None
+    if use_cache:
+        cache_root = Path(cache_dir) if cache_dir else Path(eeg_file).parent / EPOCH_CACHE_DIRNAME
+        cache_file = cache_root / f"epochs_{epoch_cache_key(eeg_file, trigger_file, params)}.npz"
+        if cache_file.exists():
+            with np.load(cache_file) as cached:
+                return {
+                    "epochs": cached["epochs"],
+                    "events": cached["events"],
+                    "times": cached["times"],
+                    "channels": cached["channels"].tolist(),
+                    "sample_rate": int(cached["sample_rate"]),
+                    "rejected": int(cached["rejected"]),
+                    "cached": True,
+                    "cache_file": str(cache_file),
+                }
+
+    with session_file_cache.open(eeg_file) as h5:
+        dataset = h5[EEG_DATASET]
+        sample_rate = get_sample_rate(dataset)
+        total = dataset.shape[1]
+        num_channels = dataset.shape[0]
+    if channels is not None:
+        bad = [c for c in channels if not 0 <= c < num_channels]
+        if bad:
+            raise ValueError(f"channels out of range 0..{num_channels - 1}: {bad}")
+
+    events = find_events(trigger_file, values=codes)
+    offset = int(round(tmin * sample_rate))
+    n_samples = int(round((tmax - tmin) * sample_rate))
+    starts = events["sample"].astype(np.int64) + offset
+    valid = (starts >= 0) & (starts + n_samples <= total)
+    rejected = 0
+    if reject_artifacts is not None and valid.any():
+        clean = ~artifact_overlaps(trigger_file, starts, starts + n_samples, kinds=reject_artifacts)
+        rejected = int((valid & ~clean).sum())
+        valid &= clean
+    events = events[valid]
+    starts = starts[valid]
+
+    epochs = _read_epochs(eeg_file, starts, n_samples, channels).astype(np.float32, copy=False)
+    times = (np.arange(n_samples) + offset) / sample_rate
+
+    if baseline is not None and len(epochs):
+        bmin = tmin if baseline[0] is None else float(baseline[0])
+        bmax = tmax if baseline[1] is None else float(baseline[1])
+        mask = (times >= bmin) & (times < bmax)
+        if mask.any():
+            epochs -= epochs[:, :, mask].mean(axis=2, keepdims=True)
+
+    channel_list = list(range(num_channels)) if channels is None else channels
+    result = {
+        "epochs": epochs,
+        "events": events,
+        "times": times,
+        "channels": channel_list,
+        "sample_rate": sample_rate,
+        "rejected": rejected,
+        "cached": False,
+        "cache_file": None,
+    }
+
+    if cache_file is not None:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = cache_file.with_name(cache_file.stem + f".{os.getpid()}.tmp.npz")
+        np.savez(tmp_file, epochs=epochs, events=events, times=times,
+                 channels=np.asarray(channel_list, dtype=np.int64), sample_rate=sample_rate,
+                 rejected=rejected)
+        os.replace(tmp_file, cache_file)
+        result["cache_file"] = str(cache_file)
+
+    return result
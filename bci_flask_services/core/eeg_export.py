@@ -0,0 +1,382 @@
+"""
+EEG 会话流式导出模块
+
+支持格式：
+- BDF+（24 位，与设备 ADC 位宽一致）
+- EDF+（16 位，物理量程取自概览金字塔的全局 min/max）
+- NPZ（eeg / trigger / events / sample_rate）
+
+所有格式都按块从 HDF5 读取并逐块产出字节，内存占用与会话长度无关；
+EDF/BDF 中 trigger 事件合并为标准注释通道（EDF Annotations / BDF Annotations）。
+"""
+
+import io
+import json
+import os
+import threading
+import time
+import uuid
+import zipfile
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Optional
+
+import numpy as np
+
+from bci_flask_services.core.eeg import ARTIFACT_LABELS, EEG_FULL_SCALE_UV, StrPath, get_uv_scale
+from bci_flask_services.core.eeg_reader import (
+    EEG_DATASET,
+    TRIGGER_DATASET,
+    find_events,
+    get_sample_rate,
+    iter_range_blocks,
+    read_overview,
+    session_file_cache,
+)
+
+EXPORT_FORMATS = ("bdf", "edf", "npz")
+# 每块处理的数据记录数（记录时长 1 秒）
+RECORDS_PER_BLOCK = 10
+# 已结束的导出任务保留时长（秒）与最多保留个数，超出后从任务表移除（导出文件保留在磁盘上）
+FINISHED_JOB_TTL_SECONDS = 3600.0
+MAX_FINISHED_JOBS = 100
+
+
+def _ascii(value, width: int) -> bytes:
+    text = str(value if value is not None else "")
+    raw = text.encode("ascii", errors="replace")[:width]
+    return raw.ljust(width, b" ")
+
+
+def _fmt_num(value: float, width: int = 8) -> str:
+    """把数值格式化为不超过 width 个字符（EDF 头部字段要求）"""
+    if float(value).is_integer() and len(str(int(value))) <= width:
+        return str(int(value))
+    for digits in range(width, -1, -1):
+        text = f"{value:.{digits}f}"
+        if len(text) <= width:
+            return text
+    return str(int(round(value)))[:width]
+
+
+def _session_start(session_dir: Optional[Path]) -> datetime:
+    if session_dir is not None:
+        meta_file = session_dir / "metadata.json"
+        if meta_file.exists():
+            try:
+                with open(meta_file, "r", encoding="utf-8") as f:
+                    return datetime.fromisoformat(json.load(f)["start_time"])
+            except Exception:
+                pass
+        try:
+            return datetime.strptime(session_dir.name, "session_%Y%m%d_%H%M%S")
+        except ValueError:
+            pass
+    return datetime.now()
+
+
+def _physical_range(eeg_file: StrPath, fmt: str, num_channels: int):
+    """逐通道物理量程：BDF 用 ADC 满量程（无损），EDF 用金字塔最粗级的全局 min/max"""
+    full = np.full(num_channels, EEG_FULL_SCALE_UV)
+    if fmt == "bdf":
+        return -full, full
+
+    # pixel_width=1 会选用最粗的金字塔级；缺少金字塔的旧文件按该级从原始数据现算
+    overview = read_overview(eeg_file, pixel_width=1)
+    if overview["min"].shape[1] == 0:
+        return -full, full
+    lo = overview["min"].min(axis=1).astype(np.float64)
+    hi = overview["max"].max(axis=1).astype(np.float64)
+    flat = hi <= lo
+    lo[flat] -= 1.0
+    hi[flat] += 1.0
+    return np.floor(lo), np.ceil(hi)
+
+
+def _annotation_records(events, sample_rate: int, n_records: int, record_samples: int):
+    """把事件按记录分组为 TAL 字节串，返回 (每条记录的 TAL 列表, 注释通道字节数)"""
+    per_record = [[] for _ in range(n_records)]
+    for e in events:
+        r = min(n_records - 1, int(e["sample"]) // record_samples)
+        onset = int(e["sample"]) / sample_rate
+        duration = int(e["duration"]) / sample_rate
+        text = ARTIFACT_LABELS.get(int(e["value"])) or f"T{int(e['value'])}"
+        per_record[r].append(f"+{onset:.3f}\x15{duration:.3f}\x14{text}\x14\x00".encode("ascii"))
+
+    longest = 0
+    for r, tals in enumerate(per_record):
+        keeping = len(f"+{r * record_samples / sample_rate:g}\x14\x14\x00")
+        longest = max(longest, keeping + sum(len(t) for t in tals))
+    return per_record, longest
+
+
+def iter_edf(eeg_file: StrPath, trigger_file: Optional[StrPath] = None, fmt: str = "bdf",
+             patient: str = "X", session_dir: Optional[Path] = None,
+             progress: Optional[Callable[[int, int], None]] = None):
+    """
+    逐块产出 EDF+/BDF+ 文件字节
+
+    记录时长 1 秒；最后一条不完整记录以 0 补齐。
+    """
+    bdf = fmt == "bdf"
+    bytes_per_sample = 3 if bdf else 2
+    dig_min, dig_max = (-8388608, 8388607) if bdf else (-32768, 32767)
+
+    with session_file_cache.open(eeg_file) as h5:
+        dataset = h5[EEG_DATASET]
+        num_channels, total = dataset.shape
+        sample_rate = get_sample_rate(dataset)
+        labels = [str(label) for label in dataset.attrs.get("channel_labels", [])]
+
+    record_samples = sample_rate
+    n_records = max(1, -(-total // record_samples))
+    events = find_events(trigger_file) if trigger_file else np.empty(0)
+    tals, annot_len = _annotation_records(events, sample_rate, n_records, record_samples)
+    annot_samples = -(-annot_len // bytes_per_sample)
+    annot_bytes = annot_samples * bytes_per_sample
+
+    phys_min, phys_max = _physical_range(eeg_file, fmt, num_channels)
+
+    start = _session_start(session_dir)
+    ns = num_channels + 1
+    header = io.BytesIO()
+    header.write(b"\xffBIOSEMI" if bdf else _ascii("0", 8))
+    header.write(_ascii(f"X X X {patient or 'X'}".replace("\n", " "), 80))
+    header.write(_ascii(f"Startdate {start.strftime('%d-%b-%Y').upper()} X X X", 80))
+    header.write(_ascii(start.strftime("%d.%m.%y"), 8))
+    header.write(_ascii(start.strftime("%H.%M.%S"), 8))
+    header.write(_ascii(256 * (ns + 1), 8))
+    header.write(_ascii("BDF+C" if bdf else "EDF+C", 44))
+    header.write(_ascii(n_records, 8))
+    header.write(_ascii(1, 8))
+    header.write(_ascii(ns, 4))
+
+    if len(labels) != num_channels:
+        labels = [f"Ch{c + 1:02d}" for c in range(num_channels)]
+    labels = [f"EEG {label}" for label in labels]
+    labels.append("BDF Annotations" if bdf else "EDF Annotations")
+    for label in labels:
+        header.write(_ascii(label, 16))
+    for _ in range(ns):
+        header.write(_ascii("", 80))
+    for c in range(ns):
+        header.write(_ascii("uV" if c < num_channels else "", 8))
+    for c in range(ns):
+        header.write(_ascii(_fmt_num(phys_min[c]) if c < num_channels else "-1", 8))
+    for c in range(ns):
+        header.write(_ascii(_fmt_num(phys_max[c]) if c < num_channels else "1", 8))
+    for _ in range(ns):
+        header.write(_ascii(dig_min, 8))
+    for _ in range(ns):
+        header.write(_ascii(dig_max, 8))
+    for _ in range(ns):
+        header.write(_ascii("", 80))
+    for c in range(ns):
+        header.write(_ascii(record_samples if c < num_channels else annot_samples, 8))
+    for _ in range(ns):
+        header.write(_ascii("", 32))
+    yield header.getvalue()
+
+    # 头部写入的物理量程是格式化后的值，换算必须使用同样的数值
+    phys_min = np.array([float(_fmt_num(v)) for v in phys_min])
+    phys_max = np.array([float(_fmt_num(v)) for v in phys_max])
+    gain = (phys_max - phys_min) / (dig_max - dig_min)
+
+    block_samples = record_samples * RECORDS_PER_BLOCK
+    record = 0
+    for block in iter_range_blocks(eeg_file, EEG_DATASET, 0, total, block_samples=block_samples):
+        n_rec = -(-block.shape[1] // record_samples)
+        if block.shape[1] < n_rec * record_samples:
+            pad = np.zeros((num_channels, n_rec * record_samples - block.shape[1]), dtype=block.dtype)
+            block = np.concatenate([block, pad], axis=1)
+
+        digital = np.round((block.astype(np.float64) - phys_min[:, None]) / gain[:, None] + dig_min)
+        digital = np.clip(digital, dig_min, dig_max).astype("<i4")
+        raw = digital.view(np.uint8).reshape(num_channels, n_rec, record_samples, 4)[..., :bytes_per_sample]
+        raw = raw.transpose(1, 0, 2, 3).reshape(n_rec, -1)
+
+        annot = np.zeros((n_rec, annot_bytes), dtype=np.uint8)
+        for i in range(n_rec):
+            r = record + i
+            tal = f"+{r * record_samples / sample_rate:g}\x14\x14\x00".encode("ascii") + b"".join(tals[r])
+            annot[i, :len(tal)] = np.frombuffer(tal, dtype=np.uint8)
+
+        yield np.hstack([raw, annot]).tobytes()
+        record += n_rec
+        if progress is not None:
+            progress(record, n_records)
+
+
+class _ChunkSink:
+    """供 zipfile 写入的只追加缓冲（不可 seek，zipfile 会改用数据描述符）"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def iter_npz(eeg_file: StrPath, trigger_file: Optional[StrPath] = None,
+             progress: Optional[Callable[[int, int], None]] = None, block_samples: int = 100_000):
+    """
+    逐块产出 NPZ（未压缩 zip）字节
+
+    eeg 以 (channels, samples) 列优先存放，可按样本块顺序写出。
+    """
+    with session_file_cache.open(eeg_file) as h5:
+        dataset = h5[EEG_DATASET]
+        num_channels, total = dataset.shape
+        # iter_range_blocks 会把原始计数换算为 µV
+        eeg_dtype = np.dtype(np.float32 if get_uv_scale(dataset) is not None else dataset.dtype).newbyteorder("<")
+        sample_rate = get_sample_rate(dataset)
+    trigger_total = 0
+    if trigger_file:
+        with session_file_cache.open(trigger_file) as h5:
+            trigger_total = h5[TRIGGER_DATASET].shape[0]
+
+    sink = _ChunkSink()
+    done = 0
+    grand_total = total + trigger_total
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as zf:
+        def _write_stream(name, path, dataset_name, shape, dtype, fortran_order):
+            nonlocal done
+            with zf.open(name, "w", force_zip64=True) as member:
+                np.lib.format.write_array_header_1_0(member, {
+                    "descr": np.lib.format.dtype_to_descr(dtype),
+                    "fortran_order": fortran_order,
+                    "shape": shape,
+                })
+                for block in iter_range_blocks(path, dataset_name, 0, shape[-1], block_samples=block_samples):
+                    member.write(np.ascontiguousarray(block.T, dtype=dtype).tobytes())
+                    done += block.shape[-1]
+                    if progress is not None:
+                        progress(done, grand_total)
+                    yield sink.drain()
+
+        yield from _write_stream("eeg.npy", eeg_file, EEG_DATASET, (num_channels, total), eeg_dtype, True)
+        if trigger_file:
+            yield from _write_stream("trigger.npy", trigger_file, TRIGGER_DATASET,
+                                     (trigger_total,), np.dtype("<i4"), False)
+            with zf.open("events.npy", "w") as member:
+                np.lib.format.write_array(member, find_events(trigger_file))
+        with zf.open("sample_rate.npy", "w") as member:
+            np.lib.format.write_array(member, np.asarray(sample_rate))
+    yield sink.drain()
+
+
+def iter_export(eeg_file: StrPath, trigger_file: Optional[StrPath] = None, fmt: str = "bdf",
+                patient: str = "X", progress: Optional[Callable[[int, int], None]] = None):
+    """按格式分发的导出字节流"""
+    fmt = fmt.lower()
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"unsupported export format: {fmt}")
+    if fmt == "npz":
+        return iter_npz(eeg_file, trigger_file, progress=progress)
+    return iter_edf(eeg_file, trigger_file, fmt=fmt, patient=patient,
+                    session_dir=Path(eeg_file).parent, progress=progress)
+
+
+def export_to_file(eeg_file: StrPath, out_path: StrPath, trigger_file: Optional[StrPath] = None,
+                   fmt: str = "bdf", patient: str = "X",
+                   progress: Optional[Callable[[int, int], None]] = None) -> Path:
+    """导出到文件（先写临时文件再原子替换；临时文件名唯一，并发导出互不覆盖）"""
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = out_path.with_name(f".{out_path.name}.{os.getpid()}.{uuid.uuid4().hex[:12]}.tmp")
+    try:
+        with open(tmp_path, "wb") as f:
+            for chunk in iter_export(eeg_file, trigger_file, fmt=fmt, patient=patient, progress=progress):
+                f.write(chunk)
+        os.replace(tmp_path, out_path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+    return out_path
+
+
+class ExportJobManager:
+    """
+    后台导出任务管理器
+
+    每个任务一个守护线程，进度按已写出的记录/样本比例更新。
+    同一输出文件同时只运行一个任务；已结束的任务超过 FINISHED_JOB_TTL_SECONDS
+    或超出 MAX_FINISHED_JOBS 个时移出任务表。
+    """
+
+    def __init__(self):
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def _expire_locked(self, now: float):
+        finished = sorted((job["finished_at"], job_id) for job_id, job in self.jobs.items()
+                          if job["finished_at"] is not None)
+        excess = len(finished) - MAX_FINISHED_JOBS
+        for i, (finished_at, job_id) in enumerate(finished):
+            if i < excess or now - finished_at > FINISHED_JOB_TTL_SECONDS:
+                del self.jobs[job_id]
+
+    def start(self, session_id: str, eeg_file: StrPath, trigger_file: Optional[StrPath],
+              fmt: str, out_path: StrPath, patient: str = "X") -> tuple:
+        """
+        启动导出任务，返回 (job_id, created)
+
+        同一输出文件已有运行中的任务时不再启动，返回该任务的 id 与 created=False。
+        """
+        job_id = uuid.uuid4().hex
+        job = {
+            "id": job_id,
+            "session_id": session_id,
+            "format": fmt,
+            "status": "running",
+            "progress": 0.0,
+            "path": str(out_path),
+            "error": None,
+            "started_at": time.time(),
+            "finished_at": None,
+        }
+        with self.lock:
+            self._expire_locked(time.time())
+            for existing in self.jobs.values():
+                if existing["status"] == "running" and existing["path"] == job["path"]:
+                    return existing["id"], False
+            self.jobs[job_id] = job
+
+        def _progress(done: int, total: int):
+            with self.lock:
+                job["progress"] = round(done / total, 4) if total else 1.0
+
+        def _run():
+            try:
+                export_to_file(eeg_file, out_path, trigger_file, fmt=fmt, patient=patient, progress=_progress)
+                status, error = "done", None
+            except Exception as e:
+                status, error = "error", str(e)
+            with self.lock:
+                job["status"] = status
+                job["error"] = error
+                job["finished_at"] = time.time()
+                if status == "done":
+                    job["progress"] = 1.0
+
+        threading.Thread(target=_run, daemon=True).start()
+        return job_id, True
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self.lock:
+            self._expire_locked(time.time())
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+
+# 全局任务管理器
+export_jobs = ExportJobManager()
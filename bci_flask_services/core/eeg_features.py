@@ -0,0 +1,272 @@
+"""
+EEG 跨会话列式特征库
+
+以 Parquet 存储会话级、窗口级与逐通道特征，按 user_account 做 hive 分区：
+    <root>/session/user_account=<account>/part-<session_id>.parquet
+    <root>/window/user_account=<account>/part-<session_id>.parquet
+    <root>/channel/user_account=<account>/part-<session_id>.parquet
+
+- 逐通道特征为长表，每行 (session_id, device_channel, label, band, power, rel)：
+  以设备通道号标识电极，不同会话的通道选择/通道数不同也能直接对齐查询
+- 每张表的 schema 固定，查询时按该 schema 读取全部分区文件（不依赖首个文件推断）
+- 增量更新：每个会话一个分区文件，录制结束或批量回填时写入/覆盖
+- 查询只读取需要的列，并把过滤条件下推到分区与行组
+- 依赖 pyarrow（可选依赖，未安装时相关函数抛出 RuntimeError）
+"""
+
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from bci_flask_services import config
+from bci_flask_services.core.eeg import StrPath
+from bci_flask_services.core.eeg_batch import EEG_BANDS, band_powers, iter_window_psd
+from bci_flask_services.core.eeg_reader import EEG_DATASET, session_file_cache
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as pa_ds
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - 可选依赖
+    pa = None
+    pa_ds = None
+    pq = None
+
+SESSION_TABLE = "session"
+WINDOW_TABLE = "window"
+CHANNEL_TABLE = "channel"
+UNKNOWN_USER = "__none__"
+# 会话表的质量摘要列（其余特征列为各频段的通道均值 <band>_power_mean / <band>_rel_mean）
+QUALITY_COLUMNS = ("padded_ratio", "flat_ratio", "saturation_ratio")
+
+
+def is_available() -> bool:
+    return pa is not None
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise RuntimeError("feature store requires pyarrow: pip install pyarrow")
+
+
+def get_store_root(root: Optional[StrPath] = None) -> Path:
+    if root is not None:
+        return Path(root)
+    default = Path(getattr(config, "EEG_DATA_DIR", "./data")) / "feature_store"
+    return Path(getattr(config, "EEG_FEATURE_STORE_DIR", default))
+
+
+def _load_metadata(session: dict) -> dict:
+    meta_file = Path(session.get("session_dir") or "") / "metadata.json"
+    if not meta_file.exists():
+        return {}
+    try:
+        with open(meta_file, "r", encoding="utf-8") as f:
+            return json.load(f) or {}
+    except Exception:
+        return {}
+
+
+def _parse_time(value):
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+def _channel_info(eeg_file: StrPath) -> tuple:
+    """文件内各通道对应的设备通道号与标签（旧文件没有标签时为 None）"""
+    with session_file_cache.open(eeg_file) as h5:
+        dataset = h5[EEG_DATASET]
+        device_channels = [int(c) for c in dataset.attrs.get("device_channels", range(dataset.shape[0]))]
+        labels = [label.decode("utf-8") if isinstance(label, bytes) else str(label)
+                  for label in dataset.attrs.get("channel_labels", [])]
+    if len(labels) != len(device_channels):
+        labels = [None] * len(device_channels)
+    return device_channels, labels
+
+
+def compute_session_features(session: dict, window_seconds: float = 2.0) -> tuple:
+    """
+    计算一个会话的特征
+
+    返回 (session_row, window_columns, channel_columns)：
+        session_row: 单行 dict（频段功率的通道均值 + 质量摘要）
+        window_columns: 列名 -> 列表（每个窗口一行，频段功率为通道均值）
+        channel_columns: 列名 -> 列表（每个 (设备通道, 频段) 一行的全程平均功率）
+    """
+    eeg_file = session.get("eeg_file")
+    if not eeg_file:
+        raise FileNotFoundError("eeg file not found")
+
+    meta = _load_metadata(session)
+    stats = meta.get("stats") or session.get("stats") or {}
+    start_time = _parse_time(session.get("start_time") or meta.get("start_time"))
+    session_id = session.get("session_id")
+    user_account = session.get("user_account")
+
+    blocks = iter_window_psd(eeg_file, window_seconds)
+    freqs, sample_rate = next(blocks)
+
+    window_cols = {"session_id": [], "window_index": [], "t_start": []}
+    for band in EEG_BANDS:
+        window_cols[f"{band}_power"] = []
+        window_cols[f"{band}_rel"] = []
+
+    psd_sum = None
+    n_windows = 0
+    for window_starts, psd in blocks:
+        per_window = band_powers(psd, freqs)  # (channels, k)
+        k = psd.shape[1]
+        window_cols["session_id"].extend([session_id] * k)
+        window_cols["window_index"].extend(range(n_windows, n_windows + k))
+        window_cols["t_start"].extend((window_starts / sample_rate).tolist())
+        for name, values in per_window.items():
+            window_cols[name].extend(values.mean(axis=0).tolist())
+
+        block_sum = psd.sum(axis=1)
+        psd_sum = block_sum if psd_sum is None else psd_sum + block_sum
+        n_windows += k
+
+    device_channels, labels = _channel_info(eeg_file)
+    channel_cols = {"session_id": [], "device_channel": [], "label": [], "band": [], "power": [], "rel": []}
+
+    row = {
+        "session_id": session_id,
+        "user_id": session.get("user_id") if session.get("user_id") is not None else meta.get("user_id"),
+        "start_time": start_time,
+        "date": start_time.strftime("%Y-%m-%d") if start_time else None,
+        "duration": float(meta.get("duration") or session.get("duration") or 0.0),
+        "samples": int(meta.get("samples") or session.get("samples") or 0),
+        "sample_rate": int(sample_rate),
+        "windows": n_windows,
+        "padded_ratio": stats.get("padded_ratio"),
+        "flat_ratio": stats.get("flat_ratio"),
+        "saturation_ratio": stats.get("saturation_ratio"),
+    }
+    if n_windows:
+        powers = band_powers(psd_sum / n_windows, freqs)
+        for name, values in powers.items():
+            row[f"{name}_mean"] = float(values.mean())
+        for band in EEG_BANDS:
+            channel_cols["session_id"].extend([session_id] * len(device_channels))
+            channel_cols["device_channel"].extend(device_channels)
+            channel_cols["label"].extend(labels)
+            channel_cols["band"].extend([band] * len(device_channels))
+            channel_cols["power"].extend(powers[f"{band}_power"].tolist())
+            channel_cols["rel"].extend(powers[f"{band}_rel"].tolist())
+    row["user_account"] = user_account
+    return row, window_cols, channel_cols
+
+
+def table_schema(table: str):
+    """各表的固定 schema（不含分区列 user_account），写入与查询共用，保证跨文件一致"""
+    _require_pyarrow()
+    if table == SESSION_TABLE:
+        fields = [
+            ("session_id", pa.string()),
+            ("user_id", pa.int64()),
+            ("start_time", pa.timestamp("us")),
+            ("date", pa.string()),
+            ("duration", pa.float64()),
+            ("samples", pa.int64()),
+            ("sample_rate", pa.int64()),
+            ("windows", pa.int64()),
+        ]
+        fields += [(name, pa.float64()) for name in QUALITY_COLUMNS]
+        fields += [(f"{band}_{kind}_mean", pa.float64()) for band in EEG_BANDS for kind in ("power", "rel")]
+    elif table == WINDOW_TABLE:
+        fields = [("session_id", pa.string()), ("window_index", pa.int64()), ("t_start", pa.float64())]
+        fields += [(f"{band}_{kind}", pa.float64()) for band in EEG_BANDS for kind in ("power", "rel")]
+    elif table == CHANNEL_TABLE:
+        fields = [
+            ("session_id", pa.string()),
+            ("device_channel", pa.int64()),
+            ("label", pa.string()),
+            ("band", pa.string()),
+            ("power", pa.float64()),
+            ("rel", pa.float64()),
+        ]
+    else:
+        raise ValueError(f"unknown feature table: {table}")
+    return pa.schema(fields)
+
+
+def _partition_dir(root: Path, table: str, user_account) -> Path:
+    return root / table / f"user_account={user_account or UNKNOWN_USER}"
+
+
+def _write_atomic(table, path: Path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    pq.write_table(table, tmp, compression="zstd")
+    os.replace(tmp, path)
+
+
+def update_session_features(session: dict, root: Optional[StrPath] = None,
+                            window_seconds: float = 2.0) -> dict:
+    """
+    增量更新：计算并写入（覆盖）一个会话的会话级、窗口级与逐通道特征
+
+    分区列 user_account 由目录名表达，不重复写入文件。
+    """
+    _require_pyarrow()
+    root = get_store_root(root)
+    row, window_cols, channel_cols = compute_session_features(session, window_seconds)
+    user_account = row.pop("user_account")
+    file_name = f"part-{row['session_id']}.parquet"
+
+    session_table = pa.Table.from_pylist([row], schema=table_schema(SESSION_TABLE))
+    _write_atomic(session_table, _partition_dir(root, SESSION_TABLE, user_account) / file_name)
+
+    window_table = pa.table(window_cols, schema=table_schema(WINDOW_TABLE))
+    _write_atomic(window_table, _partition_dir(root, WINDOW_TABLE, user_account) / file_name)
+
+    channel_table = pa.table(channel_cols, schema=table_schema(CHANNEL_TABLE))
+    _write_atomic(channel_table, _partition_dir(root, CHANNEL_TABLE, user_account) / file_name)
+
+    return {"session_rows": 1, "window_rows": window_table.num_rows, "channel_rows": channel_table.num_rows}
+
+
+def remove_session_features(session_id: str, user_account=None, root: Optional[StrPath] = None):
+    """删除一个会话的特征文件（会话被清理时调用）"""
+    root = get_store_root(root)
+    for table in (SESSION_TABLE, WINDOW_TABLE, CHANNEL_TABLE):
+        path = _partition_dir(root, table, user_account) / f"part-{session_id}.parquet"
+        if path.exists():
+            path.unlink()
+
+
+def feature_store_update(session: dict) -> dict:
+    """批量回填入口（供 run_eeg_batch.py --analysis 使用）"""
+    return update_session_features(session)
+
+
+def query_features(columns=None, filters=None, table: str = SESSION_TABLE,
+                   root: Optional[StrPath] = None):
+    """
+    查询特征，返回 pyarrow.Table（可 .to_pandas()）
+
+    参数:
+        columns: 需要的列名列表（None 表示全部）；只有这些列会被读取
+        filters: [(列, 运算符, 值), ...]，如 [("user_account", "=", "alice"), ("date", ">=", "2025-01-01")]
+        table: "session"、"window" 或 "channel"（逐通道长表，按 device_channel / band 过滤）
+    """
+    _require_pyarrow()
+    partition_schema = pa.schema([("user_account", pa.string())])
+    schema = pa.unify_schemas([table_schema(table), partition_schema])
+    path = get_store_root(root) / table
+    if not path.exists():
+        return schema.empty_table().select(columns) if columns else schema.empty_table()
+
+    # 显式 schema：各分区文件按同一 schema 读取，旧文件缺少的列为空值
+    dataset = pa_ds.dataset(str(path), schema=schema, format="parquet",
+                            partitioning=pa_ds.partitioning(partition_schema, flavor="hive"))
+    expression = pq.filters_to_expression(filters) if filters else None
+    return dataset.to_table(columns=columns, filter=expression)
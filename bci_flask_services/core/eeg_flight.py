@@ -0,0 +1,278 @@
+"""
+EEG 采集飞行记录器
+
+固定容量的环形缓冲，持续记录最近的采集事件（包到达、丢包缺口、队列深度、
+写入耗时与滞后、GC 停顿），用于丢包/滞后尖峰的事后分析：
+    - 稳态开销：每个事件一次原子序号 + 一次设备组编号查表 + 6 次列表赋值（约 1 µs，无锁、无分配）
+    - 丢包或写入滞后超过阈值时自动转储到该设备组当前会话的目录（按设备组分别计数与冷却）
+    - 也可通过 API 按需转储
+
+转储文件为 npz：flight_<时间>_<原因>.npz，数组 t（相对转储时刻的秒数，负值）、
+kind、stream、group（设备组编号，名称见 meta["groups"]）、value、aux，以及 meta（JSON 字符串）。
+用 load_dump() 读回。
+"""
+
+import gc
+import itertools
+import json
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+# 事件类型：value / aux 的含义
+EVENT_EMPTY = 0
+EVENT_ARRIVAL = 1   # 包到达：包序号 / 与上一包的间隔（秒）
+EVENT_GAP = 2       # 丢包缺口：缺失包数 / 缺口后的包序号
+EVENT_QUEUE = 3     # 数据块入队：入队后队列深度 / -
+EVENT_DISCARD = 4   # 队列满丢弃数据块：队列深度 / -
+EVENT_WRITE = 5     # 数据块写入：写入+flush 耗时（秒）/ 写入滞后（秒）
+EVENT_GC = 6        # GC 停顿：停顿时长（秒）/ 代数
+EVENT_NAMES = {
+    EVENT_ARRIVAL: "arrival", EVENT_GAP: "gap", EVENT_QUEUE: "queue",
+    EVENT_DISCARD: "discard", EVENT_WRITE: "write", EVENT_GC: "gc",
+}
+
+STREAM_NONE = 0
+STREAM_EEG = 1
+STREAM_TRIGGER = 2
+STREAM_CODES = {"eeg": STREAM_EEG, "trigger": STREAM_TRIGGER}
+STREAM_NAMES = {STREAM_NONE: "", STREAM_EEG: "eeg", STREAM_TRIGGER: "trigger"}
+# 不属于任何设备组的事件（GC 停顿）
+GROUP_NONE = ""
+
+
+class FlightRecorder:
+    """
+    采集事件环形缓冲
+
+    多个线程（EEG/Trigger 采集、写入线程、GC 回调）并发写入：槽位由
+    itertools.count 分配（next() 在 GIL 下是原子的），各线程写不同槽位，无需加锁。
+    """
+
+    def __init__(self, capacity: int = 65536, loss_packets: int = 50, lag_seconds: float = 2.0,
+                 cooldown: float = 60.0, post_seconds: float = 1.0):
+        self.lock = threading.Lock()
+        # 各设备组的自动转储目录与上次自动转储时刻
+        self.dump_dirs = {}
+        self.dumps = []
+        self.last_auto_dump = {}
+        # 设备组名称 -> 编号（写入 group 列）
+        self.group_codes = {GROUP_NONE: 0}
+        self.gc_hooked = False
+        self._gc_started = None
+        self.configure(capacity, loss_packets, lag_seconds, cooldown, post_seconds)
+
+    def configure(self, capacity: Optional[int] = None, loss_packets: Optional[int] = None,
+                  lag_seconds: Optional[float] = None, cooldown: Optional[float] = None,
+                  post_seconds: Optional[float] = None):
+        """
+        设置容量与自动转储阈值（修改容量会清空缓冲，应在采集开始前调用）
+
+        loss_packets: 一个设备组 1 秒内累计缺失包数达到该值时自动转储（0 表示不按丢包转储）
+        lag_seconds:  写入滞后（入队到落盘）超过该值时自动转储（0 表示不按滞后转储）
+        cooldown:     同一设备组两次自动转储的最小间隔（秒）
+        post_seconds: 触发后再等待的秒数，使转储包含事件之后的情况
+        """
+        if capacity is not None:
+            capacity = max(16, int(capacity))
+            with self.lock:
+                self._seq = itertools.count()
+                self.t = [0.0] * capacity
+                self.kind = [EVENT_EMPTY] * capacity
+                self.stream = [STREAM_NONE] * capacity
+                self.group = [0] * capacity
+                self.value = [0.0] * capacity
+                self.aux = [0.0] * capacity
+                self.capacity = capacity
+                # 各设备组的丢包计数窗口：组名 -> [窗口起点, 累计缺失包数]
+                self._loss_windows = {}
+        if loss_packets is not None:
+            self.loss_packets = int(loss_packets)
+        if lag_seconds is not None:
+            self.lag_seconds = float(lag_seconds)
+        if cooldown is not None:
+            self.cooldown = float(cooldown)
+        if post_seconds is not None:
+            self.post_seconds = float(post_seconds)
+
+    def group_code(self, group: str) -> int:
+        """设备组编号（首次出现时分配）"""
+        code = self.group_codes.get(group)
+        if code is None:
+            with self.lock:
+                code = self.group_codes.setdefault(group, len(self.group_codes))
+        return code
+
+    def record(self, kind: int, stream: int = STREAM_NONE, value: float = 0.0, aux: float = 0.0,
+               group: str = GROUP_NONE):
+        code = self.group_codes.get(group)
+        if code is None:
+            code = self.group_code(group)
+        i = next(self._seq) % self.capacity
+        self.t[i] = time.perf_counter()
+        self.kind[i] = kind
+        self.stream[i] = stream
+        self.group[i] = code
+        self.value[i] = value
+        self.aux[i] = aux
+
+    def record_gap(self, stream: int, missing: int, index: int, group: str = GROUP_NONE):
+        """记录丢包缺口，同一设备组 1 秒窗口内累计缺失达到阈值时自动转储"""
+        self.record(EVENT_GAP, stream, missing, index, group)
+        if self.loss_packets <= 0:
+            return
+        now = time.perf_counter()
+        window = self._loss_windows.get(group)
+        if window is None or now - window[0] > 1.0:
+            window = self._loss_windows[group] = [now, 0]
+        window[1] += missing
+        if window[1] >= self.loss_packets:
+            window[1] = 0
+            self.trigger(f"loss_{STREAM_NAMES[stream]}", group)
+
+    def record_write(self, stream: int, write_seconds: float, lag_seconds: float, group: str = GROUP_NONE):
+        """记录一次数据块写入，写入滞后超过阈值时自动转储"""
+        self.record(EVENT_WRITE, stream, write_seconds, lag_seconds, group)
+        if 0 < self.lag_seconds <= lag_seconds:
+            self.trigger(f"lag_{STREAM_NAMES[stream]}", group)
+
+    # ------------------------------------------------------------------
+    # GC 停顿
+    # ------------------------------------------------------------------
+
+    def _on_gc(self, phase: str, info: dict):
+        if phase == "start":
+            self._gc_started = time.perf_counter()
+        elif self._gc_started is not None:
+            self.record(EVENT_GC, STREAM_NONE, time.perf_counter() - self._gc_started, info.get("generation", -1))
+            self._gc_started = None
+
+    def install_gc_hook(self):
+        if not self.gc_hooked:
+            gc.callbacks.append(self._on_gc)
+            self.gc_hooked = True
+
+    def remove_gc_hook(self):
+        if self.gc_hooked:
+            gc.callbacks.remove(self._on_gc)
+            self.gc_hooked = False
+
+    # ------------------------------------------------------------------
+    # 转储
+    # ------------------------------------------------------------------
+
+    def set_dump_dir(self, path, group: str = GROUP_NONE):
+        """设备组的自动转储目录（录制开始时设为会话目录，停止时清空；为空时不自动转储）"""
+        with self.lock:
+            if path:
+                self.dump_dirs[group] = Path(path)
+            else:
+                self.dump_dirs.pop(group, None)
+
+    def trigger(self, reason: str, group: str = GROUP_NONE):
+        """
+        请求一次自动转储（在采集线程中调用，立即返回）
+
+        转储写入该设备组的会话目录；冷却期内或未设置转储目录时忽略；
+        实际转储在后台线程中等待 post_seconds 后进行。
+        """
+        dump_dir = self.dump_dirs.get(group)
+        now = time.time()
+        if dump_dir is None or now - self.last_auto_dump.get(group, 0.0) < self.cooldown:
+            return
+        self.last_auto_dump[group] = now
+
+        def _run():
+            time.sleep(self.post_seconds)
+            try:
+                self.dump(dump_dir, reason, group)
+            except OSError:
+                pass  # 转储失败不影响采集
+
+        threading.Thread(target=_run, name="eeg-flight-dump", daemon=True).start()
+
+    def snapshot(self) -> dict:
+        """按时间顺序复制缓冲内容（numpy 数组），t 为相对当前时刻的秒数"""
+        with self.lock:
+            end = next(self._seq)
+            self.kind[end % self.capacity] = EVENT_EMPTY  # 序号 end 被本次快照占用
+            now = time.perf_counter()
+            # 整体转换为数组（C 层完成），再旋转为从最旧到最新
+            oldest = (end + 1) % self.capacity
+            events = {
+                "t": np.roll(np.array(self.t, dtype=np.float64), -oldest) - now,
+                "kind": np.roll(np.array(self.kind, dtype=np.uint8), -oldest),
+                "stream": np.roll(np.array(self.stream, dtype=np.uint8), -oldest),
+                "group": np.roll(np.array(self.group, dtype=np.uint16), -oldest),
+                "value": np.roll(np.array(self.value, dtype=np.float64), -oldest),
+                "aux": np.roll(np.array(self.aux, dtype=np.float64), -oldest),
+            }
+        valid = events["kind"] != EVENT_EMPTY
+        return {name: array[valid] for name, array in events.items()}
+
+    def dump(self, directory, reason: str = "manual", group: Optional[str] = None) -> Path:
+        """
+        把当前缓冲写入 directory/flight_<时间>_<原因>.npz，返回文件路径
+
+        缓冲包含全部设备组的事件（按 group 列区分）；group 为触发转储的设备组（记入 meta）。
+        """
+        events = self.snapshot()
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        created = datetime.now()
+        path = directory / f"flight_{created.strftime('%Y%m%d_%H%M%S_%f')}_{reason}.npz"
+        meta = {
+            "reason": reason,
+            "group": group,
+            "groups": {code: name for name, code in self.group_codes.items()},
+            "created": created.isoformat(),
+            "capacity": self.capacity,
+            "events": int(events["kind"].shape[0]),
+            "loss_packets": self.loss_packets,
+            "lag_seconds": self.lag_seconds,
+        }
+        np.savez_compressed(path, meta=np.array(json.dumps(meta)), **events)
+        with self.lock:
+            self.dumps.append(str(path))
+            del self.dumps[:-20]
+        return path
+
+    def get_status(self) -> dict:
+        with self.lock:
+            return {
+                "capacity": self.capacity,
+                "loss_packets": self.loss_packets,
+                "lag_seconds": self.lag_seconds,
+                "cooldown": self.cooldown,
+                "gc_hooked": self.gc_hooked,
+                "dump_dirs": {group: str(path) for group, path in self.dump_dirs.items()},
+                "recent_dumps": list(self.dumps),
+            }
+
+
+def load_dump(path) -> dict:
+    """读取转储文件：{"meta": {...}, "events": [{"t", "kind", "stream", "group", "value", "aux"}, ...]}"""
+    with np.load(path) as data:
+        meta = json.loads(str(data["meta"]))
+        group_names = meta.get("groups", {})
+        groups = data["group"] if "group" in data else np.zeros(len(data["kind"]), dtype=np.uint16)
+        events = [
+            {
+                "t": round(float(t), 6),
+                "kind": EVENT_NAMES.get(int(k), str(int(k))),
+                "stream": STREAM_NAMES.get(int(s), str(int(s))),
+                "group": group_names.get(str(int(g)), str(int(g))),
+                "value": float(v),
+                "aux": float(a),
+            }
+            for t, k, s, g, v, a in zip(data["t"], data["kind"], data["stream"], groups, data["value"], data["aux"])
+        ]
+    return {"meta": meta, "events": events}
+
+
+# 全局飞行记录器实例
+flight_recorder = FlightRecorder()
@@ -0,0 +1,275 @@
+"""
+EEG 会话目录后台增量索引
+
+替代启动时的全量文件系统同步：启动过程不再扫描数据目录，由后台线程把磁盘上
+新出现的会话目录补录到 eeg_session 表（例如从其它机器拷入、旧版本录制的会话）。
+
+    - 清单（manifest）：数据目录下的 .session_index/manifest.json，记录各容器目录（数据根目录、
+      用户目录）的 mtime、子目录与会话目录；容器 mtime 未变时不再列目录，
+      每轮扫描的开销与容器数量相关，而不是会话总数
+    - 入库：每轮一次查询取出已入库的 session_id，新会话批量插入
+    - 未完成的会话（正在录制，或刚出现且尚无 metadata.json，例如拷贝中）记入清单但不入库，
+      之后每轮单独检查；超过 PENDING_GRACE_SECONDS 仍无元数据的目录按旧版会话入库
+    - 周期扫描（interval_seconds），也可经 request_scan() / POST /api/eeg/sessions/index 按需触发
+
+本进程录制结束的会话仍由 _save_session_to_db 立即写入，索引器只负责“库外”出现的会话。
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from bci_flask_services.core.eeg import StrPath
+
+# 清单放在数据根目录的隐藏子目录中：写清单不改变根目录 mtime（遍历跳过隐藏目录）
+MANIFEST_DIRNAME = ".session_index"
+MANIFEST_FILENAME = "manifest.json"
+MANIFEST_VERSION = 1
+SESSION_DIR_PREFIX = "session_"
+# 单次批量插入的记录数
+INSERT_BATCH = 500
+# 没有 metadata.json 的会话目录在最近修改后多久仍视为未完成（秒）
+PENDING_GRACE_SECONDS = 120.0
+
+
+def _load_json(path: Path) -> Optional[dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class SessionIndexer:
+    """
+    会话目录增量索引器（后台线程）
+
+    清单结构:
+        {"version": 1,
+         "containers": {目录路径: {"mtime": ns, "subdirs": [...], "sessions": [...]}},
+         "pending": [未完成的会话目录路径, ...]}
+    """
+
+    def __init__(self, app, data_dir: Optional[StrPath], interval_seconds: float = 300.0,
+                 manifest_file: Optional[StrPath] = None):
+        self.app = app
+        self.data_dir = Path(data_dir) if data_dir else None
+        self.interval_seconds = float(interval_seconds)
+        if manifest_file is None and self.data_dir is not None:
+            manifest_file = self.data_dir / MANIFEST_DIRNAME / MANIFEST_FILENAME
+        self.manifest_file = Path(manifest_file) if manifest_file else None
+        self.session_manager = None
+        self.containers = {}
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.last_report = None
+        self.scans = 0
+        self.scanning = False
+
+    # ---------- 清单 ----------
+
+    def load_manifest(self):
+        data = _load_json(self.manifest_file) if self.manifest_file else None
+        if not data or data.get("version") != MANIFEST_VERSION:
+            self.containers, self.pending = {}, set()
+            return
+        self.containers = data.get("containers") or {}
+        self.pending = set(data.get("pending") or [])
+
+    def save_manifest(self):
+        if self.manifest_file is None:
+            return
+        data = {
+            "version": MANIFEST_VERSION,
+            "containers": self.containers,
+            "pending": sorted(self.pending),
+        }
+        self.manifest_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.manifest_file.with_name(self.manifest_file.name + f".{os.getpid()}.tmp")
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_file, self.manifest_file)
+
+    # ---------- 目录遍历 ----------
+
+    def _walk(self, directory: Path, containers: dict, found: list):
+        """遍历容器目录，结果写入 containers；mtime 未变时沿用清单中的子目录与会话列表"""
+        key = str(directory)
+        try:
+            mtime = directory.stat().st_mtime_ns
+        except OSError:
+            return
+        entry = self.containers.get(key)
+        if entry is None or entry.get("mtime") != mtime:
+            subdirs, sessions = [], []
+            try:
+                with os.scandir(directory) as it:
+                    for item in it:
+                        if not item.is_dir(follow_symlinks=False) or item.name.startswith("."):
+                            continue
+                        if item.name.startswith(SESSION_DIR_PREFIX):
+                            sessions.append(item.name)
+                        else:
+                            subdirs.append(item.name)
+            except OSError:
+                return
+            known = set(entry.get("sessions", [])) if entry else set()
+            # 新出现的会话目录（首次扫描时为全部）
+            found.extend(directory / name for name in sessions if name not in known)
+            entry = {"mtime": mtime, "subdirs": sorted(subdirs), "sessions": sorted(sessions)}
+        containers[key] = entry
+        for name in entry["subdirs"]:
+            self._walk(directory / name, containers, found)
+
+    def _active_session_ids(self) -> set:
+        if self.session_manager is None:
+            return set()
+        try:
+            status = self.session_manager.get_status() or {}
+        except Exception:
+            return set()
+        return {s["session_id"] for s in status.get("sessions", [])}
+
+    @staticmethod
+    def _recently_modified(session_dir: Path) -> bool:
+        try:
+            return time.time() - session_dir.stat().st_mtime < PENDING_GRACE_SECONDS
+        except OSError:
+            return False
+
+    def _user_account(self, session_dir: Path) -> Optional[str]:
+        """从目录路径推断用户（旧版元数据没有 user_account）"""
+        parent = session_dir.parent
+        return parent.name if parent != self.data_dir else None
+
+    # ---------- 扫描 ----------
+
+    def scan(self) -> dict:
+        """
+        执行一轮增量扫描（需在 app_context 内），返回
+        {"containers", "listed", "new_dirs", "inserted", "updated", "pending", "elapsed"}
+        """
+        from sqlalchemy import insert
+
+        from bci_flask_services.core.eeg_catalog import session_fields, upsert_session
+        from bci_flask_services.db import db
+        from bci_flask_services.models import EegSession
+
+        started = time.perf_counter()
+        report = {"containers": 0, "listed": 0, "new_dirs": 0, "inserted": 0, "updated": 0, "pending": 0}
+        if self.data_dir is None or not self.data_dir.exists():
+            report["elapsed"] = 0.0
+            return report
+
+        with self.lock:
+            # 遍历结果先放在新字典里，入库提交成功后才替换清单：入库失败时新目录下一轮仍会被发现
+            containers, found = {}, []
+            self._walk(self.data_dir, containers, found)
+            report["containers"] = len(containers)
+            report["listed"] = sum(1 for k, v in containers.items()
+                                   if self.containers.get(k, {}).get("mtime") != v["mtime"])
+            report["new_dirs"] = len(found)
+
+            candidates = [Path(p) for p in self.pending] + found
+            active = self._active_session_ids()
+            try:
+                existing = {row[0] for row in db.session.query(EegSession.session_id).all()}
+            except Exception:
+                db.session.rollback()
+                raise
+
+            rows, updates, pending = [], [], set()
+            for session_dir in candidates:
+                session_id = session_dir.name
+                if not session_dir.is_dir():
+                    continue
+                meta = _load_json(session_dir / "metadata.json")
+                if session_id in active or (meta is None and self._recently_modified(session_dir)):
+                    # 未完成（正在录制或元数据尚未写出）：之后每轮单独检查
+                    pending.add(str(session_dir))
+                    continue
+                meta = meta or {}
+                fields = session_fields(meta, session_dir, user_account=self._user_account(session_dir))
+                fields["session_id"] = session_id
+                if session_id in existing:
+                    if str(session_dir) in self.pending:
+                        updates.append(fields)
+                    continue
+                rows.append(fields)
+                existing.add(session_id)
+
+            try:
+                for start in range(0, len(rows), INSERT_BATCH):
+                    db.session.execute(insert(EegSession), rows[start:start + INSERT_BATCH])
+                for fields in updates:
+                    upsert_session(fields)
+                if rows or updates:
+                    db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+            changed = report["listed"] or set(containers) != set(self.containers) or pending != self.pending
+            self.containers = containers
+            if changed:
+                self.pending = pending
+                self.save_manifest()
+            report.update(inserted=len(rows), updated=len(updates), pending=len(pending))
+            report["elapsed"] = round(time.perf_counter() - started, 3)
+            self.last_report = dict(report, finished_at=time.time())
+            self.scans += 1
+        return report
+
+    # ---------- 后台线程 ----------
+
+    def start(self, session_manager=None) -> threading.Thread:
+        """
+        启动后台线程：立即扫描一轮，之后每隔 interval_seconds 或 request_scan() 时扫描
+
+        interval_seconds <= 0 时只在启动与按需触发时扫描。
+        """
+        self.session_manager = session_manager
+        if self.thread is not None:
+            return self.thread
+
+        def _loop():
+            self.load_manifest()
+            while True:
+                self.wakeup.clear()
+                self.scanning = True
+                try:
+                    with self.app.app_context():
+                        report = self.scan()
+                    if report["inserted"] or report["updated"]:
+                        print(f"📂 EEG 会话索引：新增 {report['inserted']} 个，更新 {report['updated']} 个"
+                              f"（{report['elapsed']}s）")
+                except Exception as e:
+                    print(f"⚠️  EEG 会话索引失败：{e}")
+                finally:
+                    self.scanning = False
+                self.wakeup.wait(self.interval_seconds if self.interval_seconds > 0 else None)
+
+        self.thread = threading.Thread(target=_loop, name="eeg-session-indexer", daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def request_scan(self):
+        """按需触发一轮扫描（不等待完成）"""
+        self.wakeup.set()
+
+    def get_status(self) -> dict:
+        return {
+            "data_dir": str(self.data_dir) if self.data_dir else None,
+            "running": self.thread is not None and self.thread.is_alive(),
+            "scanning": self.scanning,
+            "interval_seconds": self.interval_seconds,
+            "scans": self.scans,
+            "containers": len(self.containers),
+            "pending": len(self.pending),
+            "last_scan": self.last_report,
+        }
@@ -0,0 +1,399 @@
+"""
+EEG 会话后台维护模块
+
+- 重排布：录制时的 chunks=(32, 1000) + gzip 兼顾写入速度，旧会话改写为
+  更长时间跨度的块 + shuffle + 高压缩级别，体积更小、顺序扫描更快；
+  改写到临时文件，逐块校验 SHA-256 一致后原子替换
+- 保留策略：超过保留天数或超出总配额（从最旧开始）的会话移动到归档目录或删除，
+  并同步更新 eeg_session 记录与特征库
+- 补建索引：缺少概览金字塔或事件索引的旧会话在此补建（读取接口只读，不在请求路径上写文件）
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+import h5py
+
+from bci_flask_services import config
+from bci_flask_services.core.eeg import StrPath
+from bci_flask_services.core.eeg_reader import (
+    EEG_DATASET,
+    TRIGGER_DATASET,
+    build_missing_indexes,
+    missing_indexes,
+    session_file_cache,
+)
+
+# 归档排布版本（写入文件属性 layout_version，已改写的文件不再处理）
+ARCHIVE_LAYOUT_VERSION = 2
+# 归档排布：每块样本数与 gzip 级别
+ARCHIVE_CHUNK_SAMPLES = 10_000
+ARCHIVE_TRIGGER_CHUNK_SAMPLES = 100_000
+ARCHIVE_GZIP_LEVEL = 9
+# 改写/校验时每次读取的样本数
+RELAYOUT_BLOCK_SAMPLES = 100_000
+
+
+def _iter_blocks(dataset, block_samples: int = RELAYOUT_BLOCK_SAMPLES):
+    total = dataset.shape[-1]
+    for start in range(0, total, block_samples):
+        end = min(total, start + block_samples)
+        yield start, end, (dataset[:, start:end] if dataset.ndim == 2 else dataset[start:end])
+
+
+def dataset_digest(dataset, block_samples: int = RELAYOUT_BLOCK_SAMPLES) -> str:
+    """按块计算数据集内容的 SHA-256（与存储排布、压缩方式无关）"""
+    digest = hashlib.sha256()
+    for _, _, block in _iter_blocks(dataset, block_samples):
+        digest.update(block.tobytes())
+    return digest.hexdigest()
+
+
+def relayout_file(path: StrPath, chunk_samples: int = ARCHIVE_CHUNK_SAMPLES,
+                  gzip_level: int = ARCHIVE_GZIP_LEVEL) -> Optional[dict]:
+    """
+    把一个会话 HDF5 文件改写为归档排布
+
+    eeg_data / trigger_data 按新块形状与压缩参数重写，其它对象（概览金字塔、
+    事件索引）原样复制。已是归档排布的文件返回 None。
+    改写期间读取请求照常进行；替换时持有文件缓存锁并关闭缓存句柄，
+    源文件在改写期间被修改（例如补建索引）时放弃本次改写。
+    返回 {"path", "bytes_before", "bytes_after", "digests"}。
+    """
+    path = Path(path)
+    # 临时文件名唯一：后台维护线程与命令行同时运行时互不覆盖
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{uuid.uuid4().hex[:12]}.relayout.tmp")
+    source_stat = path.stat()
+    bytes_before = source_stat.st_size
+
+    digests = {}
+    try:
+        with h5py.File(path, "r") as src:
+            if int(src.attrs.get("layout_version", 1)) >= ARCHIVE_LAYOUT_VERSION:
+                return None
+
+            with h5py.File(tmp_path, "w") as dst:
+                for key, value in src.attrs.items():
+                    dst.attrs[key] = value
+                for name, item in src.items():
+                    if name not in (EEG_DATASET, TRIGGER_DATASET) or not isinstance(item, h5py.Dataset):
+                        src.copy(item, dst, name=name)
+                        continue
+
+                    if item.ndim == 2:
+                        chunks = (item.shape[0], max(1, min(chunk_samples, item.shape[1])))
+                    else:
+                        chunks = (max(1, min(ARCHIVE_TRIGGER_CHUNK_SAMPLES, item.shape[0])),)
+                    out = dst.create_dataset(
+                        name,
+                        shape=item.shape,
+                        maxshape=item.maxshape,
+                        dtype=item.dtype,
+                        chunks=chunks,
+                        compression="gzip",
+                        compression_opts=gzip_level,
+                        shuffle=True,
+                    )
+                    for key, value in item.attrs.items():
+                        out.attrs[key] = value
+
+                    digest = hashlib.sha256()
+                    for start, end, block in _iter_blocks(item):
+                        digest.update(block.tobytes())
+                        if item.ndim == 2:
+                            out[:, start:end] = block
+                        else:
+                            out[start:end] = block
+                    digests[name] = digest.hexdigest()
+                dst.attrs["layout_version"] = ARCHIVE_LAYOUT_VERSION
+
+        # 从磁盘重新读取校验，确认写出的内容与原文件逐字节一致
+        with h5py.File(tmp_path, "r") as check:
+            for name, expected in digests.items():
+                if dataset_digest(check[name]) != expected:
+                    raise IOError(f"checksum mismatch after relayout: {path.name}/{name}")
+
+        # 替换期间不允许本进程打开该文件（Windows 上替换已打开的文件会失败）
+        with session_file_cache.lock:
+            current = path.stat()
+            if (current.st_mtime_ns, current.st_size) != (source_stat.st_mtime_ns, source_stat.st_size):
+                with session_file_cache.open(path) as h5:
+                    if int(h5.attrs.get("layout_version", 1)) >= ARCHIVE_LAYOUT_VERSION:
+                        return None  # 另一个维护进程已完成改写
+                raise IOError(f"file changed during relayout: {path.name}")
+            session_file_cache.invalidate(path)
+            os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+    return {
+        "path": str(path),
+        "bytes_before": bytes_before,
+        "bytes_after": path.stat().st_size,
+        "digests": digests,
+    }
+
+
+# ============================================
+# 保留策略
+# ============================================
+
+def session_start_time(session: dict) -> Optional[datetime]:
+    """会话开始时间：优先记录中的 start_time，其次 metadata.json，最后解析目录名"""
+    value = session.get("start_time")
+    if isinstance(value, datetime):
+        return value
+    if value:
+        try:
+            return datetime.fromisoformat(str(value))
+        except ValueError:
+            pass
+
+    session_dir = Path(session.get("session_dir") or "")
+    meta_file = session_dir / "metadata.json"
+    if meta_file.exists():
+        try:
+            with open(meta_file, "r", encoding="utf-8") as f:
+                return datetime.fromisoformat((json.load(f) or {})["start_time"])
+        except Exception:
+            pass
+    try:
+        return datetime.strptime(session_dir.name, "session_%Y%m%d_%H%M%S")
+    except ValueError:
+        return None
+
+
+def _dir_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+def _is_archived(session: dict, archive_dir: Optional[StrPath]) -> bool:
+    """会话目录是否已在归档目录下"""
+    if not archive_dir or not session.get("session_dir"):
+        return False
+    return Path(session["session_dir"]).resolve().is_relative_to(Path(archive_dir).resolve())
+
+
+def plan_retention(sessions: list, now: Optional[datetime] = None, max_age_days: float = 0,
+                   quota_bytes: int = 0, archive_dir: Optional[StrPath] = None) -> list:
+    """
+    计算保留策略需要处理的会话（不做任何修改）
+
+    先按年龄淘汰，剩余总量仍超出配额时再从最旧的会话开始淘汰。
+    已移入 archive_dir 的会话不再参与淘汰，也不计入配额。
+    返回 [(session, reason), ...]，reason 为 "age" 或 "quota"。
+    """
+    now = now or datetime.now()
+    dated = []
+    for s in sessions:
+        if _is_archived(s, archive_dir):
+            continue
+        started = session_start_time(s)
+        if started is not None and s.get("session_dir") and Path(s["session_dir"]).exists():
+            dated.append((started, s))
+    dated.sort(key=lambda item: item[0])
+
+    selected = []
+    kept = []
+    for started, s in dated:
+        if max_age_days and now - started > timedelta(days=max_age_days):
+            selected.append((s, "age"))
+        else:
+            kept.append(s)
+
+    if quota_bytes:
+        sizes = [_dir_size(Path(s["session_dir"])) for s in kept]
+        total = sum(sizes)
+        for s, size in zip(kept, sizes):
+            if total <= quota_bytes:
+                break
+            selected.append((s, "quota"))
+            total -= size
+    return selected
+
+
+def _move_session(session: dict, archive_dir: Path) -> dict:
+    """移动会话目录到归档目录（保留 user_account 层级），返回更新后的路径"""
+    src = Path(session["session_dir"])
+    dest_parent = archive_dir / session["user_account"] if session.get("user_account") else archive_dir
+    dest_parent.mkdir(parents=True, exist_ok=True)
+    dest = dest_parent / src.name
+
+    for kind in ("eeg_file", "trigger_file"):
+        if session.get(kind):
+            session_file_cache.invalidate(session[kind])
+    shutil.move(str(src), str(dest))
+
+    def _rebase(path):
+        return str(dest / Path(path).relative_to(src)) if path else None
+
+    return {
+        "session_dir": str(dest),
+        "eeg_file": _rebase(session.get("eeg_file")),
+        "trigger_file": _rebase(session.get("trigger_file")),
+    }
+
+
+def _delete_session(session: dict):
+    for kind in ("eeg_file", "trigger_file"):
+        if session.get(kind):
+            session_file_cache.invalidate(session[kind])
+    shutil.rmtree(session["session_dir"], ignore_errors=True)
+    try:
+        from bci_flask_services.core.eeg_features import remove_session_features
+        remove_session_features(session["session_id"], session.get("user_account"))
+    except Exception:
+        pass
+
+
+def _update_db(session_id: str, moved: Optional[dict]):
+    """同步 eeg_session 记录：移动则更新路径，删除则删除记录（需在 app_context 内）"""
+    from bci_flask_services.models import EegSession, db
+
+    record = EegSession.query.filter_by(session_id=session_id).first()
+    if record is None:
+        return
+    if moved is None:
+        db.session.delete(record)
+    else:
+        record.session_dir = moved["session_dir"]
+        record.eeg_file = moved["eeg_file"]
+        record.trigger_file = moved["trigger_file"]
+    db.session.commit()
+
+
+def run_maintenance(sessions: list, relayout_after_days: float = 0, max_age_days: float = 0,
+                    quota_bytes: int = 0, archive_dir: Optional[StrPath] = None,
+                    exclude=(), update_db: bool = False, dry_run: bool = False,
+                    now: Optional[datetime] = None, build_indexes: bool = True) -> dict:
+    """
+    执行一轮维护
+
+    参数:
+        sessions: discover_sessions_from_* 返回的会话列表
+        relayout_after_days: 早于该天数的会话改写为归档排布（0 表示不改写）
+        max_age_days / quota_bytes: 保留策略（0 表示不限制）
+        archive_dir: 淘汰会话移动到的目录；为空时直接删除
+        exclude: 不处理的 session_id（例如正在录制的会话）
+        update_db: 是否同步 eeg_session 记录（需在 app_context 内）
+        build_indexes: 是否为保留的会话补建缺失的索引
+    返回:
+        {"relayout": [...], "retention": [...], "indexes": [...], "errors": [...]}
+    """
+    now = now or datetime.now()
+    exclude = set(exclude)
+    sessions = [s for s in sessions if s.get("session_id") not in exclude]
+    report = {"relayout": [], "retention": [], "indexes": [], "errors": []}
+
+    retired = plan_retention(sessions, now=now, max_age_days=max_age_days, quota_bytes=quota_bytes,
+                             archive_dir=archive_dir)
+    for session, reason in retired:
+        entry = {"session_id": session["session_id"], "reason": reason,
+                 "action": "move" if archive_dir else "delete"}
+        if not dry_run:
+            try:
+                moved = _move_session(session, Path(archive_dir)) if archive_dir else None
+                if moved is None:
+                    _delete_session(session)
+                else:
+                    entry["session_dir"] = moved["session_dir"]
+                if update_db:
+                    _update_db(session["session_id"], moved)
+            except Exception as e:
+                report["errors"].append({"session_id": session["session_id"], "error": str(e)})
+                continue
+        report["retention"].append(entry)
+
+    retired_ids = {s["session_id"] for s, _ in retired}
+    if build_indexes:
+        for session in sessions:
+            if session["session_id"] in retired_ids:
+                continue
+            try:
+                if dry_run:
+                    built = missing_indexes(session.get("eeg_file"), session.get("trigger_file"))
+                else:
+                    built = build_missing_indexes(session.get("eeg_file"), session.get("trigger_file"))
+            except Exception as e:
+                report["errors"].append({"session_id": session["session_id"], "error": str(e)})
+                continue
+            if built:
+                report["indexes"].append({"session_id": session["session_id"], "built": built})
+
+    if relayout_after_days:
+        cutoff = now - timedelta(days=relayout_after_days)
+        for session in sessions:
+            if session["session_id"] in retired_ids:
+                continue
+            started = session_start_time(session)
+            if started is None or started > cutoff:
+                continue
+            for kind in ("eeg_file", "trigger_file"):
+                path = session.get(kind)
+                if not path or not Path(path).exists():
+                    continue
+                if dry_run:
+                    report["relayout"].append({"session_id": session["session_id"], "path": path})
+                    continue
+                try:
+                    result = relayout_file(path)
+                except Exception as e:
+                    report["errors"].append({"session_id": session["session_id"], "error": str(e)})
+                    continue
+                if result is not None:
+                    result["session_id"] = session["session_id"]
+                    report["relayout"].append(result)
+    return report
+
+
+def run_configured_maintenance(exclude=(), dry_run: bool = False) -> dict:
+    """按 config 中的参数从数据库发现会话并执行一轮维护（需在 app_context 内）"""
+    from bci_flask_services.core.eeg_batch import discover_sessions_from_db
+
+    quota_gb = float(getattr(config, "EEG_RETENTION_QUOTA_GB", 0) or 0)
+    return run_maintenance(
+        discover_sessions_from_db(),
+        relayout_after_days=float(getattr(config, "EEG_RELAYOUT_AFTER_DAYS", 0) or 0),
+        max_age_days=float(getattr(config, "EEG_RETENTION_DAYS", 0) or 0),
+        quota_bytes=int(quota_gb * 1024 ** 3),
+        archive_dir=getattr(config, "EEG_ARCHIVE_DIR", None) or None,
+        exclude=exclude,
+        update_db=True,
+        dry_run=dry_run,
+    )
+
+
+def start_maintenance_thread(app, session_manager=None, interval_hours: float = 24.0) -> threading.Thread:
+    """
+    启动后台维护线程：每隔 interval_hours 执行一轮（首次在启动一个周期后）
+
+    正在录制的会话（所有设备组）通过 session_manager.get_status() 排除。
+    """
+    def _loop():
+        while True:
+            time.sleep(interval_hours * 3600)
+            exclude = set()
+            if session_manager is not None:
+                status = session_manager.get_status()
+                exclude.update(s["session_id"] for s in status.get("sessions", []))
+            try:
+                with app.app_context():
+                    report = run_configured_maintenance(exclude=exclude)
+                print(f"🧹 EEG 维护完成：改写 {len(report['relayout'])} 个文件，"
+                      f"淘汰 {len(report['retention'])} 个会话，补建索引 {len(report['indexes'])} 个会话，"
+                      f"失败 {len(report['errors'])} 项")
+            except Exception as e:
+                print(f"⚠️  EEG 维护失败：{e}")
+
+    thread = threading.Thread(target=_loop, daemon=True)
+    thread.start()
+    return thread
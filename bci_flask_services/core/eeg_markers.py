@@ -0,0 +1,268 @@
+"""
+EEG 软件标记的 WebSocket 入口
+
+范式程序/前端保持一条长连接发送标记，省去每次 HTTP 请求的建连与解析开销。
+仅用标准库实现 RFC 6455 的必要部分（握手、掩码文本帧、ping/close），不引入新依赖。
+
+    ws://<host>:<EEG_MARKER_WS_PORT>/
+    发送: {"value": 1201, "label": "video_start", "duration": 0, "id": 7, "session_id": 可选}
+    回复: {"code": 1, "data": {"session_id": ..., "sample": ..., "id": 7, ...}}
+          {"code": 0, "msg": "Not recording", "id": 7}
+
+打点与 POST /api/eeg/markers 相同，均调用 SessionManager.add_marker（以收到消息的时刻为准）。
+"""
+
+import base64
+import hashlib
+import json
+import os
+import socket
+import struct
+import threading
+import time
+from typing import Optional
+
+from bci_flask_services.core.eeg import TRIGGER_MAX_VALUE
+
+_WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+_OP_TEXT = 0x1
+_OP_CLOSE = 0x8
+_OP_PING = 0x9
+_OP_PONG = 0xA
+_MAX_MESSAGE = 64 * 1024
+
+
+def parse_marker(payload: dict) -> tuple:
+    """校验标记参数，返回 (value, label, duration)；非法时抛出 ValueError"""
+    if not isinstance(payload, dict):
+        raise ValueError("marker must be a JSON object")
+    try:
+        value = int(payload.get("value"))
+        duration = int(payload.get("duration") or 0)
+    except (TypeError, ValueError):
+        raise ValueError("value/duration must be integers")
+    # 0–255 为硬件触发值，负值保留给伪迹段
+    if not TRIGGER_MAX_VALUE < value < 2 ** 31:
+        raise ValueError(f"value must be an int32 above the hardware trigger range (> {TRIGGER_MAX_VALUE})")
+    if duration < 0:
+        raise ValueError("duration must be >= 0 samples")
+    label = str(payload.get("label") or "")
+    if len(label.encode("utf-8")) > 64:
+        raise ValueError("label longer than 64 bytes")
+    return value, label, duration
+
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    chunks = []
+    while n:
+        chunk = sock.recv(n)
+        if not chunk:
+            raise ConnectionError("connection closed")
+        chunks.append(chunk)
+        n -= len(chunk)
+    return b"".join(chunks)
+
+
+def _read_frame(sock: socket.socket) -> tuple:
+    """读取一个帧，返回 (opcode, payload)；不支持分片消息"""
+    b0, b1 = _recv_exact(sock, 2)
+    opcode = b0 & 0x0F
+    masked = b1 & 0x80
+    length = b1 & 0x7F
+    if length == 126:
+        length = struct.unpack(">H", _recv_exact(sock, 2))[0]
+    elif length == 127:
+        length = struct.unpack(">Q", _recv_exact(sock, 8))[0]
+    if length > _MAX_MESSAGE:
+        raise ValueError("message too large")
+    mask = _recv_exact(sock, 4) if masked else None
+    payload = _recv_exact(sock, length)
+    if mask:
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    return opcode, payload
+
+
+def _encode_frame(opcode: int, payload: bytes, mask: bool = False) -> bytes:
+    header = bytearray([0x80 | opcode])
+    mask_bit = 0x80 if mask else 0
+    n = len(payload)
+    if n < 126:
+        header.append(mask_bit | n)
+    elif n < 65536:
+        header.append(mask_bit | 126)
+        header += struct.pack(">H", n)
+    else:
+        header.append(mask_bit | 127)
+        header += struct.pack(">Q", n)
+    if mask:
+        key = os.urandom(4)
+        payload = bytes(b ^ key[i % 4] for i, b in enumerate(payload))
+        header += key
+    return bytes(header) + payload
+
+
+def _accept_key(key: str) -> str:
+    return base64.b64encode(hashlib.sha1((key + _WS_GUID).encode("ascii")).digest()).decode("ascii")
+
+
+class MarkerWebSocketServer:
+    """标记 WebSocket 服务（每个连接一个线程）"""
+
+    def __init__(self, session_manager, host: str = "0.0.0.0", port: int = 8089):
+        self.session_manager = session_manager
+        self.host = host
+        self.port = port
+        self.server_socket = None
+        self.running = False
+        self.thread = None
+        self.connections = 0
+
+    def start(self):
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server_socket.bind((self.host, self.port))
+        self.server_socket.listen(8)
+        self.server_socket.settimeout(1.0)
+        self.running = True
+        self.thread = threading.Thread(target=self._accept_loop, name="eeg-marker-ws", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        if self.server_socket:
+            try:
+                self.server_socket.close()
+            except OSError:
+                pass
+
+    def _accept_loop(self):
+        while self.running:
+            try:
+                sock, _ = self.server_socket.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            threading.Thread(target=self._serve, args=(sock,), daemon=True).start()
+
+    def _handshake(self, sock: socket.socket) -> bool:
+        request = b""
+        while b"\r\n\r\n" not in request:
+            chunk = sock.recv(4096)
+            if not chunk or len(request) > 16384:
+                return False
+            request += chunk
+        headers = {}
+        for line in request.split(b"\r\n")[1:]:
+            if b":" in line:
+                name, value = line.split(b":", 1)
+                headers[name.strip().lower().decode("latin-1")] = value.strip().decode("latin-1")
+        key = headers.get("sec-websocket-key")
+        if not key or "websocket" not in headers.get("upgrade", "").lower():
+            sock.sendall(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n")
+            return False
+        sock.sendall(
+            b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+            b"Sec-WebSocket-Accept: " + _accept_key(key).encode("ascii") + b"\r\n\r\n"
+        )
+        return True
+
+    def _handle_message(self, text: str) -> dict:
+        at = time.perf_counter()
+        marker_id = None
+        session_id = None
+        try:
+            payload = json.loads(text)
+            marker_id = payload.get("id") if isinstance(payload, dict) else None
+            value, label, duration = parse_marker(payload)
+            session_id = payload.get("session_id")
+        except ValueError as e:
+            return {"code": 0, "msg": str(e), "id": marker_id}
+        try:
+            success, result = self.session_manager.add_marker(
+                value, label=label, duration=duration, at=at, session_id=session_id
+            )
+        except RuntimeError as e:
+            return {"code": 0, "msg": str(e), "id": marker_id}
+        if not success:
+            return {"code": 0, "msg": result, "id": marker_id}
+        return {"code": 1, "data": dict(result, id=marker_id)}
+
+    def _serve(self, sock: socket.socket):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.connections += 1
+        try:
+            if not self._handshake(sock):
+                return
+            while self.running:
+                opcode, payload = _read_frame(sock)
+                if opcode == _OP_TEXT:
+                    reply = self._handle_message(payload.decode("utf-8", errors="replace"))
+                    sock.sendall(_encode_frame(_OP_TEXT, json.dumps(reply, ensure_ascii=False).encode("utf-8")))
+                elif opcode == _OP_PING:
+                    sock.sendall(_encode_frame(_OP_PONG, payload))
+                elif opcode == _OP_CLOSE:
+                    sock.sendall(_encode_frame(_OP_CLOSE, b""))
+                    return
+        except (OSError, ConnectionError, ValueError):
+            pass
+        finally:
+            self.connections -= 1
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+
+class MarkerWebSocketClient:
+    """
+    最小的 WebSocket 标记客户端（供 Python 范式程序使用）
+
+    用法:
+        with MarkerWebSocketClient("192.168.1.101", 8089) as client:
+            reply = client.send_marker(1201, "video_start")
+    """
+
+    def __init__(self, host: str, port: int = 8089, timeout: Optional[float] = 5.0):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        key = base64.b64encode(os.urandom(16)).decode("ascii")
+        self.sock.sendall(
+            f"GET / HTTP/1.1\r\nHost: {host}:{port}\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+            f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n".encode("ascii")
+        )
+        response = b""
+        while b"\r\n\r\n" not in response:
+            chunk = self.sock.recv(4096)
+            if not chunk:
+                raise ConnectionError("handshake failed")
+            response += chunk
+        if b" 101 " not in response.split(b"\r\n", 1)[0] or _accept_key(key).encode("ascii") not in response:
+            raise ConnectionError("handshake rejected")
+        self._next_id = 0
+
+    def send_marker(self, value: int, label: str = "", duration: int = 0, session_id: Optional[str] = None) -> dict:
+        self._next_id += 1
+        message = {"value": value, "label": label, "duration": duration, "id": self._next_id}
+        if session_id:
+            message["session_id"] = session_id
+        message = json.dumps(message)
+        self.sock.sendall(_encode_frame(_OP_TEXT, message.encode("utf-8"), mask=True))
+        while True:
+            opcode, payload = _read_frame(self.sock)
+            if opcode == _OP_TEXT:
+                return json.loads(payload.decode("utf-8"))
+
+    def close(self):
+        try:
+            self.sock.sendall(_encode_frame(_OP_CLOSE, b"", mask=True))
+        except OSError:
+            pass
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
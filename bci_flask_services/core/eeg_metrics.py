@@ -0,0 +1,193 @@
+"""
+EEG 采集管线指标
+
+轻量的计数器 / 仪表 / 直方图实现（不依赖 prometheus_client），
+以 Prometheus 文本格式（0.0.4）导出，供 /api/eeg/metrics 抓取。
+
+覆盖采集管线的每一级，录制质量下降时可以定位是哪一级跟不上
+（按设备组 group 与数据流 stream 分别统计，多个实验台互不干扰）：
+    解析（帧速率、包间隔抖动）-> 缓冲队列（深度、高水位、满队列丢块）
+    -> HDF5 写入（写入/flush 耗时）-> 写入滞后
+"""
+
+import bisect
+import threading
+import time
+from typing import Optional
+
+# 延迟类直方图的桶上限（秒）
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+# 包间隔直方图的桶上限（秒），1000 Hz 时正常间隔为 1 ms
+INTERARRIVAL_BUCKETS = (0.0001, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(n, "")) for n in self.label_names)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}")
+        return lines
+
+    def reset(self, **labels):
+        """清空取值；给定标签时只清除这些标签匹配的序列"""
+        with self.lock:
+            if not labels:
+                self.values.clear()
+                return
+            match = {self.label_names.index(n): str(v) for n, v in labels.items()}
+            for key in [k for k in self.values if all(k[i] == v for i, v in match.items())]:
+                del self.values[key]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+    def set_max(self, value: float, **labels):
+        """只在新值更大时更新（高水位）"""
+        key = self._key(labels)
+        with self.lock:
+            if value > self.values.get(key, float("-inf")):
+                self.values[key] = value
+
+    def get(self, **labels) -> Optional[float]:
+        with self.lock:
+            return self.values.get(self._key(labels))
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                # 每桶非累计计数 + 溢出桶，渲染时再累加
+                entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            for key, (counts, total, n) in sorted(self.values.items()):
+                cumulative = 0
+                for bound, c in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += c
+                    le = 'le="' + _format_value(bound) + '"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {n}")
+        return lines
+
+
+class RateMeter:
+    """按固定时间窗估算事件速率（每个事件 O(1)，只在窗口结束时写入仪表）"""
+
+    def __init__(self, gauge: Gauge, window: float = 1.0, **labels):
+        self.gauge = gauge
+        self.window = window
+        self.labels = labels
+        self.count = 0
+        self.window_start = time.perf_counter()
+
+    def tick(self, n: int = 1):
+        self.count += n
+        now = time.perf_counter()
+        elapsed = now - self.window_start
+        if elapsed >= self.window:
+            self.gauge.set(round(self.count / elapsed, 2), **self.labels)
+            self.count = 0
+            self.window_start = now
+
+
+class PipelineMetrics:
+    """采集管线的全部指标（全局单例 pipeline_metrics）"""
+
+    def __init__(self):
+        self.frames_parsed = Counter(
+            "eeg_frames_parsed_total", "Frames decoded by the parser.", ("group", "stream"))
+        self.parse_rate = Gauge(
+            "eeg_parse_rate_hz", "Frames decoded per second over the last second.", ("group", "stream"))
+        self.packets_dropped = Counter(
+            "eeg_packets_dropped_total", "Packets missing according to the packet index.", ("group", "stream"))
+        self.samples_padded = Counter(
+            "eeg_samples_padded_total", "Samples synthesized to fill packet loss.", ("group", "stream"))
+        self.interarrival = Histogram(
+            "eeg_packet_interarrival_seconds", "Time between consecutive frames (jitter).",
+            ("group", "stream"), buckets=INTERARRIVAL_BUCKETS)
+        self.queue_depth = Gauge(
+            "eeg_queue_depth", "Chunks waiting in StreamBuffer.data_queue.", ("group", "stream"))
+        self.queue_high_water = Gauge(
+            "eeg_queue_depth_high_water", "Highest data_queue depth since the session started.", ("group", "stream"))
+        self.chunks_discarded = Counter(
+            "eeg_chunks_discarded_total", "Chunks discarded because data_queue was full.", ("group", "stream"))
+        self.write_seconds = Histogram(
+            "eeg_hdf5_write_seconds", "HDF5 dataset resize+write time per chunk.", ("group", "stream"))
+        self.flush_seconds = Histogram(
+            "eeg_hdf5_flush_seconds", "HDF5 flush time per chunk.", ("group", "stream"))
+        self.writer_lag = Gauge(
+            "eeg_writer_lag_seconds", "Time from chunk enqueue to chunk written to disk.", ("group", "stream"))
+        self.recording = Gauge("eeg_recording", "Number of sessions currently recording.")
+
+    def all(self) -> list:
+        return [v for v in vars(self).values() if isinstance(v, _Metric)]
+
+    def reset_session(self, group: str):
+        """设备组开始新会话时重置该组按会话统计的高水位（不影响其它设备组）"""
+        self.queue_high_water.reset(group=group)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.all():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# 全局指标实例
+pipeline_metrics = PipelineMetrics()
@@ -0,0 +1,381 @@
+"""
+EEG 实时在线分析模块
+在采集线程的样本路径上运行的轻量级分析组件
+
+设计约束：
+- 内存固定，与会话长度无关
+- 每个样本/数据块的开销为常数，不阻塞采集线程
+"""
+
+import threading
+from collections import deque
+from typing import Optional
+
+import numpy as np
+
+
+class OnlineERPAverager:
+    """
+    在线事件相关电位（ERP）平均器
+
+    - EEG 样本写入环形缓冲（channels × ring_len）
+    - Trigger 出现非零跳变时，以 trigger 样本计数作为起点登记待处理 epoch
+    - EEG 样本计数越过 起点 + window 后，从环形缓冲取出刺激后窗口，
+      就地更新该触发码的均值与方差（Welford）
+
+    EEG 与 Trigger 两路按各自的样本计数对齐（与会话文件中的下标一致），
+    因此只应在录制期间、与缓冲写入同步调用 push_*。
+    内存占用固定为 触发码数 × channels × window（触发值为 1 字节，最多 255 个码）。
+    scale 为输入单位到 µV 的换算系数（原始计数存储模式下只在取结果时换算）。
+    """
+
+    def __init__(self, num_channels: int, window: int, max_pending: int = 256, scale: float = 1.0):
+        self.num_channels = num_channels
+        self.window = int(window)
+        self.scale = float(scale)
+        # 环形缓冲需覆盖一个完整窗口并留出两路到达时间差的余量
+        self.ring_len = self.window * 4
+        self.max_pending = max_pending
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self, num_channels: Optional[int] = None):
+        """清空累积结果；num_channels 用于切换到通道数不同的新会话"""
+        with self.lock:
+            if num_channels is not None:
+                self.num_channels = num_channels
+            self.ring = np.zeros((self.num_channels, self.ring_len), dtype=np.float32)
+            self.eeg_count = 0
+            self.trigger_count = 0
+            self.last_trigger = 0
+            self.pending = deque(maxlen=self.max_pending)
+            self.counts = {}
+            self.means = {}
+            self.m2s = {}
+            self.missed = 0
+
+    def push_eeg(self, sample: np.ndarray):
+        """写入一个 EEG 样本 (channels,)"""
+        with self.lock:
+            self.ring[:, self.eeg_count % self.ring_len] = sample
+            self.eeg_count += 1
+            while self.pending and self.eeg_count >= self.pending[0][0] + self.window:
+                onset, code = self.pending.popleft()
+                self._accumulate(onset, code)
+
+    def push_trigger(self, value: int):
+        """写入一个 Trigger 样本；非零跳变视为一次刺激起点"""
+        with self.lock:
+            value = int(value)
+            if value != 0 and value != self.last_trigger:
+                if len(self.pending) == self.pending.maxlen:
+                    self.missed += 1
+                self.pending.append((self.trigger_count, value))
+            self.last_trigger = value
+            self.trigger_count += 1
+
+    def _accumulate(self, onset: int, code: int):
+        if onset < self.eeg_count - self.ring_len:
+            # 窗口已被环形缓冲覆盖（两路偏差过大）
+            self.missed += 1
+            return
+        idx = np.arange(onset, onset + self.window) % self.ring_len
+        epoch = self.ring[:, idx].astype(np.float64)
+
+        if code not in self.counts:
+            self.counts[code] = 0
+            self.means[code] = np.zeros((self.num_channels, self.window), dtype=np.float64)
+            self.m2s[code] = np.zeros((self.num_channels, self.window), dtype=np.float64)
+        self.counts[code] += 1
+        mean = self.means[code]
+        delta = epoch - mean
+        mean += delta / self.counts[code]
+        self.m2s[code] += delta * (epoch - mean)
+
+    def get_codes(self) -> dict:
+        """各触发码已累积的 epoch 数"""
+        with self.lock:
+            return dict(self.counts)
+
+    def get_average(self, code: int):
+        """返回 (n, mean, std)，均为副本；尚无该触发码时返回 None"""
+        with self.lock:
+            n = self.counts.get(code)
+            if not n:
+                return None
+            mean = self.means[code] * self.scale
+            std = np.sqrt(self.m2s[code] / n) * self.scale if n > 1 else np.zeros_like(mean)
+            return n, mean, std
+
+
+class SignalQualityMonitor:
+    """
+    逐通道实时信号质量监测
+
+    每收到一个数据块（写入线程中，默认 1000 样本）做一次向量化计算，
+    指标以指数滑动平均平滑，内存与单块 CPU 开销固定：
+        - rms：滑动方差开方（µV）
+        - line_ratio：工频（及 2 次谐波）±1 Hz 功率占 1–100 Hz 总功率的比例
+        - flat：块内峰峰值低于阈值（电极脱落/短路）
+        - clip_ratio：接近满量程的样本比例（饱和）
+        - padded_rate：丢包补偿样本占比（来自 PacketLossTracker 的补偿计数）
+
+    status 为每通道 0=正常、1=警告、2=差，便于前端直接着色。
+    """
+
+    # 判定阈值
+    RMS_HIGH_UV = 100.0
+    RMS_WARN_UV = 50.0
+    FLAT_PTP_UV = 0.5
+    LINE_RATIO_BAD = 0.5
+    LINE_RATIO_WARN = 0.2
+
+    def __init__(self, num_channels: int, sample_rate: int, saturation_uv: float,
+                 line_freq: float = 50.0, alpha: float = 0.3):
+        self.sample_rate = int(sample_rate)
+        self.saturation_uv = float(saturation_uv)
+        self.line_freq = float(line_freq)
+        self.alpha = float(alpha)
+        self.lock = threading.Lock()
+        self.reset(num_channels)
+
+    def reset(self, num_channels: Optional[int] = None, labels=None):
+        with self.lock:
+            if num_channels is not None:
+                self.num_channels = num_channels
+            self.labels = list(labels) if labels is not None else None
+            self.var = None
+            self.line_ratio = None
+            self.clip_ratio = None
+            self.flat = np.zeros(self.num_channels, dtype=bool)
+            self.padded_rate = 0.0
+            self.chunks = 0
+            self._masks = {}
+
+    def _band_masks(self, n: int):
+        """按块长缓存频段掩码（块长固定时只计算一次）"""
+        if n not in self._masks:
+            freqs = np.fft.rfftfreq(n, d=1.0 / self.sample_rate)
+            total = (freqs >= 1.0) & (freqs <= 100.0)
+            line = np.zeros_like(total)
+            for harmonic in (1, 2):
+                line |= np.abs(freqs - self.line_freq * harmonic) <= 1.0
+            self._masks[n] = (total, line & total)
+        return self._masks[n]
+
+    def update(self, chunk: np.ndarray, padded_samples: int = 0):
+        """输入一个 (channels, n) 的 µV 数据块与该块内的补偿样本数"""
+        n = chunk.shape[1]
+        if n < 2:
+            return
+        x = chunk.astype(np.float64)
+        x -= x.mean(axis=1, keepdims=True)
+        var = (x * x).mean(axis=1)
+
+        total_mask, line_mask = self._band_masks(n)
+        power = np.abs(np.fft.rfft(x, axis=1)) ** 2
+        total_power = power[:, total_mask].sum(axis=1)
+        line_power = power[:, line_mask].sum(axis=1)
+        line_ratio = np.divide(line_power, total_power, out=np.zeros_like(line_power), where=total_power > 0)
+
+        ptp = chunk.max(axis=1) - chunk.min(axis=1)
+        clip_ratio = (np.abs(chunk) >= self.saturation_uv).mean(axis=1)
+        padded_rate = min(1.0, padded_samples / n)
+
+        a = self.alpha
+        with self.lock:
+            if self.var is None or self.var.shape[0] != var.shape[0]:
+                self.var, self.line_ratio, self.clip_ratio = var, line_ratio, clip_ratio
+                self.padded_rate = padded_rate
+            else:
+                self.var = (1 - a) * self.var + a * var
+                self.line_ratio = (1 - a) * self.line_ratio + a * line_ratio
+                self.clip_ratio = (1 - a) * self.clip_ratio + a * clip_ratio
+                self.padded_rate = (1 - a) * self.padded_rate + a * padded_rate
+            self.flat = ptp < self.FLAT_PTP_UV
+            self.chunks += 1
+
+    def get_quality(self) -> Optional[dict]:
+        """紧凑的质量向量（尚无数据时返回 None）"""
+        with self.lock:
+            if self.var is None:
+                return None
+            rms = np.sqrt(self.var)
+            status = np.zeros(rms.shape[0], dtype=np.int8)
+            status[(rms > self.RMS_WARN_UV) | (self.line_ratio > self.LINE_RATIO_WARN)] = 1
+            status[(rms > self.RMS_HIGH_UV) | (self.line_ratio > self.LINE_RATIO_BAD)
+                   | self.flat | (self.clip_ratio > 0)] = 2
+            return {
+                "labels": self.labels,
+                "status": status.tolist(),
+                "rms": np.round(rms, 2).tolist(),
+                "line_ratio": np.round(self.line_ratio, 3).tolist(),
+                "flat": self.flat.astype(int).tolist(),
+                "clip_ratio": np.round(self.clip_ratio, 4).tolist(),
+                "padded_rate": round(float(self.padded_rate), 4),
+                "bad_channels": int((status == 2).sum()),
+                "chunks": self.chunks,
+            }
+
+
+class ArtifactDetector:
+    """
+    流式伪迹检测（眨眼 / 肌电 / 电极跳变）
+
+    与 SignalQualityMonitor 一样在写入池中逐块向量化计算，输出伪迹段
+    (起始样本, 伪迹码, 持续样本数)，由调用方写入会话事件表：
+        - blink：额区通道（Fp/AF，无标签时取前两个通道）平滑后去中位数，幅值超过阈值
+        - emg：按短窗计算 30 Hz 以上（避开工频谐波）的高频 RMS，任一通道超过阈值
+        - pop：平滑信号在一个平滑窗内的跳变超过阈值（电极接触突变），并标记其后一小段
+
+    平滑为一个工频周期的滑动平均（同时滤除工频及其谐波），上一块末尾的样本留作下一块的前缀，
+    块边界处结果连续；跨块未结束的伪迹段暂存，下一块继续延长，录制结束时 flush() 写出。
+    """
+
+    BLINK_CODE = -1
+    EMG_CODE = -2
+    POP_CODE = -3
+
+    # 判定阈值
+    BLINK_UV = 100.0
+    EMG_RMS_UV = 15.0
+    EMG_MIN_FREQ = 30.0
+    EMG_WINDOW = 0.1
+    POP_STEP_UV = 150.0
+    POP_HOLD = 0.1
+    FRONTAL_PREFIXES = ("FP", "AF")
+
+    def __init__(self, num_channels: int, sample_rate: int, line_freq: float = 50.0):
+        self.sample_rate = int(sample_rate)
+        self.line_freq = float(line_freq)
+        self.smooth = max(1, int(round(self.sample_rate / self.line_freq)))
+        # 滑动平均的群延迟（样本），平滑信号上检出的段起点据此前移
+        self.lag = (self.smooth - 1) // 2
+        self.emg_window = max(2, int(round(self.EMG_WINDOW * self.sample_rate)))
+        self.pop_hold = max(1, int(round(self.POP_HOLD * self.sample_rate)))
+        self.lock = threading.Lock()
+        self.reset(num_channels)
+
+    def reset(self, num_channels: Optional[int] = None, labels=None):
+        with self.lock:
+            if num_channels is not None:
+                self.num_channels = num_channels
+            frontal = []
+            if labels is not None:
+                frontal = [i for i, label in enumerate(labels)
+                           if str(label).upper().startswith(self.FRONTAL_PREFIXES)]
+            self.frontal = frontal or list(range(min(2, self.num_channels)))
+            # 上一块末尾 2 个平滑窗长的原始样本（平滑与跳变检测的前缀）
+            self.tail = None
+            self.end = 0
+            # 各伪迹码未结束段的起点（样本序号）
+            self.open = {}
+            # 最近一次跳变的保持区结束样本（跨块延续）
+            self.pop_until = 0
+            self.counts = {self.BLINK_CODE: 0, self.EMG_CODE: 0, self.POP_CODE: 0}
+            self._hf_mask = None
+
+    def _emg_mask(self) -> np.ndarray:
+        """高频段掩码（短窗长固定，只计算一次）"""
+        if self._hf_mask is None:
+            freqs = np.fft.rfftfreq(self.emg_window, d=1.0 / self.sample_rate)
+            bin_width = self.sample_rate / self.emg_window
+            mask = freqs >= self.EMG_MIN_FREQ
+            for harmonic in np.arange(1, int(freqs[-1] // self.line_freq) + 1) * self.line_freq:
+                mask &= np.abs(freqs - harmonic) > bin_width / 2
+            self._hf_mask = mask
+        return self._hf_mask
+
+    def _ramp(self) -> np.ndarray:
+        """短窗内单位长度的中心化线性趋势（去趋势用的投影向量）"""
+        ramp = np.arange(self.emg_window) - (self.emg_window - 1) / 2
+        return ramp / np.sqrt((ramp * ramp).sum())
+
+    def _runs(self, code: int, mask: np.ndarray, offset: int, spans: list):
+        """把块内布尔掩码转为伪迹段，处理与上一块/下一块的衔接"""
+        n = mask.shape[0]
+        edges = np.flatnonzero(np.diff(mask.astype(np.int8), prepend=0, append=0))
+        starts, ends = edges[::2], edges[1::2]
+        open_start = self.open.pop(code, None)
+        if open_start is not None and not (len(starts) and starts[0] == 0):
+            spans.append((open_start, code, offset - open_start))
+            open_start = None
+        for i, (s, e) in enumerate(zip(starts, ends)):
+            begin = open_start if (i == 0 and open_start is not None) else offset + int(s)
+            if e == n:
+                self.open[code] = begin
+            else:
+                spans.append((begin, code, offset + int(e) - begin))
+
+    def update(self, chunk: np.ndarray, start_sample: int) -> list:
+        """
+        输入一个 (channels, n) 的 µV 数据块及其首样本序号，返回本块内结束的伪迹段
+
+        伪迹段为 [(sample, code, duration), ...]，按结束先后排列（起点可能早于本块）。
+        """
+        n = chunk.shape[1]
+        if n == 0:
+            return []
+        x = chunk.astype(np.float64)
+        w = self.smooth
+        spans = []
+        with self.lock:
+            tail = self.tail
+            if tail is None or tail.shape[0] != x.shape[0]:
+                tail = np.repeat(x[:, :1], 2 * w, axis=1)
+            ext = np.concatenate([tail, x], axis=1)
+            # 滑动平均：smoothed[:, i] 为 ext 中以第 i + w 个样本结尾的窗口均值，取本块对应部分
+            csum = np.cumsum(ext, axis=1)
+            smoothed = (csum[:, w:] - csum[:, :-w]) / w
+            current = smoothed[:, -n:]
+
+            frontal = current[self.frontal]
+            blink = (np.abs(frontal - np.median(frontal, axis=1, keepdims=True)) > self.BLINK_UV).any(axis=0)
+
+            emg = np.zeros(n, dtype=bool)
+            ew = self.emg_window
+            n_win = n // ew
+            if n_win:
+                # 逐窗去线性趋势，避免眨眼等慢波的窗口截断泄漏到高频
+                windows = x[:, :n_win * ew].reshape(x.shape[0], n_win, ew)
+                windows = windows - windows.mean(axis=2, keepdims=True)
+                ramp = self._ramp()
+                windows -= (windows @ ramp)[:, :, None] * ramp
+                power = np.abs(np.fft.rfft(windows, axis=2)[:, :, self._emg_mask()]) ** 2
+                hf_rms = np.sqrt(2.0 * power.sum(axis=2)) / ew
+                emg[:n_win * ew] = np.repeat((hf_rms > self.EMG_RMS_UV).any(axis=0), ew)
+                if n_win * ew < n:
+                    emg[n_win * ew:] = emg[n_win * ew - 1]
+
+            # 跳变：平滑信号相隔一个平滑窗的差值，跳变后保持 pop_hold 个样本，超出本块的部分在下一块补上
+            step = np.abs(current - smoothed[:, -n - w:-w]) > self.POP_STEP_UV
+            steps = np.flatnonzero(step.any(axis=0))
+            pop = np.zeros(n, dtype=bool)
+            pop[:max(0, min(n, self.pop_until - start_sample))] = True
+            if steps.size:
+                held = (steps[:, None] + np.arange(self.pop_hold)[None, :]).ravel()
+                pop[held[held < n]] = True
+                self.pop_until = start_sample + int(steps[-1]) + self.pop_hold
+
+            self._runs(self.BLINK_CODE, blink, start_sample - self.lag, spans)
+            self._runs(self.EMG_CODE, emg, start_sample, spans)
+            self._runs(self.POP_CODE, pop, start_sample - self.lag, spans)
+            self.tail = ext[:, -2 * w:].copy()
+            self.end = start_sample + n
+            for _, code, _ in spans:
+                self.counts[code] += 1
+        return spans
+
+    def flush(self) -> list:
+        """结束所有未结束的伪迹段（录制结束时调用）"""
+        with self.lock:
+            spans = [(start, code, self.end - start) for code, start in self.open.items()]
+            self.open = {}
+            for _, code, _ in spans:
+                self.counts[code] += 1
+        return sorted(spans)
+
+    def get_counts(self) -> dict:
+        with self.lock:
+            return {"blink": self.counts[self.BLINK_CODE], "emg": self.counts[self.EMG_CODE],
+                    "pop": self.counts[self.POP_CODE]}
@@ -0,0 +1,377 @@
+"""
+EEG 实时流转发（Outlet）
+
+把录制期间采集到的样本以紧凑的二进制分帧经 TCP 转发给局域网内的其他分析节点，
+解码器可以在其他机器上横向扩展。数据源是 SampleRing（线程模式下按需创建，
+独立采集进程模式下即共享内存环），转发在 Flask 进程中进行，不占用采集线程。
+
+背压按订阅者隔离：
+    - 发布线程只把编码好的帧追加到每个订阅者自己的有界队列，从不在套接字上阻塞
+    - 每个订阅者一个发送线程；队列超过 max_pending_bytes 时丢弃最旧的数据帧，
+      并在下一次发送前插入 DROP 帧告知丢了多少样本
+    - 发送超时（send_timeout）的订阅者被断开
+
+分帧（小端）：32 字节帧头 + 负载
+    magic "EEGS" | version u8 | kind u8 | channels u16 | session_seq u32 |
+    first_index i64 | timestamp f64 | n u32
+    kind=1 EEG：     负载 float32 µV (n, channels)，行优先
+    kind=2 TRIGGER： 负载 int32 (n,)
+    kind=3 META：    负载为 n 字节 UTF-8 JSON（采样率、通道等，会话开始与连接时发送）
+    kind=4 DROP：    无负载；channels 为被丢弃的流（1/2），n 为丢弃的样本数
+first_index 为会话内样本序号，timestamp 为首个样本的估计采集时刻（Unix 秒）。
+"""
+
+import atexit
+import json
+import socket
+import struct
+import threading
+import time
+from collections import deque
+from typing import Iterator, Optional
+
+import numpy as np
+
+from bci_flask_services.core.eeg import DEFAULT_DEVICE_GROUP, EEG_SAMPLE_RATE
+
+OUTLET_MAGIC = b"EEGS"
+OUTLET_VERSION = 1
+FRAME_HEADER = struct.Struct("<4sBBHIqdI")
+
+KIND_EEG = 1
+KIND_TRIGGER = 2
+KIND_META = 3
+KIND_DROP = 4
+KIND_NAMES = {KIND_EEG: "eeg", KIND_TRIGGER: "trigger", KIND_META: "meta", KIND_DROP: "drop"}
+
+
+def encode_frame(kind: int, session_seq: int, first_index: int, timestamp: float,
+                 payload: bytes = b"", channels: int = 0, n: int = 0) -> bytes:
+    header = FRAME_HEADER.pack(OUTLET_MAGIC, OUTLET_VERSION, kind, channels, session_seq & 0xFFFFFFFF,
+                               first_index, timestamp, n)
+    return header + payload
+
+
+class _Subscriber:
+    """一个远端订阅者：有界帧队列 + 独立发送线程"""
+
+    def __init__(self, sock: socket.socket, address: tuple, max_pending_bytes: int, send_timeout: float):
+        self.sock = sock
+        self.address = f"{address[0]}:{address[1]}"
+        self.max_pending_bytes = max_pending_bytes
+        self.cond = threading.Condition()
+        self.frames = deque()  # (frame, kind, n)
+        self.pending_bytes = 0
+        self.dropped = {KIND_EEG: 0, KIND_TRIGGER: 0}
+        self.dropped_total = 0
+        self.sent_bytes = 0
+        self.connected_at = time.time()
+        self.alive = True
+        sock.settimeout(send_timeout)
+        self.thread = threading.Thread(target=self._run, name=f"eeg-outlet-{self.address}", daemon=True)
+        self.thread.start()
+
+    def offer(self, frame: bytes, kind: int, n: int = 0):
+        """追加一帧（发布线程调用，不阻塞）；超出上限时丢弃最旧的数据帧，META 帧保留"""
+        with self.cond:
+            if not self.alive:
+                return
+            self.frames.append((frame, kind, n))
+            self.pending_bytes += len(frame)
+            kept = []
+            while self.pending_bytes > self.max_pending_bytes and len(self.frames) > 1:
+                old = self.frames.popleft()
+                if old[1] in self.dropped:
+                    self.pending_bytes -= len(old[0])
+                    self.dropped[old[1]] += old[2]
+                    self.dropped_total += old[2]
+                else:
+                    kept.append(old)
+            self.frames.extendleft(reversed(kept))
+            self.cond.notify()
+
+    def _run(self):
+        try:
+            while True:
+                with self.cond:
+                    while self.alive and not self.frames:
+                        self.cond.wait(1.0)
+                    if not self.alive:
+                        return
+                    batch = [frame for frame, _, _ in self.frames]
+                    self.frames.clear()
+                    self.pending_bytes = 0
+                    notices = [
+                        encode_frame(KIND_DROP, 0, -1, time.time(), channels=stream, n=n)
+                        for stream, n in self.dropped.items() if n
+                    ]
+                    for stream in self.dropped:
+                        self.dropped[stream] = 0
+                data = b"".join(notices + batch)
+                self.sock.sendall(data)
+                self.sent_bytes += len(data)
+        except OSError:
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        with self.cond:
+            self.alive = False
+            self.frames.clear()
+            self.cond.notify()
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+    def get_status(self) -> dict:
+        with self.cond:
+            return {
+                "address": self.address,
+                "connected_at": self.connected_at,
+                "pending_bytes": self.pending_bytes,
+                "sent_bytes": self.sent_bytes,
+                "dropped_samples": self.dropped_total,
+            }
+
+
+class StreamOutlet:
+    """
+    从 SampleRing 读取新样本并转发给所有订阅者
+
+    用法:
+        outlet = StreamOutlet(session_manager, port=5002).start()
+        ...
+        outlet.stop()
+    """
+
+    def __init__(self, session_manager, host: str = "0.0.0.0", port: int = 5002,
+                 block_ms: float = 20.0, max_pending_bytes: int = 4 * 1024 * 1024,
+                 send_timeout: float = 10.0, max_subscribers: int = 16):
+        self.session_manager = session_manager
+        self.host = host
+        self.port = port
+        self.block_seconds = max(0.001, block_ms / 1000.0)
+        self.max_pending_bytes = max_pending_bytes
+        self.send_timeout = send_timeout
+        self.max_subscribers = max_subscribers
+        self.subscribers = []
+        self.lock = threading.Lock()
+        self.meta_frame = None
+        self.published = {KIND_EEG: 0, KIND_TRIGGER: 0}
+        self.ring_lost = 0
+        self.server_socket = None
+        self.running = False
+        self.threads = []
+
+    @property
+    def ring(self):
+        return self.session_manager.sample_ring
+
+    def start(self):
+        if self.running:
+            return self
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server_socket.bind((self.host, self.port))
+        self.server_socket.listen(self.max_subscribers)
+        self.server_socket.settimeout(1.0)
+        self.running = True
+        self.threads = [
+            threading.Thread(target=self._accept_loop, name="eeg-outlet-accept", daemon=True),
+            threading.Thread(target=self._publish_loop, name="eeg-outlet-publish", daemon=True),
+        ]
+        for t in self.threads:
+            t.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        if self.server_socket:
+            try:
+                self.server_socket.close()
+            except OSError:
+                pass
+        for t in self.threads:
+            t.join(timeout=2.0)
+        with self.lock:
+            subscribers, self.subscribers = self.subscribers, []
+        for sub in subscribers:
+            sub.close()
+
+    def _accept_loop(self):
+        while self.running:
+            try:
+                sock, address = self.server_socket.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            with self.lock:
+                self.subscribers = [s for s in self.subscribers if s.alive]
+                if len(self.subscribers) >= self.max_subscribers:
+                    sock.close()
+                    continue
+                sub = _Subscriber(sock, address, self.max_pending_bytes, self.send_timeout)
+                if self.meta_frame is not None:
+                    sub.offer(self.meta_frame, KIND_META)
+                self.subscribers.append(sub)
+
+    def _broadcast(self, frame: bytes, kind: int, n: int = 0):
+        with self.lock:
+            subscribers = self.subscribers = [s for s in self.subscribers if s.alive]
+        for sub in subscribers:
+            sub.offer(frame, kind, n)
+
+    def _metadata(self, ring, session_seq: int) -> bytes:
+        try:
+            status = self.session_manager.get_status()
+        except Exception:
+            status = {}
+        # 样本环只发布默认设备组，元数据取该组的会话
+        session = next((s for s in status.get("sessions", []) if s.get("device_group") == DEFAULT_DEVICE_GROUP), {})
+        meta = {
+            "session_seq": session_seq,
+            "session_id": session.get("session_id"),
+            "sample_rate": EEG_SAMPLE_RATE,
+            "num_channels": ring.num_channels,
+            "channels": session.get("channels"),
+            "units": "uV",
+        }
+        payload = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+        return encode_frame(KIND_META, session_seq, 0, time.time(), payload, n=len(payload))
+
+    def _publish_loop(self):
+        session_seq = None
+        eeg_cursor = trigger_cursor = 0
+        while self.running:
+            time.sleep(self.block_seconds)
+            ring = self.ring
+            if ring is None:
+                continue
+            seq = ring.session_seq
+            if seq == 0:
+                continue  # 还没有录制过
+            if seq != session_seq:
+                session_seq = seq
+                eeg_cursor = trigger_cursor = 0
+                self.meta_frame = self._metadata(ring, seq)
+                self._broadcast(self.meta_frame, KIND_META)
+
+            now = time.time()
+            block, eeg_cursor, lost = ring.read_eeg(eeg_cursor)
+            if ring.session_seq != seq:
+                continue  # 读取期间开始了新会话，下一轮从头读取
+            if lost:
+                self.ring_lost += lost
+                self._broadcast(encode_frame(KIND_DROP, seq, -1, now, channels=KIND_EEG, n=lost), KIND_DROP)
+            n = block.shape[0]
+            if n:
+                first = eeg_cursor - n
+                frame = encode_frame(KIND_EEG, seq, first, now - (n - 1) / EEG_SAMPLE_RATE,
+                                     np.ascontiguousarray(block, dtype="<f4").tobytes(),
+                                     channels=block.shape[1], n=n)
+                self._broadcast(frame, KIND_EEG, n)
+                self.published[KIND_EEG] += n
+
+            values, trigger_cursor, lost = ring.read_trigger(trigger_cursor)
+            if lost:
+                self._broadcast(encode_frame(KIND_DROP, seq, -1, now, channels=KIND_TRIGGER, n=lost), KIND_DROP)
+            n = values.shape[0]
+            if n:
+                frame = encode_frame(KIND_TRIGGER, seq, trigger_cursor - n, now - (n - 1) / EEG_SAMPLE_RATE,
+                                     values.astype("<i4").tobytes(), channels=1, n=n)
+                self._broadcast(frame, KIND_TRIGGER, n)
+                self.published[KIND_TRIGGER] += n
+
+    def get_status(self) -> dict:
+        with self.lock:
+            subscribers = [s.get_status() for s in self.subscribers if s.alive]
+        return {
+            "running": self.running,
+            "address": f"{self.host}:{self.port}",
+            "block_ms": round(self.block_seconds * 1000, 3),
+            "max_pending_bytes": self.max_pending_bytes,
+            "published_samples": {"eeg": self.published[KIND_EEG], "trigger": self.published[KIND_TRIGGER]},
+            "ring_lost_samples": self.ring_lost,
+            "subscribers": subscribers,
+        }
+
+
+def start_outlet(session_manager, host: str = "0.0.0.0", port: int = 5002, ring_seconds: float = 30.0,
+                 **kwargs) -> StreamOutlet:
+    """启动转发；线程模式下 SessionManager 还没有样本环时创建一个"""
+    if session_manager.sample_ring is None:
+        from bci_flask_services.core.eeg_process import SampleRing
+        ring = SampleRing(capacity=max(1, int(ring_seconds * EEG_SAMPLE_RATE)), create=True)
+        atexit.register(ring.close)
+        session_manager.sample_ring = ring
+    return StreamOutlet(session_manager, host=host, port=port, **kwargs).start()
+
+
+# ----------------------------------------------------------------------
+# 订阅端（在其他分析节点上使用，只依赖 numpy）
+# ----------------------------------------------------------------------
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    chunks = []
+    while n:
+        chunk = sock.recv(n)
+        if not chunk:
+            raise ConnectionError("outlet closed the connection")
+        chunks.append(chunk)
+        n -= len(chunk)
+    return b"".join(chunks)
+
+
+class OutletClient:
+    """
+    Outlet 订阅客户端
+
+    用法:
+        with OutletClient("192.168.1.101", 5002) as client:
+            for msg in client:
+                if msg["kind"] == "eeg":
+                    decoder.push(msg["first_index"], msg["data"])   # (n, channels) µV
+    """
+
+    def __init__(self, host: str, port: int = 5002, timeout: Optional[float] = None):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+
+    def recv(self) -> dict:
+        magic, version, kind, channels, session_seq, first_index, timestamp, n = \
+            FRAME_HEADER.unpack(_recv_exact(self.sock, FRAME_HEADER.size))
+        if magic != OUTLET_MAGIC or version != OUTLET_VERSION:
+            raise ValueError("not an EEG outlet stream")
+        msg = {
+            "kind": KIND_NAMES.get(kind, str(kind)),
+            "session_seq": session_seq,
+            "first_index": first_index,
+            "timestamp": timestamp,
+            "n": n,
+        }
+        if kind == KIND_EEG:
+            raw = _recv_exact(self.sock, n * channels * 4)
+            msg["data"] = np.frombuffer(raw, dtype="<f4").reshape(n, channels)
+        elif kind == KIND_TRIGGER:
+            msg["data"] = np.frombuffer(_recv_exact(self.sock, n * 4), dtype="<i4")
+        elif kind == KIND_META:
+            msg["data"] = json.loads(_recv_exact(self.sock, n).decode("utf-8"))
+        elif kind == KIND_DROP:
+            msg["stream"] = KIND_NAMES.get(channels, str(channels))
+        return msg
+
+    def __iter__(self) -> Iterator[dict]:
+        while True:
+            yield self.recv()
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
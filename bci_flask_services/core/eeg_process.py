@@ -0,0 +1,451 @@
+"""
+EEG 独立采集进程
+
+把 EEGDeviceServer、帧解析与 StreamWriter 放到独立子进程中运行，避免与 Flask
+请求处理、音乐生成推理争用同一个 GIL（生成时采集抖动与丢包明显上升）：
+
+    Flask 进程                                   采集子进程
+    ProcessSessionManager / ProcessDeviceServer  SessionManager + EEGDeviceServer
+        │  控制管道（Pipe，请求/应答）  ───────▶     命令分发（开始/停止录制、状态、统计…）
+        │  SampleRing（共享内存）      ◀───────     采集线程逐样本发布（µV 或原始计数）
+
+两个代理类实现 eeg_bp 用到的 SessionManager / EEGDeviceServer 接口，API 在两种模式下一致。
+子进程异常退出时，下一次调用会自动重新拉起（正在录制的会话随之结束）。
+"""
+
+import atexit
+import multiprocessing
+import threading
+import time
+from multiprocessing import shared_memory
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from bci_flask_services.core.eeg import EEG_DEVICE_CHANNELS, EEG_SAMPLE_RATE, StrPath
+
+# 共享内存布局：int64 头 | float64 换算系数 | eeg float32 (capacity, 最大通道数) | trigger int32 (capacity,)
+_HEADER_SLOTS = 8
+_H_EEG_COUNT = 0
+_H_TRIGGER_COUNT = 1
+_H_CHANNELS = 2
+_H_CAPACITY = 3
+_H_SESSION_SEQ = 4
+_H_MAX_CHANNELS = 5
+_DATA_OFFSET = 128
+
+
+class SampleRing:
+    """
+    单写者、多读者的共享内存样本环
+
+    写者（采集线程）先写样本再递增计数；读者按游标读取，落后超过容量时跳过被覆盖的部分
+    并返回丢失数。每个会话开始时 reset()，session_seq 递增、计数清零。
+    """
+
+    def __init__(self, name: Optional[str] = None, capacity: int = 30 * EEG_SAMPLE_RATE,
+                 max_channels: int = EEG_DEVICE_CHANNELS, create: bool = False):
+        if create:
+            size = _DATA_OFFSET + capacity * max_channels * 4 + capacity * 4
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        buf = self.shm.buf
+        self.header = np.ndarray((_HEADER_SLOTS,), dtype=np.int64, buffer=buf)
+        if create:
+            self.header[:] = 0
+            self.header[_H_CAPACITY] = capacity
+            self.header[_H_MAX_CHANNELS] = max_channels
+            self.header[_H_CHANNELS] = max_channels
+        self.capacity = int(self.header[_H_CAPACITY])
+        self.max_channels = int(self.header[_H_MAX_CHANNELS])
+        self.scale = np.ndarray((1,), dtype=np.float64, buffer=buf, offset=_HEADER_SLOTS * 8)
+        if create:
+            self.scale[0] = 1.0
+        self.eeg = np.ndarray((self.capacity, self.max_channels), dtype=np.float32,
+                              buffer=buf, offset=_DATA_OFFSET)
+        self.trigger = np.ndarray((self.capacity,), dtype=np.int32, buffer=buf,
+                                  offset=_DATA_OFFSET + self.eeg.nbytes)
+        self.owner = create
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    # ---- 写者（采集进程） ----
+
+    def reset(self, num_channels: int, uv_scale: float = 1.0):
+        self.header[_H_EEG_COUNT] = 0
+        self.header[_H_TRIGGER_COUNT] = 0
+        self.header[_H_CHANNELS] = min(int(num_channels), self.max_channels)
+        self.scale[0] = uv_scale
+        self.header[_H_SESSION_SEQ] += 1
+
+    def write_eeg(self, sample: np.ndarray):
+        count = int(self.header[_H_EEG_COUNT])
+        self.eeg[count % self.capacity, :sample.shape[0]] = sample
+        self.header[_H_EEG_COUNT] = count + 1
+
+    def write_trigger(self, value: int):
+        count = int(self.header[_H_TRIGGER_COUNT])
+        self.trigger[count % self.capacity] = value
+        self.header[_H_TRIGGER_COUNT] = count + 1
+
+    # ---- 读者 ----
+
+    @property
+    def session_seq(self) -> int:
+        return int(self.header[_H_SESSION_SEQ])
+
+    @property
+    def num_channels(self) -> int:
+        return int(self.header[_H_CHANNELS])
+
+    @property
+    def uv_scale(self) -> float:
+        return float(self.scale[0])
+
+    def _read(self, array: np.ndarray, count_slot: int, cursor: Optional[int]) -> tuple:
+        count = int(self.header[count_slot])
+        if cursor is None or cursor > count:
+            cursor = count
+        lost = max(0, count - self.capacity - cursor)
+        cursor += lost
+        block = array[np.arange(cursor, count) % self.capacity].copy()
+        # 复制期间写者可能已覆盖最旧的几行
+        overwritten = max(0, int(self.header[count_slot]) - self.capacity - cursor)
+        if overwritten:
+            block = block[overwritten:]
+            lost += overwritten
+        return block, count, lost
+
+    def read_eeg(self, cursor: Optional[int]) -> tuple:
+        """读取游标之后的 EEG 样本：(block (n, channels) µV float32, 新游标, 丢失样本数)"""
+        block, count, lost = self._read(self.eeg, _H_EEG_COUNT, cursor)
+        block = block[:, :self.num_channels]
+        scale = self.uv_scale
+        if scale != 1.0:
+            block *= np.float32(scale)
+        return block, count, lost
+
+    def read_trigger(self, cursor: Optional[int]) -> tuple:
+        """读取游标之后的 Trigger 值：(values (n,) int32, 新游标, 丢失样本数)"""
+        return self._read(self.trigger, _H_TRIGGER_COUNT, cursor)
+
+    def close(self):
+        # 释放 numpy 视图后才能关闭共享内存
+        self.header = self.scale = self.eeg = self.trigger = None
+        self.shm.close()
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+# ----------------------------------------------------------------------
+# 子进程
+# ----------------------------------------------------------------------
+
+def _ingest_process_main(conn, ring_name: str, options: dict):
+    """采集子进程入口：创建 SessionManager 与 EEGDeviceServer，按控制管道的命令执行"""
+    from bci_flask_services.core.eeg import EEGDeviceServer, SessionManager
+    from bci_flask_services.core.eeg_flight import flight_recorder
+    from bci_flask_services.core.eeg_metrics import pipeline_metrics
+
+    flight_options = options.get("flight")
+    if flight_options:
+        flight_recorder.configure(**flight_options)
+    flight_recorder.install_gc_hook()
+
+    ring = SampleRing(ring_name)
+    session_manager = SessionManager(
+        save_dir=options["save_dir"], erp_window=options["erp_window"],
+        storage_mode=options["storage_mode"], line_freq=options["line_freq"],
+        device_groups=options.get("device_groups"), writer_workers=options.get("writer_workers", 2)
+    )
+    session_manager.sample_ring = ring
+    server = EEGDeviceServer(
+        options["host_ip"], options["port"], options["eeg_ip"], options["trigger_ip"], session_manager
+    )
+    def _erp_info(session_id=None):
+        averager = session_manager.get_erp_averager(session_id)
+        return None if averager is None else {"window": averager.window, "missed": averager.missed}
+
+    def _erp_codes(session_id=None):
+        averager = session_manager.get_erp_averager(session_id)
+        return {} if averager is None else averager.get_codes()
+
+    def _erp_average(code, session_id=None):
+        averager = session_manager.get_erp_averager(session_id)
+        return None if averager is None else averager.get_average(code)
+
+    handlers = {
+        "server_start": server.start,
+        "server_stop": server.stop,
+        "server_running": lambda: server.running,
+        "send_start_cmd": server.send_start_cmd,
+        "start_new_session": session_manager.start_new_session,
+        "stop_session": session_manager.stop_session,
+        "add_marker": session_manager.add_marker,
+        "get_status": session_manager.get_status,
+        "get_sessions": session_manager.get_sessions,
+        "current_session": lambda: session_manager.current_session,
+        "realtime_stats": session_manager.get_realtime_stats,
+        "render_metrics": pipeline_metrics.render,
+        "flight_status": flight_recorder.get_status,
+        "dump_flight": session_manager.dump_flight,
+        "erp_info": _erp_info,
+        "erp_codes": _erp_codes,
+        "erp_average": _erp_average,
+    }
+
+    # 请求与回复都带序号：父进程调用超时后迟到的回复可据此丢弃
+    seq = None
+    try:
+        while True:
+            try:
+                seq, method, args, kwargs = conn.recv()
+            except (EOFError, OSError):
+                seq = None
+                break  # 父进程已退出
+            if method == "shutdown":
+                break
+            handler = handlers.get(method)
+            try:
+                if handler is None:
+                    raise ValueError(f"unknown method: {method}")
+                conn.send((seq, "ok", handler(*args, **kwargs)))
+            except Exception as e:
+                conn.send((seq, "error", f"{type(e).__name__}: {e}"))
+    finally:
+        # 结束录制以写完 HDF5 与 metadata.json
+        for session_id in list(session_manager.active):
+            session_manager.stop_session(session_id)
+        server.stop()
+        ring.close()
+        try:
+            conn.send((seq, "ok", None))
+        except (OSError, ValueError):
+            pass
+
+
+# ----------------------------------------------------------------------
+# Flask 进程侧
+# ----------------------------------------------------------------------
+
+class IngestProcess:
+    """采集子进程的生命周期与控制管道（调用串行化，线程安全）"""
+
+    def __init__(self, options: dict, ring_seconds: float = 30.0, call_timeout: float = 30.0):
+        self.options = options
+        self.ring_capacity = max(1, int(ring_seconds * EEG_SAMPLE_RATE))
+        self.call_timeout = call_timeout
+        self.lock = threading.Lock()
+        self.ring = None
+        self.process = None
+        self.conn = None
+        self.restarts = 0
+        # 请求序号；超时后子进程迟到的回复序号不匹配，读取时丢弃
+        self.seq = 0
+        self.stale_replies = 0
+        self._ctx = multiprocessing.get_context("spawn")
+
+    def start(self):
+        with self.lock:
+            self._start_locked()
+        return self
+
+    def _start_locked(self):
+        if self.ring is None:
+            self.ring = SampleRing(capacity=self.ring_capacity, create=True)
+            atexit.register(self.shutdown)
+        parent_conn, child_conn = self._ctx.Pipe()
+        self.process = self._ctx.Process(
+            target=_ingest_process_main, args=(child_conn, self.ring.name, self.options),
+            name="eeg-ingest", daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.is_alive()
+
+    def call(self, method: str, *args, **kwargs):
+        with self.lock:
+            if not self.alive:
+                if self.process is not None:
+                    self.restarts += 1
+                    print(f"⚠️  EEG 采集进程已退出（exitcode={self.process.exitcode}），重新启动")
+                self._start_locked()
+            self.seq += 1
+            try:
+                self.conn.send((self.seq, method, args, kwargs))
+                status, result = self._recv_reply(self.seq, method)
+            except (EOFError, OSError) as e:
+                raise RuntimeError(f"ingest process unavailable: {e}") from e
+        if status != "ok":
+            raise RuntimeError(result)
+        return result
+
+    def _recv_reply(self, seq: int, method: str) -> tuple:
+        """读取序号为 seq 的回复，丢弃之前超时调用的迟到回复"""
+        deadline = time.monotonic() + self.call_timeout
+        while True:
+            if not self.conn.poll(max(0.0, deadline - time.monotonic())):
+                raise RuntimeError(f"ingest process did not answer {method}")
+            reply_seq, status, result = self.conn.recv()
+            if reply_seq == seq:
+                return status, result
+            self.stale_replies += 1
+
+    def shutdown(self, timeout: float = 10.0):
+        """停止子进程（先结束录制），释放共享内存"""
+        with self.lock:
+            if self.alive:
+                try:
+                    self.seq += 1
+                    self.conn.send((self.seq, "shutdown", (), {}))
+                    self.conn.poll(timeout)
+                except (EOFError, OSError):
+                    pass
+                self.process.join(timeout)
+                if self.process.is_alive():
+                    self.process.terminate()
+            if self.ring is not None:
+                self.ring.close()
+                self.ring = None
+
+
+class _RemoteERPAverager:
+    """OnlineERPAverager 的只读代理（eeg_bp /erp 用到的部分），session_id 为空时为默认设备组"""
+
+    def __init__(self, ingest: IngestProcess, session_id: Optional[str] = None):
+        self.ingest = ingest
+        self.session_id = session_id
+
+    def _info(self) -> dict:
+        info = self.ingest.call("erp_info", self.session_id)
+        if info is None:
+            raise RuntimeError(f"Session not recording: {self.session_id}")
+        return info
+
+    @property
+    def window(self) -> int:
+        return self._info()["window"]
+
+    @property
+    def missed(self) -> int:
+        return self._info()["missed"]
+
+    def get_codes(self) -> dict:
+        return self.ingest.call("erp_codes", self.session_id)
+
+    def get_average(self, code: int):
+        return self.ingest.call("erp_average", code, self.session_id)
+
+
+class ProcessSessionManager:
+    """SessionManager 的代理：录制与统计在采集子进程中，样本经共享内存环读取"""
+
+    def __init__(self, ingest: IngestProcess, save_dir: StrPath, storage_mode: str = "uv"):
+        self.ingest = ingest
+        self.save_dir = Path(save_dir)
+        self.storage_mode = storage_mode
+        self.erp_averager = _RemoteERPAverager(ingest)
+
+    @property
+    def sample_ring(self) -> Optional[SampleRing]:
+        return self.ingest.ring
+
+    @property
+    def sessions(self) -> list:
+        return self.ingest.call("get_sessions")
+
+    @property
+    def current_session(self) -> Optional[dict]:
+        return self.ingest.call("current_session")
+
+    @property
+    def is_recording(self) -> bool:
+        return self.ingest.call("get_status")["is_recording"]
+
+    def start_new_session(self, user_id=None, user_account=None, channels=None, montage=None, group=None):
+        return self.ingest.call("start_new_session", user_id=user_id, user_account=user_account,
+                                channels=channels, montage=montage, group=group)
+
+    def stop_session(self, session_id: Optional[str] = None):
+        return self.ingest.call("stop_session", session_id)
+
+    def add_marker(self, value: int, label: str = "", duration: int = 0, at: Optional[float] = None,
+                   session_id: Optional[str] = None):
+        # perf_counter 为系统单调时钟，跨进程可比，打点以 Flask 进程收到请求的时刻为准
+        return self.ingest.call("add_marker", value, label=label, duration=duration,
+                                at=time.perf_counter() if at is None else at, session_id=session_id)
+
+    def get_status(self, session_id: Optional[str] = None) -> Optional[dict]:
+        status = self.ingest.call("get_status", session_id)
+        if status is not None and session_id is None:
+            status["ingest_mode"] = "process"
+            status["ingest_restarts"] = self.ingest.restarts
+        return status
+
+    def get_sessions(self) -> list:
+        return self.sessions
+
+    def get_realtime_stats(self, session_id: Optional[str] = None) -> Optional[dict]:
+        return self.ingest.call("realtime_stats", session_id)
+
+    def get_erp_averager(self, session_id: Optional[str] = None) -> Optional[_RemoteERPAverager]:
+        if not session_id:
+            return self.erp_averager
+        if self.ingest.call("erp_info", session_id) is None:
+            return None
+        return _RemoteERPAverager(self.ingest, session_id)
+
+    def render_metrics(self) -> str:
+        return self.ingest.call("render_metrics")
+
+    def get_flight_status(self) -> dict:
+        return self.ingest.call("flight_status")
+
+    def dump_flight(self, directory=None, session_id: Optional[str] = None) -> str:
+        return self.ingest.call("dump_flight", None if directory is None else str(directory), session_id)
+
+
+class ProcessDeviceServer:
+    """EEGDeviceServer 的代理"""
+
+    def __init__(self, ingest: IngestProcess):
+        self.ingest = ingest
+
+    @property
+    def running(self) -> bool:
+        return self.ingest.call("server_running")
+
+    def start(self):
+        return self.ingest.call("server_start")
+
+    def stop(self):
+        return self.ingest.call("server_stop")
+
+    def send_start_cmd(self):
+        return self.ingest.call("send_start_cmd")
+
+
+def start_ingest_process(save_dir: StrPath, erp_window: int, storage_mode: str, line_freq: float,
+                         host_ip: str, port: int, eeg_ip: str, trigger_ip: str,
+                         flight: Optional[dict] = None, ring_seconds: float = 30.0,
+                         device_groups: Optional[dict] = None, writer_workers: int = 2) -> tuple:
+    """启动采集子进程，返回 (ProcessDeviceServer, ProcessSessionManager)，接口同线程模式"""
+    options = {
+        "save_dir": str(save_dir), "erp_window": erp_window, "storage_mode": storage_mode,
+        "line_freq": line_freq, "host_ip": host_ip, "port": port, "eeg_ip": eeg_ip,
+        "trigger_ip": trigger_ip, "flight": flight, "device_groups": device_groups,
+        "writer_workers": writer_workers,
+    }
+    ingest = IngestProcess(options, ring_seconds=ring_seconds).start()
+    return ProcessDeviceServer(ingest), ProcessSessionManager(ingest, save_dir, storage_mode)
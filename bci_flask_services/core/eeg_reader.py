@@ -0,0 +1,417 @@
+"""
+EEG 会话文件读取模块
+提供录制结束后的 HDF5 会话数据回读能力
+
+- 文件句柄 LRU 缓存：复用已打开的 HDF5 文件及其解压块缓存（总内存有上限）
+- 区间读取：按样本/时间范围、通道与抽取倍数分块读取，便于流式返回
+- 概览读取：根据时间跨度与像素宽度自动选择 min/max 金字塔级别；缺少金字塔时从原始数据按块现算
+- 补建索引：build_missing_indexes() 由维护线程/命令行调用，请求路径只读不写文件
+- 事件查询：在稀疏触发事件索引上按取值与时间范围查找；缺少索引时按块扫描 trigger 数据现算
+- 伪迹段查询：按区间判断是否与在线检测的伪迹段重叠（二分查找，不扫描数据）
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+import h5py
+import numpy as np
+
+from bci_flask_services import config
+from bci_flask_services.core.eeg import (
+    ARTIFACT_CODES,
+    EEG_SAMPLE_RATE,
+    EVENTS_DATASET,
+    OVERVIEW_FACTORS,
+    OVERVIEW_GROUP,
+    StrPath,
+    apply_uv_scale,
+    build_overview_pyramid,
+    build_trigger_event_index,
+    compute_trigger_events,
+    get_uv_scale,
+    stored_markers,
+)
+
+EEG_DATASET = "eeg_data"
+TRIGGER_DATASET = "trigger_data"
+
+
+class SessionFileCache:
+    """
+    只读 HDF5 文件句柄的 LRU 缓存
+
+    每个文件打开时设置 rdcc_nbytes（HDF5 原生的解压块缓存），
+    缓存总内存 ≈ max_files × 单文件块缓存，不会超过 max_bytes。
+    文件 mtime 变化（如被重写/替换）时自动重新打开。
+    """
+
+    def __init__(self, max_files: int = 16, max_bytes: int = 256 * 1024 * 1024):
+        self.max_files = max(1, int(max_files))
+        self.chunk_cache_bytes = max(1024 * 1024, int(max_bytes) // self.max_files)
+        self._files = OrderedDict()
+        self.lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def _evict(self, key):
+        h5, _ = self._files.pop(key)
+        try:
+            h5.close()
+        except Exception:
+            pass
+
+    @contextmanager
+    def open(self, path: StrPath):
+        """获取文件句柄（持有缓存锁直到退出上下文，调用方应只做短时读取）"""
+        key = str(Path(path).resolve())
+        mtime = os.stat(key).st_mtime_ns
+        with self.lock:
+            entry = self._files.get(key)
+            if entry is not None and entry[1] != mtime:
+                self._evict(key)
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                h5 = h5py.File(key, "r", rdcc_nbytes=self.chunk_cache_bytes, rdcc_nslots=10007)
+                self._files[key] = (h5, mtime)
+                while len(self._files) > self.max_files:
+                    self._evict(next(iter(self._files)))
+            else:
+                self.hits += 1
+                self._files.move_to_end(key)
+
+            yield self._files[key][0]
+
+    def invalidate(self, path: StrPath):
+        """关闭并移除指定文件句柄（写入/替换文件前调用）"""
+        key = str(Path(path).resolve())
+        with self.lock:
+            if key in self._files:
+                self._evict(key)
+
+    def clear(self):
+        with self.lock:
+            for key in list(self._files):
+                self._evict(key)
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {
+                "open_files": len(self._files),
+                "max_files": self.max_files,
+                "chunk_cache_bytes": self.chunk_cache_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+# 全局缓存实例
+session_file_cache = SessionFileCache(
+    max_files=getattr(config, "EEG_READ_CACHE_FILES", 16),
+    max_bytes=getattr(config, "EEG_READ_CACHE_MB", 256) * 1024 * 1024,
+)
+
+
+def get_sample_rate(eeg_dataset) -> int:
+    """读取数据集采样率属性（旧文件没有该属性时使用设备默认值）"""
+    return int(eeg_dataset.attrs.get("sample_rate", EEG_SAMPLE_RATE))
+
+
+def _channel_selection(channels):
+    if channels is None:
+        return slice(None)
+    return np.asarray(sorted(set(int(c) for c in channels)), dtype=np.int64)
+
+
+def describe_range(path: StrPath, dataset_name: str = EEG_DATASET, start=None, end=None,
+                   unit: str = "samples", channels=None, decimate: int = 1, scaled: bool = True) -> dict:
+    """
+    解析读取范围，返回规范化后的样本区间与输出形状
+
+    unit 为 "s" 时 start/end 按秒换算为样本下标。
+    原始计数存储的文件在 scaled=True 时输出 float32 µV，否则输出 int32 计数。
+    """
+    decimate = max(1, int(decimate))
+    with session_file_cache.open(path) as h5:
+        dataset = h5[dataset_name]
+        total = dataset.shape[-1]
+        sample_rate = int(dataset.attrs.get("sample_rate", EEG_SAMPLE_RATE))
+        num_channels = dataset.shape[0] if dataset.ndim == 2 else 1
+        uv_scale = get_uv_scale(dataset)
+        dtype = np.dtype(np.float32) if (scaled and uv_scale is not None) else dataset.dtype
+
+    def _to_index(value, default):
+        if value is None:
+            return default
+        if unit in ("s", "sec", "seconds"):
+            return int(round(float(value) * sample_rate))
+        return int(value)
+
+    start_idx = min(max(0, _to_index(start, 0)), total)
+    end_idx = min(max(start_idx, _to_index(end, total)), total)
+
+    if dataset_name == TRIGGER_DATASET or channels is None:
+        channel_list = list(range(num_channels))
+    else:
+        channel_list = [c for c in sorted(set(int(c) for c in channels)) if 0 <= c < num_channels]
+
+    n_out = len(range(start_idx, end_idx, decimate))
+    return {
+        "start": start_idx,
+        "end": end_idx,
+        "decimate": decimate,
+        "channels": channel_list,
+        "sample_rate": sample_rate,
+        "dtype": dtype,
+        "uv_per_count": uv_scale,
+        "shape": (len(channel_list), n_out) if dataset_name == EEG_DATASET else (n_out,),
+    }
+
+
+def iter_range_blocks(path: StrPath, dataset_name: str, start: int, end: int,
+                      channels=None, decimate: int = 1, block_samples: int = 50_000,
+                      scaled: bool = True):
+    """
+    按块迭代读取 [start, end) 区间（每块最多 block_samples 个原始样本）
+
+    块边界对齐到 decimate 的整数倍，保证拼接结果与一次性读取一致；
+    每次读取只短暂持有缓存锁，适合在流式响应中使用。
+    scaled=True 时原始计数在读出后逐块换算为 µV。
+    """
+    decimate = max(1, int(decimate))
+    block_samples = max(decimate, block_samples - block_samples % decimate)
+    channel_sel = _channel_selection(channels)
+
+    for block_start in range(start, end, block_samples):
+        block_end = min(end, block_start + block_samples)
+        with session_file_cache.open(path) as h5:
+            dataset = h5[dataset_name]
+            if dataset.ndim == 2:
+                block = dataset[:, block_start:block_end:decimate]
+                if not isinstance(channel_sel, slice):
+                    block = block[channel_sel]
+                if scaled:
+                    block = apply_uv_scale(block, get_uv_scale(dataset))
+            else:
+                block = dataset[block_start:block_end:decimate]
+        yield block
+
+
+def read_range(path: StrPath, dataset_name: str = EEG_DATASET, start=None, end=None,
+               unit: str = "samples", channels=None, decimate: int = 1, scaled: bool = True) -> np.ndarray:
+    """一次性读取区间数据（适合小范围；大范围请使用 iter_range_blocks 流式处理）"""
+    info = describe_range(path, dataset_name, start, end, unit, channels, decimate, scaled)
+    blocks = list(iter_range_blocks(path, dataset_name, info["start"], info["end"],
+                                    info["channels"] if channels is not None else None, info["decimate"],
+                                    scaled=scaled))
+    if not blocks:
+        return np.empty(info["shape"], dtype=info["dtype"])
+    return np.concatenate(blocks, axis=-1)
+
+
+def pick_overview_factor(available: list, span_samples: int, pixel_width: int) -> int:
+    """
+    选择满足像素分辨率的最粗级别
+
+    目标是每个像素至少对应一个箱：span / factor >= pixel_width；
+    没有满足条件的级别时返回 1（读取原始数据）。
+    """
+    best = 1
+    for f in sorted(available):
+        if span_samples // f >= pixel_width:
+            best = f
+    return best
+
+
+def _overview_from_raw(eeg_file: StrPath, start: int, end: int, factor: int, channels,
+                       block_samples: int = 100_000) -> tuple:
+    """从原始数据按块计算与金字塔 factor 级相同的 min/max 箱，返回 (首箱下标, min, max)"""
+    bin_start = start // factor
+    block_samples = factor * max(1, block_samples // factor)
+    mins, maxs = [], []
+    for block in iter_range_blocks(eeg_file, EEG_DATASET, bin_start * factor, end, channels=channels,
+                                   block_samples=block_samples):
+        n_bins = -(-block.shape[1] // factor)
+        pad = n_bins * factor - block.shape[1]
+        if pad:
+            block = np.pad(block, ((0, 0), (0, pad)), mode="edge")
+        block = block.reshape(block.shape[0], n_bins, factor)
+        mins.append(block.min(axis=2).astype(np.float32))
+        maxs.append(block.max(axis=2).astype(np.float32))
+    if not mins:
+        with session_file_cache.open(eeg_file) as h5:
+            num_channels = h5[EEG_DATASET].shape[0]
+        n = num_channels if channels is None else len(_channel_selection(channels))
+        empty = np.empty((n, 0), dtype=np.float32)
+        return bin_start, empty, empty
+    return bin_start, np.concatenate(mins, axis=1), np.concatenate(maxs, axis=1)
+
+
+def read_overview(eeg_file: StrPath, start: int = 0, end: Optional[int] = None,
+                  pixel_width: int = 1000, channels=None) -> dict:
+    """
+    按像素宽度读取 [start, end) 样本区间的 min/max 概览
+
+    只读：缺少金字塔的旧文件不在此补建（见 build_missing_indexes），
+    而是按需要的级别从原始数据按块现算，结果与金字塔一致，内存与区间长度无关。
+
+    返回:
+        {
+            "factor": 选用的降采样倍数（1 表示原始数据）,
+            "start": 首个箱对应的样本下标,
+            "sample_rate": 采样率,
+            "min": (channels, n_bins) float32,
+            "max": (channels, n_bins) float32,
+        }
+    """
+    pixel_width = max(1, int(pixel_width))
+
+    with session_file_cache.open(eeg_file) as h5:
+        dataset = h5[EEG_DATASET]
+        total = dataset.shape[1]
+        start = min(max(0, int(start)), total)
+        end = total if end is None else min(max(start, int(end)), total)
+        channel_sel = _channel_selection(channels)
+
+        available = {}
+        if OVERVIEW_GROUP in h5:
+            for name, ds in h5[OVERVIEW_GROUP].items():
+                available[int(ds.attrs.get("factor", name.lstrip("x")))] = ds
+
+        sample_rate = get_sample_rate(dataset)
+        factor = pick_overview_factor(list(available), end - start, pixel_width)
+        raw_factor = 1 if available else pick_overview_factor(list(OVERVIEW_FACTORS), end - start, pixel_width)
+        if factor == 1 and raw_factor == 1:
+            data = apply_uv_scale(dataset[channel_sel, start:end], get_uv_scale(dataset))
+            return {
+                "factor": 1,
+                "start": start,
+                "sample_rate": sample_rate,
+                "min": data,
+                "max": data,
+            }
+
+        if factor != 1:
+            ds = available[factor]
+            bin_start = start // factor
+            bin_end = min(ds.shape[2], -(-end // factor))
+            block = ds[:, :, bin_start:bin_end]
+            block = block[:, channel_sel, :]
+            return {
+                "factor": factor,
+                "start": bin_start * factor,
+                "sample_rate": sample_rate,
+                "min": block[0],
+                "max": block[1],
+            }
+
+    # 没有金字塔：在缓存锁外按块读取原始数据现算
+    bin_start, mins, maxs = _overview_from_raw(eeg_file, start, end, raw_factor, channels)
+    return {
+        "factor": raw_factor,
+        "start": bin_start * raw_factor,
+        "sample_rate": sample_rate,
+        "min": mins,
+        "max": maxs,
+    }
+
+
+def _events_ready(h5: h5py.File) -> bool:
+    return EVENTS_DATASET in h5 and bool(h5[EVENTS_DATASET].attrs.get("complete", False))
+
+
+def missing_indexes(eeg_file: Optional[StrPath] = None, trigger_file: Optional[StrPath] = None) -> list:
+    """列出会话文件缺少（或未完整建成）的索引：overview / events"""
+    missing = []
+    if eeg_file and Path(eeg_file).exists():
+        with session_file_cache.open(eeg_file) as h5:
+            if not (OVERVIEW_GROUP in h5 and h5[OVERVIEW_GROUP].attrs.get("complete", False)):
+                missing.append("overview")
+    if trigger_file and Path(trigger_file).exists():
+        with session_file_cache.open(trigger_file) as h5:
+            if not _events_ready(h5):
+                missing.append("events")
+    return missing
+
+
+def build_missing_indexes(eeg_file: Optional[StrPath] = None, trigger_file: Optional[StrPath] = None) -> list:
+    """
+    补建缺失的概览金字塔与事件索引（维护线程/命令行调用，不在请求路径上），返回补建的索引名
+
+    检查与写入都在文件缓存锁内完成：本进程的读取在此期间等待，
+    不会与以写入模式打开的文件冲突；写入前关闭缓存中的只读句柄。
+    """
+    with session_file_cache.lock:
+        missing = missing_indexes(eeg_file, trigger_file)
+        if "overview" in missing:
+            session_file_cache.invalidate(eeg_file)
+            build_overview_pyramid(eeg_file)
+        if "events" in missing:
+            session_file_cache.invalidate(trigger_file)
+            build_trigger_event_index(trigger_file)
+    return missing
+
+
+def read_events(trigger_file: StrPath, block_samples: int = 1_000_000) -> np.ndarray:
+    """
+    读取会话的完整事件表（结构化数组 sample/value/duration）
+
+    只读：事件索引缺失或未完成（旧文件、录制中断）时按块扫描 trigger 数据在内存中现算，
+    不写文件；索引由后台维护补建（见 build_missing_indexes）。
+    """
+    with session_file_cache.open(trigger_file) as h5:
+        if _events_ready(h5):
+            return h5[EVENTS_DATASET][:]
+        total = h5[TRIGGER_DATASET].shape[0]
+        markers = stored_markers(h5)
+
+    # 在缓存锁外按块读取，每块只短暂持锁
+    blocks = iter_range_blocks(trigger_file, TRIGGER_DATASET, 0, total, block_samples=block_samples)
+    return compute_trigger_events(blocks, markers)
+
+
+def find_events(trigger_file: StrPath, values=None, start=None, end=None,
+                unit: str = "samples") -> np.ndarray:
+    """
+    查找 [start, end) 内起始的事件，可按触发值过滤
+
+    事件表按 sample 升序存放，区间定位用二分查找，不读取原始 trigger 数据。
+    """
+    events = read_events(trigger_file)
+
+    if unit in ("s", "sec", "seconds"):
+        with session_file_cache.open(trigger_file) as h5:
+            sample_rate = int(h5["trigger_data"].attrs.get("sample_rate", EEG_SAMPLE_RATE))
+        start = None if start is None else int(round(float(start) * sample_rate))
+        end = None if end is None else int(round(float(end) * sample_rate))
+
+    lo = 0 if start is None else int(np.searchsorted(events["sample"], int(start), side="left"))
+    hi = len(events) if end is None else int(np.searchsorted(events["sample"], int(end), side="left"))
+    events = events[lo:hi]
+
+    if values is not None:
+        events = events[np.isin(events["value"], np.asarray(list(values), dtype=np.int64))]
+    return events
+
+
+def artifact_overlaps(trigger_file: StrPath, starts, stops, kinds=None) -> np.ndarray:
+    """
+    判断每个样本区间 [start, stop) 是否与伪迹段重叠，返回布尔数组
+
+    kinds 为伪迹类型（blink/emg/pop）列表，None 表示全部。伪迹段按起点有序，
+    对起点二分定位后用“结束点前缀最大值”判断重叠，每个区间 O(log n)。
+    """
+    codes = list(ARTIFACT_CODES.values()) if kinds is None else [ARTIFACT_CODES[k] for k in kinds]
+    artifacts = find_events(trigger_file, values=codes)
+    starts = np.asarray(starts, dtype=np.int64)
+    stops = np.asarray(stops, dtype=np.int64)
+    if len(artifacts) == 0:
+        return np.zeros(starts.shape, dtype=bool)
+    ends = np.maximum.accumulate(artifacts["sample"] + np.maximum(artifacts["duration"], 1))
+    before = np.searchsorted(artifacts["sample"], stops, side="left")
+    return (before > 0) & (ends[np.maximum(before - 1, 0)] > starts)
@@ -0,0 +1,299 @@
+"""
+EEG 设备模拟器 / 会话回放器
+
+按真实线协议向 EEGDeviceServer 发送数据，用于无硬件时的联调与压测：
+    [START_BYTES][RESERVED][PACKET_INDEX(4B 大端)][DATA]
+    - EEG:     A1 05 | 0      | index | 32 通道 × 24 位（补码、大端）
+    - Trigger: AA 56 | 触发值 | index | 3 字节 0
+
+- 数据源：合成信号（alpha + 工频 + 噪声 + 周期触发），或回放已录制的 HDF5 会话
+- 速度：1×–100× 实时（speed=0 表示不限速，用于测吞吐上限）
+- 故障注入：按帧概率丢包、重复、相邻乱序、插入垃圾字节
+- EEGDeviceServer 按客户端 IP 区分 EEG/Trigger 两路，本机测试时两路分别绑定
+  127.0.0.2 / 127.0.0.3 作为源地址（Linux 回环网段默认可用），服务器监听 127.0.0.1
+"""
+
+import socket
+import threading
+import time
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+import numpy as np
+
+from bci_flask_services.core.eeg import (
+    EEG_BOX_START_BYTES,
+    EEG_DEVICE_CHANNELS,
+    EEG_DEVICE_START_INSTRUCTION,
+    EEG_SAMPLE_RATE,
+    EEG_UV_PER_COUNT,
+    TRIGGER_BOX_START_BYTES,
+    StrPath,
+)
+
+EEG_FRAME_DTYPE = np.dtype([
+    ("start", "S2"), ("reserved", "u1"), ("index", ">u4"),
+    ("data", "u1", (EEG_DEVICE_CHANNELS * 3,)),
+])
+TRIGGER_FRAME_DTYPE = np.dtype([
+    ("start", "S2"), ("reserved", "u1"), ("index", ">u4"), ("data", "u1", (3,)),
+])
+# 每次发送的时长（秒）：决定节拍精度与系统调用次数
+SEND_BLOCK_SECONDS = 0.01
+# 设备监听 UDP 启动指令的端口（与 send_start_instruction 一致）
+START_INSTRUCTION_PORT = 8080
+
+
+def encode_eeg_frames(counts: np.ndarray, start_index: int) -> np.ndarray:
+    """
+    编码 EEG 帧
+
+    counts: (n, 32) 有符号 24 位计数；协议中的“首字节异或 0x80、减 2^23”解码
+    等价于 24 位补码，因此直接取 int32 大端表示的低 3 字节。
+    返回 (n,) 的 EEG_FRAME_DTYPE 结构化数组（tobytes() 即线上字节）。
+    """
+    counts = np.clip(np.asarray(counts), -8388608, 8388607).astype(">i4")
+    n = counts.shape[0]
+    frames = np.empty(n, dtype=EEG_FRAME_DTYPE)
+    frames["start"] = EEG_BOX_START_BYTES
+    frames["reserved"] = 0
+    frames["index"] = (start_index + np.arange(n, dtype=np.uint64)) & 0xFFFFFFFF
+    frames["data"] = counts.view(np.uint8).reshape(n, -1, 4)[:, :, 1:].reshape(n, -1)
+    return frames
+
+
+def encode_trigger_frames(values: np.ndarray, start_index: int) -> np.ndarray:
+    """编码 Trigger 帧（触发值放在 RESERVED 字节）"""
+    values = np.asarray(values)
+    n = values.shape[0]
+    frames = np.zeros(n, dtype=TRIGGER_FRAME_DTYPE)
+    frames["start"] = TRIGGER_BOX_START_BYTES
+    frames["reserved"] = values.astype(np.uint8)
+    frames["index"] = (start_index + np.arange(n, dtype=np.uint64)) & 0xFFFFFFFF
+    return frames
+
+
+@dataclass
+class Impairments:
+    """按帧的故障注入概率"""
+    loss: float = 0.0
+    duplicate: float = 0.0
+    reorder: float = 0.0
+    garbage: float = 0.0
+    garbage_max_bytes: int = 16
+
+    def active(self) -> bool:
+        return any((self.loss, self.duplicate, self.reorder, self.garbage))
+
+    def apply(self, frames: np.ndarray, rng: np.random.Generator) -> bytes:
+        """对一批帧注入故障，返回线上字节"""
+        if not self.active():
+            return frames.tobytes()
+        n = len(frames)
+        order = np.arange(n)
+        if self.reorder:
+            swap = np.flatnonzero(rng.random(n - 1) < self.reorder) if n > 1 else np.empty(0, dtype=np.int64)
+            for i in swap:
+                order[i], order[i + 1] = order[i + 1], order[i]
+        keep = rng.random(n) >= self.loss if self.loss else np.ones(n, dtype=bool)
+        repeat = np.where(rng.random(n) < self.duplicate, 2, 1) if self.duplicate else np.ones(n, dtype=np.int64)
+        order = np.repeat(order[keep[order]], repeat[order][keep[order]])
+
+        raw = frames[order]
+        if not self.garbage:
+            return raw.tobytes()
+        parts = []
+        frame_bytes = raw.tobytes()
+        size = frames.dtype.itemsize
+        noisy = np.flatnonzero(rng.random(len(raw)) < self.garbage)
+        pos = 0
+        for i in noisy:
+            parts.append(frame_bytes[pos:i * size])
+            parts.append(rng.integers(0, 256, rng.integers(1, self.garbage_max_bytes + 1), dtype=np.uint8).tobytes())
+            pos = i * size
+        parts.append(frame_bytes[pos:])
+        return b"".join(parts)
+
+
+# ============================================
+# 数据源：产出 (counts (n, 32) int32, triggers (n,) int32)
+# ============================================
+
+def synthetic_source(duration: Optional[float] = None, sample_rate: int = EEG_SAMPLE_RATE,
+                     block: int = 1000, trigger_interval: float = 1.0, seed: int = 0) -> Iterator[tuple]:
+    """合成信号：10 Hz alpha（各通道相位不同）+ 50 Hz 工频 + 白噪声，单位为计数"""
+    rng = np.random.default_rng(seed)
+    phases = rng.uniform(0, 2 * np.pi, EEG_DEVICE_CHANNELS)
+    total = None if duration is None else int(duration * sample_rate)
+    trigger_every = max(1, int(trigger_interval * sample_rate))
+    start = 0
+    while total is None or start < total:
+        n = block if total is None else min(block, total - start)
+        t = (start + np.arange(n)) / sample_rate
+        uv = (20 * np.sin(2 * np.pi * 10 * t[:, None] + phases)
+              + 5 * np.sin(2 * np.pi * 50 * t[:, None])
+              + rng.normal(0, 5, (n, EEG_DEVICE_CHANNELS)))
+        counts = np.round(uv / EEG_UV_PER_COUNT).astype(np.int32)
+        triggers = np.zeros(n, dtype=np.int32)
+        onsets = (start + np.arange(n)) % trigger_every == 0
+        triggers[onsets] = 1 + ((start + np.flatnonzero(onsets)) // trigger_every) % 2
+        yield counts, triggers
+        start += n
+
+
+def hdf5_source(eeg_file: StrPath, trigger_file: Optional[StrPath] = None, loop: bool = False,
+                block: int = 1000) -> Iterator[tuple]:
+    """回放已录制会话（µV 存储按设备系数换回计数；只录了部分通道的会话其余通道为 0）"""
+    from bci_flask_services.core.eeg_reader import (
+        EEG_DATASET, TRIGGER_DATASET, get_uv_scale, iter_range_blocks, session_file_cache,
+    )
+
+    with session_file_cache.open(eeg_file) as h5:
+        dataset = h5[EEG_DATASET]
+        total = dataset.shape[1]
+        raw_counts = get_uv_scale(dataset) is not None
+        device_channels = np.asarray(dataset.attrs.get("device_channels", range(dataset.shape[0])), dtype=np.int64)
+    trigger_total = 0
+    if trigger_file:
+        with session_file_cache.open(trigger_file) as h5:
+            trigger_total = h5[TRIGGER_DATASET].shape[0]
+
+    while True:
+        trigger_blocks = (iter_range_blocks(trigger_file, TRIGGER_DATASET, 0, min(total, trigger_total), block_samples=block)
+                          if trigger_total else iter(()))
+        for data in iter_range_blocks(eeg_file, EEG_DATASET, 0, total, block_samples=block, scaled=False):
+            counts = np.zeros((data.shape[1], EEG_DEVICE_CHANNELS), dtype=np.int32)
+            values = data.T if raw_counts else np.round(data.T / EEG_UV_PER_COUNT)
+            counts[:, device_channels] = values
+            triggers = next(trigger_blocks, None)
+            if triggers is None or len(triggers) != data.shape[1]:
+                padded = np.zeros(data.shape[1], dtype=np.int32)
+                if triggers is not None:
+                    padded[:min(len(triggers), len(padded))] = triggers[:len(padded)]
+                triggers = padded
+            yield counts, triggers.astype(np.int32)
+        if not loop:
+            return
+
+
+# ============================================
+# 模拟器
+# ============================================
+
+class DeviceSimulator:
+    """
+    同时模拟 EEG 放大器与 Trigger 盒
+
+    两路各自以设备 IP 为源地址连接服务器 TCP 端口，等待 UDP 启动指令后
+    按采样率（乘以 speed）节拍发送，两路共享同一数据源保证样本对齐。
+    """
+
+    def __init__(self, host_ip: str, port: int, eeg_ip: str = "127.0.0.2", trigger_ip: str = "127.0.0.3",
+                 source: Optional[Iterator[tuple]] = None, speed: float = 1.0,
+                 impairments: Optional[Impairments] = None, wait_start: bool = True,
+                 start_timeout: float = 10.0, sample_rate: int = EEG_SAMPLE_RATE, seed: int = 0):
+        self.host_ip = host_ip
+        self.port = port
+        self.eeg_ip = eeg_ip
+        self.trigger_ip = trigger_ip
+        self.source = source if source is not None else synthetic_source()
+        self.speed = float(speed)
+        self.impairments = impairments or Impairments()
+        self.wait_start = wait_start
+        self.start_timeout = start_timeout
+        self.sample_rate = sample_rate
+        self.rng = np.random.default_rng(seed)
+        self.running = False
+        self.thread = None
+        self.error = None
+        self.stats = {"samples": 0, "eeg_bytes": 0, "trigger_bytes": 0, "elapsed": 0.0}
+
+    def _connect(self, bind_ip: str) -> socket.socket:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1024 * 1024)
+        sock.bind((bind_ip, 0))
+        sock.connect((self.host_ip, self.port))
+        return sock
+
+    def _wait_start_instruction(self, udp_socks: list) -> bool:
+        deadline = time.time() + self.start_timeout
+        while self.running and time.time() < deadline:
+            for udp in udp_socks:
+                try:
+                    payload, _ = udp.recvfrom(64)
+                except socket.timeout:
+                    continue
+                if payload == EEG_DEVICE_START_INSTRUCTION:
+                    return True
+        return False
+
+    def _run(self):
+        udp_socks = []
+        socks = []
+        try:
+            if self.wait_start:
+                # 先监听 UDP，再连接 TCP：服务器在 accept 后立即发送启动指令
+                for ip in (self.eeg_ip, self.trigger_ip):
+                    udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                    udp.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                    udp.bind((ip, START_INSTRUCTION_PORT))
+                    udp.settimeout(0.1)
+                    udp_socks.append(udp)
+
+            eeg_sock = self._connect(self.eeg_ip)
+            socks.append(eeg_sock)
+            trigger_sock = self._connect(self.trigger_ip)
+            socks.append(trigger_sock)
+
+            if self.wait_start and not self._wait_start_instruction(udp_socks):
+                raise TimeoutError("start instruction not received")
+
+            started = time.perf_counter()
+            index = 0
+            step = max(1, int(self.sample_rate * SEND_BLOCK_SECONDS))
+            for counts, triggers in self.source:
+                for offset in range(0, len(counts), step):
+                    if not self.running:
+                        return
+                    c = counts[offset:offset + step]
+                    t = triggers[offset:offset + step]
+                    eeg_bytes = self.impairments.apply(encode_eeg_frames(c, index), self.rng)
+                    trigger_bytes = self.impairments.apply(encode_trigger_frames(t, index), self.rng)
+                    eeg_sock.sendall(eeg_bytes)
+                    trigger_sock.sendall(trigger_bytes)
+                    index += len(c)
+                    self.stats["samples"] = index
+                    self.stats["eeg_bytes"] += len(eeg_bytes)
+                    self.stats["trigger_bytes"] += len(trigger_bytes)
+
+                    if self.speed > 0:
+                        due = started + index / (self.sample_rate * self.speed)
+                        delay = due - time.perf_counter()
+                        if delay > 0:
+                            time.sleep(delay)
+            self.stats["elapsed"] = round(time.perf_counter() - started, 3)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.running = False
+            for s in socks + udp_socks:
+                try:
+                    s.close()
+                except Exception:
+                    pass
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=5.0)
+
+    def join(self, timeout: Optional[float] = None):
+        if self.thread:
+            self.thread.join(timeout)
+        return self.stats
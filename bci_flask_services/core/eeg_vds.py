@@ -0,0 +1,213 @@
+"""
+EEG 用户级虚拟数据集（HDF5 VDS）
+
+把一个用户（user_account 目录）下的所有会话按时间顺序拼接为一个逻辑数组：
+    <EEG_DATA_DIR>/<user_account>/sessions_view.h5
+        eeg_data      (channels, 总样本数)  虚拟数据集，映射到各会话的 eeg_data
+        trigger_data  (总样本数,)           虚拟数据集，按 EEG 的会话边界对齐
+        sessions      结构化数组 (session_id, start, stop)，会话边界索引
+
+视图文件只保存映射关系，不复制数据；切片时 HDF5 只读取涉及的源文件块，
+内存占用与会话数无关。源文件以相对路径引用，视图与会话目录一起移动仍有效。
+"""
+
+import os
+from pathlib import Path
+from typing import Optional
+
+import h5py
+import numpy as np
+
+from bci_flask_services import config
+from bci_flask_services.core.eeg import StrPath
+from bci_flask_services.core.eeg_batch import discover_sessions_from_dir
+from bci_flask_services.core.eeg_reader import (
+    EEG_DATASET,
+    TRIGGER_DATASET,
+    apply_uv_scale,
+    get_sample_rate,
+    get_uv_scale,
+    session_file_cache,
+)
+
+VIEW_FILENAME = "sessions_view.h5"
+SESSIONS_DATASET = "sessions"
+SESSION_INDEX_DTYPE = [("session_id", "S64"), ("start", "<i8"), ("stop", "<i8")]
+
+
+def get_user_dir(user_account: str, data_dir: Optional[StrPath] = None) -> Path:
+    return Path(data_dir or getattr(config, "EEG_DATA_DIR", "./data")) / user_account
+
+
+def _scan_sources(user_dir: Path) -> list:
+    """读取各会话文件的形状（只读元数据），跳过正在写入或损坏的文件"""
+    sources = []
+    for session in discover_sessions_from_dir(user_dir):
+        if not session.get("eeg_file"):
+            continue
+        try:
+            with session_file_cache.open(session["eeg_file"]) as h5:
+                dataset = h5[EEG_DATASET]
+                entry = {
+                    "session_id": session["session_id"],
+                    "eeg_file": session["eeg_file"],
+                    "trigger_file": session.get("trigger_file"),
+                    "channels": dataset.shape[0],
+                    "samples": dataset.shape[1],
+                    "dtype": dataset.dtype,
+                    "sample_rate": get_sample_rate(dataset),
+                    "uv_per_count": get_uv_scale(dataset),
+                    "device_channels": tuple(int(c) for c in dataset.attrs.get("device_channels", range(dataset.shape[0]))),
+                    "trigger_samples": 0,
+                }
+            if entry["trigger_file"]:
+                with session_file_cache.open(entry["trigger_file"]) as h5:
+                    entry["trigger_samples"] = h5[TRIGGER_DATASET].shape[0]
+        except Exception:
+            continue
+        if entry["samples"]:
+            sources.append(entry)
+    return sources
+
+
+def _index_of(sources: list) -> np.ndarray:
+    index = np.zeros(len(sources), dtype=SESSION_INDEX_DTYPE)
+    offset = 0
+    for i, s in enumerate(sources):
+        index[i] = (s["session_id"].encode("utf-8"), offset, offset + s["samples"])
+        offset += s["samples"]
+    return index
+
+
+def build_user_vds(user_account: str, data_dir: Optional[StrPath] = None,
+                   out_path: Optional[StrPath] = None, sources: Optional[list] = None) -> Path:
+    """
+    构建（或重建）用户的虚拟数据集视图文件
+
+    各会话的通道选择、采样率与存储模式（µV / 原始计数）必须一致，否则抛出 ValueError。
+    """
+    user_dir = get_user_dir(user_account, data_dir)
+    out_path = Path(out_path) if out_path else user_dir / VIEW_FILENAME
+    sources = _scan_sources(user_dir) if sources is None else sources
+    if not sources:
+        raise FileNotFoundError(f"no sessions for user: {user_account}")
+
+    num_channels = sources[0]["channels"]
+    sample_rate = sources[0]["sample_rate"]
+    uv_scale = sources[0]["uv_per_count"]
+    device_channels = sources[0]["device_channels"]
+    for s in sources:
+        if (s["device_channels"] != device_channels or s["sample_rate"] != sample_rate
+                or s["uv_per_count"] != uv_scale):
+            raise ValueError(f"session {s['session_id']} has different channels, sample rate or storage mode")
+
+    index = _index_of(sources)
+    total = int(index["stop"][-1])
+    eeg_layout = h5py.VirtualLayout(shape=(num_channels, total), dtype=sources[0]["dtype"])
+    trigger_layout = h5py.VirtualLayout(shape=(total,), dtype=np.int32)
+
+    def _rel(path):
+        return os.path.relpath(path, out_path.parent)
+
+    for s, (_, start, stop) in zip(sources, index):
+        eeg_src = h5py.VirtualSource(_rel(s["eeg_file"]), EEG_DATASET, shape=(num_channels, s["samples"]))
+        eeg_layout[:, start:stop] = eeg_src
+        n_trigger = min(s["trigger_samples"], s["samples"])
+        if n_trigger:
+            trig_src = h5py.VirtualSource(_rel(s["trigger_file"]), TRIGGER_DATASET, shape=(s["trigger_samples"],))
+            trigger_layout[start:start + n_trigger] = trig_src[:n_trigger]
+
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = out_path.with_name(f".{out_path.name}.{os.getpid()}.tmp")
+    with h5py.File(tmp_path, "w") as h5:
+        fill = np.nan if np.issubdtype(sources[0]["dtype"], np.floating) else 0
+        eeg = h5.create_virtual_dataset(EEG_DATASET, eeg_layout, fillvalue=fill)
+        eeg.attrs["sample_rate"] = sample_rate
+        eeg.attrs["device_channels"] = np.asarray(device_channels, dtype=np.int64)
+        if uv_scale is not None:
+            eeg.attrs["uv_per_count"] = uv_scale
+        trigger = h5.create_virtual_dataset(TRIGGER_DATASET, trigger_layout, fillvalue=0)
+        trigger.attrs["sample_rate"] = sample_rate
+        h5.create_dataset(SESSIONS_DATASET, data=index)
+        h5.attrs["user_account"] = user_account
+    session_file_cache.invalidate(out_path)
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+class UserSessionView:
+    """
+    用户全部会话的拼接视图（懒读取）
+
+    用法:
+        with open_user_view("alice") as view:
+            block = view.read(a, b)                  # 跨会话切片只读取涉及的块（µV）
+            session_id, local = view.locate(a)      # 全局下标 -> (会话, 会话内下标)
+    """
+
+    def __init__(self, path: StrPath):
+        self.path = Path(path)
+        # VDS 的相对源路径按视图文件所在目录解析
+        self.h5 = h5py.File(self.path, "r")
+        self.eeg = self.h5[EEG_DATASET]
+        self.trigger = self.h5[TRIGGER_DATASET]
+        index = self.h5[SESSIONS_DATASET][:]
+        self.session_ids = [sid.decode("utf-8") for sid in index["session_id"]]
+        self.starts = index["start"]
+        self.stops = index["stop"]
+        self.sample_rate = get_sample_rate(self.eeg)
+        self.uv_scale = get_uv_scale(self.eeg)
+
+    @property
+    def boundaries(self) -> list:
+        """[(session_id, start, stop), ...]"""
+        return list(zip(self.session_ids, self.starts.tolist(), self.stops.tolist()))
+
+    def read(self, start: int, stop: int, channels=None) -> np.ndarray:
+        """读取 [start, stop) 的 EEG（µV；原始计数存储时按需换算）"""
+        block = self.eeg[:, start:stop]
+        if channels is not None:
+            block = block[np.asarray(channels, dtype=np.int64)]
+        return apply_uv_scale(block, self.uv_scale)
+
+    def locate(self, sample: int) -> tuple:
+        """全局样本下标 -> (session_id, 会话内下标)"""
+        i = int(np.searchsorted(self.stops, sample, side="right"))
+        if sample < 0 or i >= len(self.session_ids):
+            raise IndexError(f"sample {sample} out of range")
+        return self.session_ids[i], int(sample - self.starts[i])
+
+    def session_slice(self, session_id: str) -> slice:
+        i = self.session_ids.index(session_id)
+        return slice(int(self.starts[i]), int(self.stops[i]))
+
+    def close(self):
+        self.h5.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _is_stale(path: Path, sources: list) -> bool:
+    if not path.exists():
+        return True
+    try:
+        with h5py.File(path, "r") as h5:
+            current = h5[SESSIONS_DATASET][:]
+    except Exception:
+        return True
+    return not np.array_equal(current, _index_of(sources))
+
+
+def open_user_view(user_account: str, data_dir: Optional[StrPath] = None,
+                   rebuild: bool = False) -> UserSessionView:
+    """打开用户视图；会话集合或长度变化（新录制、清理、归档）时自动重建"""
+    user_dir = get_user_dir(user_account, data_dir)
+    path = user_dir / VIEW_FILENAME
+    sources = _scan_sources(user_dir)
+    if rebuild or _is_stale(path, sources):
+        build_user_vds(user_account, data_dir, out_path=path, sources=sources)
+    return UserSessionView(path)
@@ -85,6 +85,12 @@ class User(db.Model, BaseModel):
 class EegSession(db.Model, BaseModel):
     """EEG 录制会话记录"""
     __tablename__ = "eeg_session"
+    # 会话列表按 (start_time, id) 倒序做 keyset 分页，按用户过滤时走对应的复合索引
+    __table_args__ = (
+        db.Index("ix_eeg_session_start_time_id", "start_time", "id"),
+        db.Index("ix_eeg_session_user_id_start", "user_id", "start_time", "id"),
+        db.Index("ix_eeg_session_user_account_start", "user_account", "start_time", "id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     session_id = db.Column(db.String(255), unique=True, nullable=False)
@@ -103,5 +109,14 @@ class EegSession(db.Model, BaseModel):
     # 开始/结束时间
     start_time = db.Column(db.DateTime)
     end_time = db.Column(db.DateTime)
+    # 录制时在线计算的质量摘要（列表页无需读取 HDF5）
+    padded_ratio = db.Column(db.Float)
+    flat_ratio = db.Column(db.Float)
+    saturation_ratio = db.Column(db.Float)
+    # 通道数与存储模式（列表摘要字段）
+    channel_count = db.Column(db.Integer)
+    storage_mode = db.Column(db.String(32))
+    # 逐通道统计（mean/std/rms/min/max/flat/saturated）JSON
+    channel_stats = db.Column(db.Text)
     # 创建时间
     created_at = db.Column(db.DateTime, default=datetime.now)
@@ -0,0 +1,359 @@
+"""Micro-benchmarks for the EEG ingest path (core.eeg).
+
+Cases:
+  parse.*      FrameParser throughput (frames/s) over in-memory byte streams
+               with 0 / 1% / 10% garbage bytes, through process_bytes()
+  buffer.*     StreamBuffer.write() throughput (samples/s) with and without
+               loss padding, including PacketLossTracker.observe()
+  writer.*     HDF5 write throughput (MB/s of float32 input) per codec and
+               flush policy; writer.stream_writer is the production StreamWriter
+  e2e.*        socket-to-disk throughput over loopback: DeviceSimulator at
+               unthrottled speed -> EEGDeviceServer -> SessionManager -> HDF5
+  jitter.*     packet inter-arrival p99/max (ms) at real-time speed (the
+               simulator runs in its own process and sends 1 ms blocks), with
+               ingest in-process (thread) or in the child process (process),
+               with and without a GIL-bound load thread standing in for music
+               generation; read from the flight recorder
+
+Results are written as JSON. With --baseline, every case is compared to the
+stored run and the script exits with status 1 when any case is worse than
+--tolerance (default 15%).
+
+Usage:
+  python bci_flask_services/scripts/bench_eeg_ingest.py --save-baseline bench/eeg_ingest.json
+  python bci_flask_services/scripts/bench_eeg_ingest.py --baseline bench/eeg_ingest.json --out bench/latest.json
+
+Options:
+  --quick        smaller inputs (for CI smoke runs)
+  --only PREFIX  run only cases whose name starts with PREFIX (e.g. parse)
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import platform
+import queue
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# Ensure repo root is on sys.path when executed as a script
+repo_root = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(repo_root))
+
+import h5py
+import numpy as np
+
+from bci_flask_services.core import eeg as core_eeg
+from bci_flask_services.core import eeg_simulator
+from bci_flask_services.core.eeg import (
+    EEG_BOX_START_BYTES,
+    EEG_DEVICE_CHANNELS,
+    FrameParser,
+    PacketLossTracker,
+    StreamBuffer,
+    StreamWriter,
+)
+from bci_flask_services.core.eeg_flight import EVENT_ARRIVAL, STREAM_EEG
+from bci_flask_services.core.eeg_process import start_ingest_process
+from bci_flask_services.core.eeg_simulator import (
+    DeviceSimulator,
+    Impairments,
+    encode_eeg_frames,
+    synthetic_source,
+)
+
+
+class _MemorySocket:
+    """recv() over an in-memory byte string (FrameParser.process_bytes reads 1 byte at a time)"""
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.pos = 0
+
+    def recv(self, n: int) -> bytes:
+        chunk = self.data[self.pos:self.pos + n]
+        self.pos += n
+        return chunk
+
+
+def _result(value: float, unit: str, higher_is_better: bool = True) -> dict:
+    return {"value": round(value, 3), "unit": unit, "higher_is_better": higher_is_better}
+
+
+def bench_parse(n_frames: int) -> dict:
+    results = {}
+    counts = np.random.default_rng(0).integers(-100_000, 100_000, (n_frames, EEG_DEVICE_CHANNELS))
+    frames = encode_eeg_frames(counts, 0)
+    rng = np.random.default_rng(1)
+    for garbage in (0.0, 0.01, 0.1):
+        data = Impairments(garbage=garbage).apply(frames, rng)
+        parser = FrameParser(EEG_BOX_START_BYTES)
+        sock = _MemorySocket(data)
+        parsed = 0
+        started = time.perf_counter()
+        try:
+            while True:
+                parser.process_bytes(sock)
+                parsed += 1
+        except IndexError:
+            pass  # 数据读完（recv 返回空串）
+        elapsed = time.perf_counter() - started
+        results[f"parse.garbage_{garbage:g}"] = _result(parsed / elapsed, "frames/s")
+    return results
+
+
+def bench_buffer(n_samples: int) -> dict:
+    results = {}
+    sample = np.zeros(EEG_DEVICE_CHANNELS, dtype=np.float32)
+    # 每 100 包丢 1 包：每次丢包补 1 帧
+    for label, gap_every in (("no_loss", 0), ("loss_1pct", 100)):
+        buffer = StreamBuffer(num_channels=EEG_DEVICE_CHANNELS, buffer_size=1000)
+        tracker = PacketLossTracker()
+        stop = threading.Event()
+
+        def _drain():
+            while not stop.is_set() or not buffer.data_queue.empty():
+                try:
+                    buffer.data_queue.get(timeout=0.05)
+                except queue.Empty:
+                    pass
+
+        consumer = threading.Thread(target=_drain, daemon=True)
+        consumer.start()
+        written = 0
+        index = 0
+        last = None
+        started = time.perf_counter()
+        while written < n_samples:
+            if gap_every and index % gap_every == gap_every - 1:
+                index += 1
+            missing = tracker.observe(index)
+            if missing > 0 and last is not None:
+                for _ in range(missing):
+                    buffer.write(last)
+                    written += 1
+            buffer.write(sample)
+            last = sample
+            written += 1
+            index += 1
+        elapsed = time.perf_counter() - started
+        stop.set()
+        consumer.join()
+        results[f"buffer.{label}"] = _result(written / elapsed, "samples/s")
+    return results
+
+
+def bench_writer(n_chunks: int, workdir: Path) -> dict:
+    results = {}
+    rng = np.random.default_rng(2)
+    chunk = np.cumsum(rng.normal(0, 5, (EEG_DEVICE_CHANNELS, 1000)), axis=1).astype(np.float32)
+    mb = chunk.nbytes * n_chunks / 1024 ** 2
+
+    codecs = {
+        "none": {},
+        "gzip1": {"compression": "gzip", "compression_opts": 1},
+        "gzip4": {"compression": "gzip", "compression_opts": 4},
+        "gzip4_shuffle": {"compression": "gzip", "compression_opts": 4, "shuffle": True},
+        "lzf": {"compression": "lzf"},
+    }
+    for name, opts in codecs.items():
+        for flush in ("chunk", "end"):
+            path = workdir / f"writer_{name}_{flush}.h5"
+            started = time.perf_counter()
+            with h5py.File(path, "w") as h5:
+                ds = h5.create_dataset("eeg_data", shape=(EEG_DEVICE_CHANNELS, 0),
+                                       maxshape=(EEG_DEVICE_CHANNELS, None), dtype=np.float32,
+                                       chunks=(EEG_DEVICE_CHANNELS, 1000), **opts)
+                for i in range(n_chunks):
+                    ds.resize((EEG_DEVICE_CHANNELS, (i + 1) * 1000))
+                    ds[:, i * 1000:(i + 1) * 1000] = chunk
+                    if flush == "chunk":
+                        h5.flush()
+            elapsed = time.perf_counter() - started
+            results[f"writer.{name}.flush_{flush}"] = _result(mb / elapsed, "MB/s")
+
+    writer = StreamWriter(workdir / "stream_writer")
+    started = time.perf_counter()
+    for _ in range(n_chunks):
+        writer.write_eeg_chunk(chunk)
+    writer.close()
+    results["writer.stream_writer"] = _result(mb / (time.perf_counter() - started), "MB/s")
+    return results
+
+
+def bench_e2e(seconds: float, workdir: Path, port: int) -> dict:
+    session_manager = core_eeg.SessionManager(workdir / "e2e")
+    server = core_eeg.EEGDeviceServer("127.0.0.1", port, "127.0.0.2", "127.0.0.3", session_manager)
+    server.start()
+    time.sleep(0.3)
+    session_manager.start_new_session()
+    simulator = DeviceSimulator("127.0.0.1", port, source=synthetic_source(duration=seconds), speed=0).start()
+    started = time.perf_counter()
+    simulator.join(timeout=max(60.0, seconds * 10))
+    sent = simulator.stats["samples"]
+    # 等待采集线程处理完已发送的数据
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        with session_manager.lock:
+            received = session_manager.stats["packets_received"]
+        if received >= sent:
+            break
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - started
+    session_manager.stop_session()
+    server.stop()
+    recorded = session_manager.sessions[-1]["samples"] if session_manager.sessions else 0
+    if simulator.error is not None:
+        raise RuntimeError(f"simulator failed: {simulator.error}")
+    return {
+        "e2e.samples_per_s": _result(sent / elapsed, "samples/s"),
+        "e2e.realtime_factor": _result(sent / elapsed / core_eeg.EEG_SAMPLE_RATE, "x"),
+        "e2e.recorded_ratio": _result(recorded / sent if sent else 0.0, "ratio"),
+    }
+
+
+def _generation_load(stop: threading.Event) -> None:
+    """模拟生成推理对 GIL 的占用：纯 Python 循环（采样/后处理）夹杂 numpy 矩阵乘"""
+    rng = np.random.default_rng(3)
+    a = rng.normal(size=(256, 256)).astype(np.float32)
+    while not stop.is_set():
+        total = 0
+        for i in range(200_000):
+            total += i * i
+        a = np.tanh(a @ a.T * 1e-3)
+
+
+def _run_simulator(port: int, seconds: float) -> None:
+    """独立进程中的设备模拟器（不受本进程负载影响），按 1 ms 一块发送"""
+    eeg_simulator.SEND_BLOCK_SECONDS = 0.001
+    DeviceSimulator("127.0.0.1", port, source=synthetic_source(duration=seconds), speed=1).start().join()
+
+
+def bench_jitter(seconds: float, workdir: Path, port: int) -> dict:
+    results = {}
+    for mode in ("thread", "process"):
+        for load in ("idle", "load"):
+            port += 1
+            save_dir = workdir / f"jitter_{mode}_{load}"
+            if mode == "process":
+                server, session_manager = start_ingest_process(
+                    save_dir, core_eeg.ERP_WINDOW_SAMPLES, "uv", 50.0,
+                    "127.0.0.1", port, "127.0.0.2", "127.0.0.3", flight={"loss_packets": 0, "lag_seconds": 0})
+            else:
+                session_manager = core_eeg.SessionManager(save_dir)
+                server = core_eeg.EEGDeviceServer("127.0.0.1", port, "127.0.0.2", "127.0.0.3", session_manager)
+            server.start()
+            time.sleep(0.3)
+            session_manager.start_new_session()
+
+            stop = threading.Event()
+            loader = threading.Thread(target=_generation_load, args=(stop,), daemon=True)
+            if load == "load":
+                loader.start()
+            simulator = multiprocessing.get_context("spawn").Process(target=_run_simulator, args=(port, seconds))
+            simulator.start()
+            simulator.join(timeout=seconds * 3 + 30)
+            time.sleep(0.5)
+            dump = session_manager.dump_flight(save_dir / "flight")
+            stop.set()
+            if loader.is_alive():
+                loader.join()
+            session_manager.stop_session()
+            server.stop()
+            if mode == "process":
+                session_manager.ingest.shutdown()
+
+            with np.load(dump) as data:
+                arrivals = (data["kind"] == EVENT_ARRIVAL) & (data["stream"] == STREAM_EEG)
+                gaps_ms = data["aux"][arrivals] * 1000
+            prefix = f"jitter.{mode}.{load}"
+            results[f"{prefix}.p99_ms"] = _result(float(np.percentile(gaps_ms, 99)), "ms", higher_is_better=False)
+            results[f"{prefix}.max_ms"] = _result(float(gaps_ms.max()), "ms", higher_is_better=False)
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """返回 [(name, baseline, current, change)]，change 为按“越大越好”归一后的相对变化"""
+    rows = []
+    for name, current in sorted(results.items()):
+        base = baseline.get(name)
+        if not base or not base["value"]:
+            continue
+        change = (current["value"] - base["value"]) / base["value"]
+        if not current.get("higher_is_better", True):
+            change = -change
+        rows.append((name, base["value"], current["value"], change, change < -tolerance))
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quick", action="store_true")
+    parser.add_argument("--only", default=None)
+    parser.add_argument("--out", default=None, help="write results JSON here")
+    parser.add_argument("--baseline", default=None, help="compare against this results JSON")
+    parser.add_argument("--save-baseline", default=None, help="write results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    parser.add_argument("--port", type=int, default=15801)
+    args = parser.parse_args()
+
+    scale = 0.1 if args.quick else 1.0
+    workdir = Path(tempfile.mkdtemp(prefix="eeg_bench_"))
+    cases = {
+        "parse": lambda: bench_parse(int(20_000 * scale)),
+        "buffer": lambda: bench_buffer(int(500_000 * scale)),
+        "writer": lambda: bench_writer(max(10, int(200 * scale)), workdir),
+        "e2e": lambda: bench_e2e(max(5.0, 60 * scale), workdir, args.port),
+        "jitter": lambda: bench_jitter(max(3.0, 20 * scale), workdir, args.port + 10),
+    }
+
+    results = {}
+    try:
+        for name, run in cases.items():
+            if args.only and not name.startswith(args.only):
+                continue
+            print(f"running {name} ...", flush=True)
+            results.update(run())
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "h5py": h5py.__version__,
+            "machine": platform.machine(),
+            "quick": args.quick,
+        },
+        "results": results,
+    }
+    for name, r in sorted(results.items()):
+        print(f"{name:<32} {r['value']:>14,.1f} {r['unit']}")
+
+    for path in (args.out, args.save_baseline):
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            Path(path).write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))["results"]
+        rows = compare(results, baseline, args.tolerance)
+        print(f"\ncompared with {args.baseline} (tolerance {args.tolerance:.0%}):")
+        regressions = 0
+        for name, base, current, change, regressed in rows:
+            flag = "REGRESSION" if regressed else ""
+            regressions += regressed
+            print(f"{name:<32} {base:>14,.1f} -> {current:>14,.1f} {change:+7.1%} {flag}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
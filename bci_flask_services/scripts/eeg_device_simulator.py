@@ -0,0 +1,91 @@
+"""Simulate the EEG amplifier and trigger box against a running EEGDeviceServer.
+
+Speaks the device wire protocol (A1 05 / AA 56 frames, 4-byte packet index,
+24-bit channels), waits for the UDP start instruction and streams either a
+synthetic signal or a recorded HDF5 session at 1x-100x real time, with
+optional packet loss, duplication, reordering and garbage-byte injection.
+
+The server tells the two streams apart by client IP, so on one machine start
+the backend with EEG_HOST_IP=127.0.0.1 EEG_DEVICE_IP=127.0.0.2
+EEG_TRIGGER_IP=127.0.0.3 (the whole 127.0.0.0/8 range is loopback on Linux).
+
+Usage:
+  python bci_flask_services/scripts/eeg_device_simulator.py --duration 60 --speed 10
+  python bci_flask_services/scripts/eeg_device_simulator.py \
+      --replay data/eeg/alice/session_20250101_120000 --speed 100 --loss 0.001
+
+Options:
+  --speed X           1 = real time, 0 = as fast as possible
+  --no-wait-start     start streaming without waiting for the UDP instruction
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Ensure repo root is on sys.path when executed as a script
+repo_root = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(repo_root))
+
+from bci_flask_services import config
+from bci_flask_services.core.eeg_simulator import (
+    DeviceSimulator,
+    Impairments,
+    hdf5_source,
+    synthetic_source,
+)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=config.EEG_HOST_IP)
+    parser.add_argument("--port", type=int, default=config.EEG_SERVER_PORT)
+    parser.add_argument("--eeg-ip", default=config.EEG_DEVICE_IP)
+    parser.add_argument("--trigger-ip", default=config.EEG_TRIGGER_IP)
+    parser.add_argument("--replay", default=None, help="session directory to replay")
+    parser.add_argument("--loop", action="store_true", help="loop the replayed session")
+    parser.add_argument("--duration", type=float, default=None, help="synthetic duration in seconds")
+    parser.add_argument("--speed", type=float, default=1.0)
+    parser.add_argument("--loss", type=float, default=0.0)
+    parser.add_argument("--duplicate", type=float, default=0.0)
+    parser.add_argument("--reorder", type=float, default=0.0)
+    parser.add_argument("--garbage", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-wait-start", action="store_true")
+    args = parser.parse_args()
+
+    if args.replay:
+        session_dir = Path(args.replay)
+        eeg_file = next(iter(session_dir.glob("*_eeg_*.h5")), None)
+        if eeg_file is None:
+            sys.exit(f"no eeg file in {session_dir}")
+        trigger_file = next(iter(session_dir.glob("*_trigger_*.h5")), None)
+        source = hdf5_source(eeg_file, trigger_file, loop=args.loop)
+    else:
+        source = synthetic_source(duration=args.duration, seed=args.seed)
+
+    simulator = DeviceSimulator(
+        args.host, args.port, eeg_ip=args.eeg_ip, trigger_ip=args.trigger_ip,
+        source=source, speed=args.speed, wait_start=not args.no_wait_start, seed=args.seed,
+        impairments=Impairments(loss=args.loss, duplicate=args.duplicate,
+                                reorder=args.reorder, garbage=args.garbage),
+    ).start()
+
+    try:
+        while simulator.thread.is_alive():
+            time.sleep(1.0)
+            stats = simulator.stats
+            print(f"\rsamples={stats['samples']} eeg={stats['eeg_bytes'] / 1024 ** 2:.1f} MB", end="", flush=True)
+    except KeyboardInterrupt:
+        simulator.stop()
+    print()
+    if simulator.error is not None:
+        sys.exit(f"simulator error: {simulator.error}")
+    print(f"done: samples={simulator.stats['samples']} elapsed={simulator.stats['elapsed']}s")
+
+
+if __name__ == "__main__":
+    main()
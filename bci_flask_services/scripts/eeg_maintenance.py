@@ -0,0 +1,77 @@
+"""Run one EEG maintenance pass: relayout old sessions, apply retention, build indexes.
+
+Sessions older than --relayout-after-days are rewritten into the archive
+layout (longer chunks, shuffle + gzip 9), verified by checksum and swapped in
+atomically. Sessions beyond --retention-days or the --quota-gb budget (oldest
+first) are moved to --archive-dir, or deleted when no archive dir is given.
+The eeg_session table is updated accordingly. Remaining sessions that lack an
+overview pyramid or event index get them built (read endpoints never write
+session files).
+
+Usage:
+  python bci_flask_services/scripts/eeg_maintenance.py --dry-run
+  python bci_flask_services/scripts/eeg_maintenance.py --retention-days 365 --archive-dir /mnt/cold/eeg
+
+Defaults come from EEG_RELAYOUT_AFTER_DAYS / EEG_RETENTION_DAYS /
+EEG_RETENTION_QUOTA_GB / EEG_ARCHIVE_DIR.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+# Ensure repo root is on sys.path when executed as a script
+repo_root = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(repo_root))
+
+from bci_flask_services import config
+from bci_flask_services.core.eeg_batch import discover_sessions_from_db
+from bci_flask_services.core.eeg_maintenance import run_maintenance
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--relayout-after-days", type=float, default=config.EEG_RELAYOUT_AFTER_DAYS)
+    parser.add_argument("--retention-days", type=float, default=config.EEG_RETENTION_DAYS)
+    parser.add_argument("--quota-gb", type=float, default=config.EEG_RETENTION_QUOTA_GB)
+    parser.add_argument("--archive-dir", default=config.EEG_ARCHIVE_DIR)
+    parser.add_argument("--skip-indexes", action="store_true", help="do not build missing indexes")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    from bci_flask_services.app import create_app
+
+    app = create_app()
+    with app.app_context():
+        report = run_maintenance(
+            discover_sessions_from_db(),
+            relayout_after_days=args.relayout_after_days,
+            max_age_days=args.retention_days,
+            quota_bytes=int(args.quota_gb * 1024 ** 3),
+            archive_dir=args.archive_dir,
+            update_db=True,
+            dry_run=args.dry_run,
+            build_indexes=not args.skip_indexes,
+        )
+
+    for entry in report["retention"]:
+        print(f"{entry['action']:<6} {entry['session_id']} ({entry['reason']})")
+    saved = 0
+    for entry in report["relayout"]:
+        if "bytes_before" in entry:
+            saved += entry["bytes_before"] - entry["bytes_after"]
+            print(f"relayout {entry['path']} {entry['bytes_before']} -> {entry['bytes_after']} bytes")
+        else:
+            print(f"relayout {entry['path']} (dry run)")
+    for entry in report["indexes"]:
+        print(f"index  {entry['session_id']}: {', '.join(entry['built'])}{' (dry run)' if args.dry_run else ''}")
+    for entry in report["errors"]:
+        print(f"error  {entry['session_id']}: {entry['error']}")
+    print(f"\nretired={len(report['retention'])} relayout={len(report['relayout'])} "
+          f"indexed={len(report['indexes'])} errors={len(report['errors'])} saved={saved / 1024 ** 2:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
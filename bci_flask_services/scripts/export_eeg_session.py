@@ -0,0 +1,54 @@
+"""Export a recorded EEG session to BDF+/EDF+ or NPZ.
+
+The HDF5 files are read block by block, so memory use does not grow with the
+session length. Trigger events are written as annotations (BDF/EDF) or as an
+``events`` array (NPZ).
+
+Usage:
+  python bci_flask_services/scripts/export_eeg_session.py \
+      data/eeg/alice/session_20250101_120000 --format bdf
+
+Options:
+  --format bdf|edf|npz  output format (default: bdf, 24-bit lossless)
+  --out PATH            output file (default: <session>/exports/<session>.<format>)
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+# Ensure repo root is on sys.path when executed as a script
+repo_root = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(repo_root))
+
+from bci_flask_services.core.eeg_export import EXPORT_FORMATS, export_to_file
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("session_dir")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="bdf")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    session_dir = Path(args.session_dir)
+    eeg_file = next(iter(session_dir.glob("*_eeg_*.h5")), None)
+    trigger_file = next(iter(session_dir.glob("*_trigger_*.h5")), None)
+    if eeg_file is None:
+        sys.exit(f"no eeg file in {session_dir}")
+
+    out_path = Path(args.out) if args.out else session_dir / "exports" / f"{session_dir.name}.{args.format}"
+    # 目录结构为 [user_account/]session_*，上一级目录名即账号
+    patient = session_dir.parent.name if session_dir.parent.name else "X"
+
+    def _progress(done: int, total: int) -> None:
+        print(f"\r{done}/{total} ({done / total:.0%})", end="", flush=True)
+
+    export_to_file(eeg_file, out_path, trigger_file, fmt=args.format, patient=patient, progress=_progress)
+    print(f"\nwritten: {out_path} ({out_path.stat().st_size} bytes)")
+
+
+if __name__ == "__main__":
+    main()
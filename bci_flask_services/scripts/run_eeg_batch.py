@@ -0,0 +1,80 @@
+"""Run a per-session analysis over all recorded EEG sessions in parallel.
+
+Sessions are discovered from the EEG data directory (default) or from the
+eeg_session table, then fanned out over a process pool. Each finished session
+is appended to a JSONL manifest, so an interrupted run can simply be restarted
+and will skip sessions that already succeeded.
+
+Usage:
+  python bci_flask_services/scripts/run_eeg_batch.py \
+      --analysis bci_flask_services.core.eeg_batch:band_power_features \
+      --manifest data/batch/band_power.jsonl --workers 8
+
+Options:
+  --source dir|db     session discovery (db requires a reachable database)
+  --data-dir PATH     override EEG_DATA_DIR for --source dir
+  --retry-failed      re-run sessions recorded as failed in the manifest
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+# Ensure repo root is on sys.path when executed as a script
+repo_root = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(repo_root))
+
+from bci_flask_services import config
+from bci_flask_services.core.eeg_batch import (
+    discover_sessions_from_db,
+    discover_sessions_from_dir,
+    run_batch,
+)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--analysis", default="bci_flask_services.core.eeg_batch:qa_summary")
+    parser.add_argument("--manifest", required=True)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--source", choices=("dir", "db"), default="dir")
+    parser.add_argument("--data-dir", default=str(config.EEG_DATA_DIR))
+    parser.add_argument("--retry-failed", action="store_true")
+    args = parser.parse_args()
+
+    if args.source == "db":
+        from bci_flask_services.app import create_app
+
+        app = create_app()
+        with app.app_context():
+            sessions = discover_sessions_from_db()
+    else:
+        sessions = discover_sessions_from_dir(args.data_dir)
+
+    print(f"sessions={len(sessions)} analysis={args.analysis} manifest={args.manifest}")
+
+    def _progress(entry: dict, summary: dict) -> None:
+        done = summary["ok"] + summary["error"]
+        todo = summary["total"] - summary["skipped"]
+        workers = " ".join(f"{pid}:{n}" for pid, n in sorted(summary["per_worker"].items()))
+        status = entry["status"] if entry["status"] == "ok" else f"error ({entry.get('error')})"
+        print(f"[{done}/{todo}] {entry['session_id']} {status} {entry['elapsed']:.2f}s | workers {workers}")
+
+    summary = run_batch(
+        sessions,
+        args.analysis,
+        args.manifest,
+        max_workers=args.workers,
+        retry_failed=args.retry_failed,
+        progress=_progress,
+    )
+    print(
+        f"\ndone: ok={summary['ok']} error={summary['error']} "
+        f"skipped={summary['skipped']} elapsed={summary['elapsed']:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()